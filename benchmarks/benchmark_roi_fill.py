@@ -0,0 +1,74 @@
+"""Compare the speed of ROIBase.contains_arr to the ray casting algorithm it
+replaced on large polygons
+
+Usage: python benchmarks/benchmark_roi_fill.py [vertices] [size]
+"""
+import sys
+import timeit
+
+import numpy as np
+
+from pdsspect.roi import ROIBase
+
+
+def ray_casting_contains_arr(points, xa, ya):
+    """The ray casting algorithm ROIBase.contains_arr used to use"""
+    result1 = np.zeros(ya.shape, dtype=bool)
+    result2 = np.zeros(ya.shape, dtype=bool)
+    xj, yj = points[-1]
+    for xi, yi in points:
+        tf = np.logical_and(
+            np.logical_or(np.logical_and(yi < ya, yj >= ya),
+                          np.logical_and(yj < ya, yi >= ya)),
+            np.logical_or(xi <= xa, xj <= xa)
+        )
+        rs, cs = np.where(tf)
+        cross1 = np.zeros(ya.shape, dtype=bool)
+        cross2 = np.zeros(ya.shape, dtype=bool)
+        crossing = xi + (ya[rs, cs] - yi) / (yj - yi) * (xj - xi)
+        cross1[rs, cs] = crossing < xa[rs, cs]
+        cross2[rs, cs] = crossing <= xa[rs, cs]
+        result1[tf] ^= cross1[tf]
+        result2[tf] ^= cross2[tf]
+        xj, yj = xi, yi
+    return np.logical_or(result1, result2)
+
+
+class StarPolygon(object):
+    """Star shaped polygon with the ROI's contains_arr"""
+
+    contains_arr = ROIBase.contains_arr
+
+    def __init__(self, vertices, size):
+        angles = np.linspace(0, 2 * np.pi, vertices, endpoint=False)
+        radii = np.where(np.arange(vertices) % 2, size * .2, size * .49)
+        self.points = np.column_stack(
+            [size / 2. + radii * np.cos(angles),
+             size / 2. + radii * np.sin(angles)]
+        ).round() + .5
+
+    def get_data_points(self):
+        return [tuple(point) for point in self.points]
+
+
+def main(vertices=200, size=2000):
+    polygon = StarPolygon(vertices, size)
+    X, Y = np.mgrid[0:size, 0:size]
+    new = polygon.contains_arr(X, Y)
+    old = ray_casting_contains_arr(polygon.get_data_points(), X, Y)
+    assert np.array_equal(new, old)
+    new_time = min(timeit.repeat(
+        lambda: polygon.contains_arr(X, Y), number=1, repeat=3
+    ))
+    old_time = min(timeit.repeat(
+        lambda: ray_casting_contains_arr(polygon.get_data_points(), X, Y),
+        number=1, repeat=3
+    ))
+    print('%d vertices over a %dx%d box' % (vertices, size, size))
+    print('ray casting: %.3f s' % old_time)
+    print('scanline:    %.3f s' % new_time)
+    print('speedup:     %.1fx' % (old_time / new_time))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
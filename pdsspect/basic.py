@@ -3,7 +3,7 @@ from functools import wraps
 from qtpy import QtWidgets
 
 from .histogram import HistogramWidget, HistogramModel, HistogramController
-from .pdsspect_image_set import PDSSpectImageSetViewBase
+from .pdsspect_image_set import PDSSpectImageSetViewBase, SubPDSSpectImageSet
 
 
 class BasicHistogramModel(HistogramModel):
@@ -193,6 +193,42 @@ class BasicController(object):
 
         self.image_set.current_image_index = new_index
 
+    def select_within_cuts(self, cut_low, cut_high):
+        """Make an ROI of the pixels in the current image within cut levels
+
+        The ROI has the current color. The pixels are erased when the current
+        color is ``eraser``. When
+        :attr:`~.pdsspect_image_set.PDSSpectImageSet.simultaneous_roi` is
+        set, the ROI is made in every window
+
+        Parameters
+        ----------
+        cut_low : :obj:`float`
+            The lowest value of the selected pixels
+        cut_high : :obj:`float`
+            The highest value of the selected pixels
+        """
+
+        coordinates = self.image_set.get_coordinates_in_ranges(
+            [(self.image_set.current_image, cut_low, cut_high)]
+        )
+        if isinstance(self.image_set, SubPDSSpectImageSet):
+            parent_set = self.image_set.parent_set
+        else:
+            parent_set = self.image_set
+        if self.image_set.simultaneous_roi:
+            image_sets = [parent_set] + parent_set.subsets
+        else:
+            image_sets = [self.image_set]
+        with parent_set.batch():
+            for image_set in image_sets:
+                if image_set.color == 'eraser':
+                    image_set.erase_coords(coordinates)
+                else:
+                    image_set.add_coords_to_roi_data_with_color(
+                        coordinates, image_set.color
+                    )
+
 
 class BasicWidget(QtWidgets.QWidget):
     """Widget to hold each basic window
@@ -284,6 +320,8 @@ class Basic(QtWidgets.QWidget, PDSSpectImageSetViewBase):
         Model for the :attr:`histogram_widget`
     histogram_widget : :class:`BasicHistogramWidget`
         The histogram widget to adjust the cut levels
+    select_btn : :class:`QtWidgets.QPushButton <PySide.QtGui.QPushButton>`
+        Make an ROI of the pixels within the cut levels
     layout : :class:`QtWidgets.QVBoxLayout <PySide.QtGui.QVBoxLayout>`
         The main layout
     """
@@ -304,10 +342,13 @@ class Basic(QtWidgets.QWidget, PDSSpectImageSetViewBase):
         self.image_menu.currentIndexChanged.connect(self.change_image)
         self.histogram = BasicHistogramModel(self.view_canvas, bins=100)
         self.histogram_widget = BasicHistogramWidget(self.histogram, self)
+        self.select_btn = QtWidgets.QPushButton('Select Within Cuts')
+        self.select_btn.clicked.connect(self.select_within_cuts)
 
         self.layout = QtWidgets.QVBoxLayout()
         self.layout.addWidget(self.image_menu)
         self.layout.addWidget(self.histogram_widget)
+        self.layout.addWidget(self.select_btn)
 
         self.setLayout(self.layout)
         self.histogram.set_data()
@@ -325,7 +366,16 @@ class Basic(QtWidgets.QWidget, PDSSpectImageSetViewBase):
         self.controller.change_current_image_index(new_index)
         self.basic_widget.connect_model(self)
 
+    def select_within_cuts(self):
+        """Make an ROI of the pixels within the :attr:`histogram` cuts"""
+        self.controller.select_within_cuts(*self.histogram.cuts)
+
     def set_image(self):
         """When the image is set, adjust the histogram"""
         self.histogram.set_data()
         self.histogram.restore()
+
+    def add_image(self):
+        """Add new images to the :attr:`image_menu`"""
+        for image in self.image_set.images[self.image_menu.count():]:
+            self.image_menu.addItem(image.image_name)
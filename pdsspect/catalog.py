@@ -0,0 +1,354 @@
+"""SQLite catalog of the PDS3 images in directory trees"""
+import os
+import sqlite3
+import argparse
+
+import pvl
+import numpy as np
+from planetaryimage import PDS3Image
+
+from instrument_models.get_wavelength import get_wavelength
+
+from .pdsspect_image_set import is_pds3_image
+
+
+#: Default path of the catalog
+DEFAULT_CATALOG = os.path.join(
+    os.path.expanduser('~'), '.cache', 'pdsspect-catalog.sqlite'
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    filepath TEXT PRIMARY KEY,
+    size INTEGER,
+    mtime REAL,
+    is_image INTEGER,
+    instrument TEXT,
+    instrument_id TEXT,
+    filter_name TEXT,
+    wavelength REAL,
+    lines INTEGER,
+    samples INTEGER,
+    bands INTEGER,
+    dtype TEXT
+)
+"""
+
+_COLUMNS = [
+    'filepath',
+    'size',
+    'mtime',
+    'is_image',
+    'instrument',
+    'instrument_id',
+    'filter_name',
+    'wavelength',
+    'lines',
+    'samples',
+    'bands',
+    'dtype',
+]
+
+
+def _like_pattern(text, prefix_only=False):
+    """Escape text to search for with ``LIKE ? ESCAPE '\\'``"""
+    for character in ('\\', '%', '_'):
+        text = text.replace(character, '\\' + character)
+    if prefix_only:
+        return text + '%'
+    return '%' + text + '%'
+
+
+def _to_str(value):
+    if value is None:
+        return None
+    if isinstance(value, (list, tuple)):
+        return ', '.join(str(item) for item in value)
+    return str(value)
+
+
+def summarize_label(label):
+    """Get the values the catalog records from an image's label
+
+    Parameters
+    ----------
+    label : :class:`pvl.PVLModule`
+        Image's label
+
+    Returns
+    -------
+    summary : :obj:`dict`
+        The ``instrument``, ``instrument_id``, ``filter_name``,
+        ``wavelength`` (in ``nm``), ``lines``, ``samples``, ``bands`` and
+        ``dtype`` of the image. Values missing from the label are ``None``
+    """
+
+    image = label.get('IMAGE', {})
+    state = label.get('INSTRUMENT_STATE_PARMS', {})
+    request = label.get('OBSERVATION_REQUEST_PARMS', {})
+    instrument_id = label.get('INSTRUMENT_ID')
+    if instrument_id is None:
+        instrument_id = request.get('COMMAND_INSTRUMENT_ID')
+    filter_name = state.get('FILTER_NAME')
+    if filter_name is None:
+        filter_name = state.get('FILTER_NUMBER')
+    if filter_name is None:
+        filter_name = label.get('FILTER_NAME')
+    try:
+        wavelength = get_wavelength(label, 'nm')
+    except (KeyError, TypeError, ValueError, AttributeError):
+        wavelength = float('nan')
+    try:
+        sample_type = PDS3Image.SAMPLE_TYPES[image['SAMPLE_TYPE']]
+        dtype = np.dtype('%s%d' % (sample_type, image['SAMPLE_BITS'] // 8))
+        dtype = dtype.str
+    except (KeyError, TypeError):
+        dtype = None
+    return {
+        'instrument': _to_str(label.get('INSTRUMENT_NAME')),
+        'instrument_id': _to_str(instrument_id),
+        'filter_name': _to_str(filter_name),
+        'wavelength': None if np.isnan(wavelength) else wavelength,
+        'lines': image.get('LINES'),
+        'samples': image.get('LINE_SAMPLES'),
+        'bands': image.get('BANDS', 1),
+        'dtype': dtype,
+    }
+
+
+class Catalog(object):
+    """SQLite catalog of the PDS3 images in directory trees
+
+    Scanning a directory records each image's instrument, filter,
+    wavelength, shape and sample type so images can be found with
+    :meth:`query` without opening them. Rescans only read the labels of files
+    whose size or modification time changed.
+
+    Parameters
+    ----------
+    path : :obj:`str` [:data:`DEFAULT_CATALOG`]
+        Path to the SQLite database. It is created if it does not exist
+
+    Attributes
+    ----------
+    path : :obj:`str`
+        Path to the SQLite database
+    """
+
+    def __init__(self, path=DEFAULT_CATALOG):
+        self.path = os.path.abspath(os.path.expanduser(path))
+        directory = os.path.dirname(self.path)
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        self._connection = sqlite3.connect(self.path)
+        self._connection.execute(_SCHEMA)
+        self._connection.commit()
+
+    def __len__(self):
+        cursor = self._connection.execute(
+            'SELECT COUNT(*) FROM files WHERE is_image = 1'
+        )
+        return cursor.fetchone()[0]
+
+    def close(self):
+        """Close the connection to the database"""
+        self._connection.close()
+
+    def _walk(self, directory, recursive):
+        if not recursive:
+            for name in sorted(os.listdir(directory)):
+                filepath = os.path.join(directory, name)
+                if os.path.isfile(filepath):
+                    yield filepath
+            return
+        for root, dirs, names in os.walk(directory):
+            dirs.sort()
+            for name in sorted(names):
+                yield os.path.join(root, name)
+
+    def _summarize_file(self, filepath, stat):
+        row = dict.fromkeys(_COLUMNS)
+        row.update(
+            filepath=filepath, size=stat.st_size, mtime=stat.st_mtime,
+            is_image=0,
+        )
+        if not is_pds3_image(filepath):
+            return row
+        try:
+            label = pvl.load(filepath)
+        except Exception:
+            return row
+        if 'IMAGE' not in label:
+            return row
+        row.update(summarize_label(label))
+        row['is_image'] = 1
+        return row
+
+    def scan(self, directory, recursive=True):
+        """Record the PDS3 images in a directory
+
+        Files already in the catalog with the same size and modification time
+        are skipped. Files in the catalog under ``directory`` that no longer
+        exist are removed
+
+        Parameters
+        ----------
+        directory : :obj:`str`
+            The directory to scan
+        recursive : :obj:`bool` [``True``]
+            Scan the subdirectories as well if True
+
+        Returns
+        -------
+        updated : :obj:`int`
+            Number of files whose labels were read
+        """
+
+        directory = os.path.abspath(directory)
+        known = {}
+        pattern = _like_pattern(os.path.join(directory, ''), True)
+        cursor = self._connection.execute(
+            "SELECT filepath, size, mtime FROM files "
+            "WHERE filepath LIKE ? ESCAPE '\\'",
+            (pattern,)
+        )
+        for filepath, size, mtime in cursor:
+            known[filepath] = (size, mtime)
+
+        seen = set()
+        rows = []
+        for filepath in self._walk(directory, recursive):
+            try:
+                stat = os.stat(filepath)
+            except OSError:
+                continue
+            seen.add(filepath)
+            if known.get(filepath) == (stat.st_size, stat.st_mtime):
+                continue
+            rows.append(self._summarize_file(filepath, stat))
+
+        removed = [
+            (filepath,) for filepath in known
+            if filepath not in seen and (
+                recursive or os.path.dirname(filepath) == directory
+            )
+        ]
+        with self._connection:
+            self._connection.executemany(
+                'INSERT OR REPLACE INTO files (%s) VALUES (%s)' % (
+                    ', '.join(_COLUMNS), ', '.join('?' * len(_COLUMNS))
+                ),
+                [tuple(row[column] for column in _COLUMNS) for row in rows]
+            )
+            self._connection.executemany(
+                'DELETE FROM files WHERE filepath = ?', removed
+            )
+        return len(rows)
+
+    def query(self, instrument=None, filter_name=None, min_wavelength=None,
+              max_wavelength=None, directory=None):
+        """Find the images in the catalog
+
+        Parameters
+        ----------
+        instrument : :obj:`str` [``None``]
+            Case insensitive text in the instrument name or id (i.e.,
+            ``mast camera right`` or ``pancam_left``)
+        filter_name : :obj:`str` [``None``]
+            Case insensitive filter name or number
+        min_wavelength : :obj:`float` [``None``]
+            Smallest wavelength in ``nm``
+        max_wavelength : :obj:`float` [``None``]
+            Largest wavelength in ``nm``
+        directory : :obj:`str` [``None``]
+            Only find images in this directory tree
+
+        Returns
+        -------
+        filepaths : :obj:`list` of :obj:`str`
+            Sorted list of the absolute paths of the images
+        """
+
+        conditions = ['is_image = 1']
+        parameters = []
+        if instrument is not None:
+            conditions.append(
+                "(COALESCE(instrument, '') || ' ' || "
+                "COALESCE(instrument_id, '')) LIKE ? ESCAPE '\\'"
+            )
+            parameters.append(_like_pattern(instrument))
+        if filter_name is not None:
+            conditions.append('filter_name = ? COLLATE NOCASE')
+            parameters.append(str(filter_name))
+        if min_wavelength is not None:
+            conditions.append('wavelength >= ?')
+            parameters.append(min_wavelength)
+        if max_wavelength is not None:
+            conditions.append('wavelength <= ?')
+            parameters.append(max_wavelength)
+        if directory is not None:
+            conditions.append("filepath LIKE ? ESCAPE '\\'")
+            parameters.append(_like_pattern(
+                os.path.join(os.path.abspath(directory), ''), True
+            ))
+        cursor = self._connection.execute(
+            'SELECT filepath FROM files WHERE %s ORDER BY filepath' % (
+                ' AND '.join(conditions)
+            ),
+            parameters
+        )
+        return [row[0] for row in cursor]
+
+    def records(self, filepaths=None):
+        """Get the recorded values of images in the catalog
+
+        Parameters
+        ----------
+        filepaths : :obj:`list` of :obj:`str` [``None``]
+            Paths of the images. If ``None``, get every image
+
+        Returns
+        -------
+        records : :obj:`list` of :obj:`dict`
+            The values recorded for each image
+        """
+
+        cursor = self._connection.execute(
+            'SELECT %s FROM files WHERE is_image = 1 ORDER BY filepath' % (
+                ', '.join(_COLUMNS)
+            )
+        )
+        records = [dict(zip(_COLUMNS, row)) for row in cursor]
+        if filepaths is not None:
+            filepaths = set(os.path.abspath(path) for path in filepaths)
+            records = [
+                record for record in records
+                if record['filepath'] in filepaths
+            ]
+        return records
+
+
+def cli():
+    """Index the images in directories from the command line"""
+    parser = argparse.ArgumentParser(
+        description="Record the PDS3 images in directories in a catalog"
+    )
+    parser.add_argument(
+        'directory', nargs='*', default=['.'],
+        help="Directories to scan (default: current directory)"
+    )
+    parser.add_argument(
+        '--catalog', default=DEFAULT_CATALOG,
+        help="Path to the catalog (default: %s)" % (DEFAULT_CATALOG)
+    )
+    parser.add_argument(
+        '--no-recursive', dest='recursive', action='store_false',
+        help="Do not scan subdirectories"
+    )
+    args = parser.parse_args()
+    catalog = Catalog(args.catalog)
+    for directory in args.directory:
+        updated = catalog.scan(directory, recursive=args.recursive)
+        print('%s: read %d labels' % (directory, updated))
+    print('%d images in %s' % (len(catalog), catalog.path))
+    catalog.close()
@@ -0,0 +1,463 @@
+"""Classify and cluster the pixels of an image set into ROIs by spectra"""
+import multiprocessing
+from concurrent import futures
+
+import numpy as np
+
+from .pdsspect_image_set import SubPDSSpectImageSet
+
+
+def _get_block(image_set, indices, row_slice):
+    """Get the spectra of the pixels in a block of rows
+
+    Parameters
+    ----------
+    image_set : :class:`~.pdsspect_image_set.PDSSpectImageSet`
+        The image set
+    indices : :obj:`list` of :obj:`int`
+        Indices of the images in the spectra
+    row_slice : :obj:`slice`
+        The rows in the block
+
+    Returns
+    -------
+    spectra : :class:`numpy.ndarray`
+        ``(n_images, n_pixels)`` array of the spectrum of each pixel
+    """
+
+    if image_set.cube is not None:
+        block = image_set.cube[indices, row_slice]
+    else:
+        block = np.stack(
+            [image_set.images[index].data[row_slice] for index in indices]
+        )
+    return block.reshape(len(indices), -1).astype(np.float64)
+
+
+def _label_row_blocks(label_block, shape, chunk_rows, workers):
+    """Label the pixels in blocks of rows in a pool of threads
+
+    Parameters
+    ----------
+    label_block : :obj:`callable`
+        Function that takes a :obj:`slice` of rows and returns the labels of
+        the pixels in those rows
+    shape : :obj:`tuple`
+        The rows and columns of the image
+    chunk_rows : :obj:`int`
+        Number of rows in each block
+    workers : :obj:`int`
+        The number of threads
+
+    Returns
+    -------
+    labels : :class:`numpy.ndarray`
+        The labels of the pixels
+    """
+
+    rows, cols = shape
+    labels = np.full((rows, cols), -1, dtype=np.int8)
+    slices = [
+        slice(start, min(start + chunk_rows, rows))
+        for start in range(0, rows, chunk_rows)
+    ]
+    with futures.ThreadPoolExecutor(workers) as executor:
+        blocks = executor.map(label_block, slices)
+        for row_slice, block in zip(slices, blocks):
+            labels[row_slice] = block.reshape(-1, cols)
+    return labels
+
+
+class SpectralAngleMapper(object):
+    """Classify the pixels of an image set with the Spectral Angle Mapper
+
+    The mean spectrum of each ROI color is a reference spectrum. Each pixel's
+    spectrum across the images sorted by wavelength is compared to every
+    reference and the pixel is given the color of the reference with the
+    smallest spectral angle when that angle is within :attr:`threshold`. The
+    images are classified in blocks of rows in a pool of threads so the
+    computation is spread across the cores without copying the images.
+
+    Parameters
+    ----------
+    model : :class:`~.roi_line_plot.ROILinePlotModel`
+        The model that gets the spectra of the ROIs
+    threshold : :obj:`float` [``0.1``]
+        The largest spectral angle in radians of a classified pixel
+    chunk_rows : :obj:`int` [``256``]
+        Number of rows classified at once in each thread
+    workers : :obj:`int` [``None``]
+        The number of threads. If ``None``, use the number of processors
+
+    Attributes
+    ----------
+    model : :class:`~.roi_line_plot.ROILinePlotModel`
+        The model that gets the spectra of the ROIs
+    threshold : :obj:`float`
+        The largest spectral angle in radians of a classified pixel
+    chunk_rows : :obj:`int`
+        Number of rows classified at once in each thread
+    workers : :obj:`int`
+        The number of threads
+    """
+
+    def __init__(self, model, threshold=0.1, chunk_rows=256, workers=None):
+        self.model = model
+        self.threshold = threshold
+        self.chunk_rows = chunk_rows
+        self.workers = workers or multiprocessing.cpu_count()
+
+    @property
+    def image_set(self):
+        """:class:`~.pdsspect_image_set.PDSSpectImageSet` : The image set to
+        classify
+        """
+
+        return self.model.image_set
+
+    @property
+    def training_colors(self):
+        """:obj:`list` of :obj:`str` : The colors that have an ROI"""
+        return [
+            color for color in self.image_set.colors[:-1]
+            if len(self.image_set.get_coordinates_of_color(color)[0])
+        ]
+
+    def reference_spectra(self, colors):
+        """Get the mean spectrum of the ROIs with each color
+
+        Parameters
+        ----------
+        colors : :obj:`list` of :obj:`str`
+            Names of colors in
+            :attr:`~.pdsspect_image_set.PDSSpectImageSet.colors`
+
+        Returns
+        -------
+        references : :class:`numpy.ndarray`
+            ``(n_colors, n_wavelengths)`` array of the mean spectrum of each
+            color. The spectrum of a color without an ROI is ``NaN`` so no
+            pixels are classified with it
+        """
+
+        indices = self.model.wavelength_indices
+        references = np.full((len(colors), len(indices)), np.nan)
+        for index, color in enumerate(colors):
+            stats = self.image_set.get_roi_statistics(color)
+            if stats.count:
+                references[index] = stats.mean[indices]
+        return references
+
+    def _classify_block(self, indices, unit_references, row_slice):
+        spectra = _get_block(self.image_set, indices, row_slice)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            cosines = np.dot(unit_references, spectra)
+            cosines /= np.sqrt(np.einsum('ij,ij->j', spectra, spectra))
+        # The smallest angle has the largest cosine. Pixels without a
+        # spectrum (i.e., all zero or NaN) compare false and are left out
+        best = np.argmax(
+            np.where(np.isnan(cosines), -np.inf, cosines), axis=0
+        )
+        best_cosines = cosines[best, np.arange(cosines.shape[1])]
+        labels = np.where(best_cosines >= np.cos(self.threshold), best, -1)
+        return labels.astype(np.int8)
+
+    def classify(self, colors=None):
+        """Get the color of each pixel
+
+        Parameters
+        ----------
+        colors : :obj:`list` of :obj:`str` [``None``]
+            The colors whose ROIs are the reference spectra. If ``None``, use
+            the :attr:`training_colors`
+
+        Returns
+        -------
+        labels : :class:`numpy.ndarray`
+            Array the shape of the image set of the index in ``colors`` of
+            each pixel's color. Unclassified pixels are ``-1``
+        """
+
+        if colors is None:
+            colors = self.training_colors
+        indices = self.model.wavelength_indices
+        if not colors or not indices:
+            return np.full(self.image_set.shape[:2], -1, dtype=np.int8)
+        references = self.reference_spectra(colors)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            unit_references = references / np.linalg.norm(
+                references, axis=1, keepdims=True
+            )
+        labels = _label_row_blocks(
+            lambda row_slice: self._classify_block(
+                indices, unit_references, row_slice
+            ),
+            self.image_set.shape[:2], self.chunk_rows, self.workers
+        )
+        return labels
+
+    def apply(self, colors=None):
+        """Add each classified pixel to the ROI of its color
+
+        The ROIs are added in a single update of the views. When
+        :attr:`~.pdsspect_image_set.PDSSpectImageSet.simultaneous_roi` is
+        set, the ROIs are added to the parent set and every subset
+
+        Parameters
+        ----------
+        colors : :obj:`list` of :obj:`str` [``None``]
+            The colors whose ROIs are the reference spectra. If ``None``, use
+            the :attr:`training_colors`
+
+        Returns
+        -------
+        labels : :class:`numpy.ndarray`
+            The labels from :meth:`classify`
+        """
+
+        if colors is None:
+            colors = self.training_colors
+        labels = self.classify(colors)
+        if isinstance(self.image_set, SubPDSSpectImageSet):
+            parent_set = self.image_set.parent_set
+        else:
+            parent_set = self.image_set
+        if self.image_set.simultaneous_roi:
+            image_sets = [parent_set] + parent_set.subsets
+        else:
+            image_sets = [self.image_set]
+        with parent_set.batch():
+            for index, color in enumerate(colors):
+                coordinates = np.nonzero(labels == index)
+                for image_set in image_sets:
+                    image_set.add_coords_to_roi_data_with_color(
+                        coordinates, color
+                    )
+        return labels
+
+
+class KMeansClustering(object):
+    """Cluster the pixels of an image set by their spectra with mini-batch
+    k-means
+
+    Each cluster is an ROI color in
+    :attr:`~.pdsspect_image_set.PDSSpectImageSet.colors` (other than the
+    ``eraser``). The cluster centers are fit to random batches of pixels
+    with a fixed seed so the clusters are the same every time. The pixels
+    are then given the nearest cluster in blocks of rows in a pool of
+    threads, so only the distances of one block to the centers are held at
+    once.
+
+    Parameters
+    ----------
+    image_set : :class:`~.pdsspect_image_set.PDSSpectImageSet`
+        The image set to cluster
+    n_clusters : :obj:`int` [``None``]
+        The number of clusters. If ``None``, use a cluster for each color
+    batch_size : :obj:`int` [``4096``]
+        Number of pixels in each batch
+    max_iter : :obj:`int` [``100``]
+        Most batches used to fit the cluster centers
+    tol : :obj:`float` [``1e-4``]
+        Stop fitting when the centers move less than this fraction of their
+        mean magnitude
+    seed : :obj:`int` [``0``]
+        Seed of the random batches
+    chunk_rows : :obj:`int` [``256``]
+        Number of rows labeled at once in each thread
+    workers : :obj:`int` [``None``]
+        The number of threads. If ``None``, use the number of processors
+
+    Attributes
+    ----------
+    image_set : :class:`~.pdsspect_image_set.PDSSpectImageSet`
+        The image set to cluster
+    n_clusters : :obj:`int`
+        The number of clusters
+    centers : :class:`numpy.ndarray` or None
+        ``(n_clusters, n_images)`` array of the cluster centers. ``None``
+        until :meth:`fit` is called
+    n_iter : :obj:`int`
+        The number of batches used to fit the centers
+
+    Raises
+    ------
+    ValueError
+        When there are more clusters than ROI colors
+    """
+
+    def __init__(self, image_set, n_clusters=None, batch_size=4096,
+                 max_iter=100, tol=1e-4, seed=0, chunk_rows=256,
+                 workers=None):
+        self.image_set = image_set
+        max_clusters = len(image_set.colors) - 1
+        if n_clusters is None:
+            n_clusters = max_clusters
+        if not 0 < n_clusters <= max_clusters:
+            raise ValueError(
+                'Number of clusters must be between 1 and %d' % (max_clusters)
+            )
+        self.n_clusters = n_clusters
+        self.batch_size = batch_size
+        self.max_iter = max_iter
+        self.tol = tol
+        self.seed = seed
+        self.chunk_rows = chunk_rows
+        self.workers = workers or multiprocessing.cpu_count()
+        self.centers = None
+        self.n_iter = 0
+
+    @property
+    def colors(self):
+        """:obj:`list` of :obj:`str` : The color of each cluster"""
+        return self.image_set.colors[:self.n_clusters]
+
+    def _sample(self, random_state, size):
+        """Get the spectra of random pixels
+
+        Pixels with a ``NaN`` value are left out
+
+        Returns
+        -------
+        spectra : :class:`numpy.ndarray`
+            ``(n_pixels, n_images)`` array of the spectrum of each pixel
+        """
+
+        rows, cols = self.image_set.shape[:2]
+        pixels = random_state.randint(0, rows * cols, size)
+        spectra = self.image_set._get_spectra(*np.divmod(pixels, cols)).T
+        return spectra[~np.isnan(spectra).any(axis=1)]
+
+    @staticmethod
+    def _nearest(spectra, centers):
+        """Get the index of the nearest center to each spectrum
+
+        The squared distance to a center is ``|x|**2 - 2 x.c + |c|**2`` and
+        ``|x|**2`` is the same for every center, so it is left out
+        """
+
+        distances = np.dot(spectra, centers.T)
+        distances *= -2
+        distances += np.einsum('ij,ij->i', centers, centers)
+        return np.argmin(distances, axis=1)
+
+    def _init_centers(self, random_state, spectra):
+        """Choose the starting centers from spectra with k-means++"""
+        centers = np.empty((self.n_clusters, spectra.shape[1]))
+        centers[0] = spectra[random_state.randint(len(spectra))]
+        distances = np.sum((spectra - centers[0]) ** 2, axis=1)
+        for index in range(1, self.n_clusters):
+            total = distances.sum()
+            if total > 0:
+                choice = random_state.choice(
+                    len(spectra), p=distances / total
+                )
+            else:
+                choice = random_state.randint(len(spectra))
+            centers[index] = spectra[choice]
+            distances = np.minimum(
+                distances, np.sum((spectra - centers[index]) ** 2, axis=1)
+            )
+        return centers
+
+    def fit(self):
+        """Fit the cluster centers to random batches of pixels
+
+        Each center is the mean of every pixel in the batches assigned to it
+
+        Returns
+        -------
+        centers : :class:`numpy.ndarray`
+            The :attr:`centers`
+
+        Raises
+        ------
+        ValueError
+            When every sampled pixel has a ``NaN`` value
+        """
+
+        random_state = np.random.RandomState(self.seed)
+        spectra = self._sample(
+            random_state, max(self.batch_size, 10 * self.n_clusters)
+        )
+        if len(spectra) == 0:
+            raise ValueError(
+                'Unable to cluster, every sampled pixel has a NaN value'
+            )
+        centers = self._init_centers(random_state, spectra)
+        counts = np.zeros(self.n_clusters)
+        self.n_iter = 0
+        while self.n_iter < self.max_iter:
+            self.n_iter += 1
+            spectra = self._sample(random_state, self.batch_size)
+            if len(spectra) == 0:
+                continue
+            nearest = self._nearest(spectra, centers)
+            batch_counts = np.bincount(nearest, minlength=self.n_clusters)
+            sums = np.zeros_like(centers)
+            np.add.at(sums, nearest, spectra)
+            counts += batch_counts
+            updated = batch_counts > 0
+            shift = (
+                sums[updated] - batch_counts[updated, None] * centers[updated]
+            ) / counts[updated, None]
+            centers[updated] += shift
+            scale = np.sqrt(np.mean(np.sum(centers ** 2, axis=1)))
+            if np.sqrt(np.max(np.sum(shift ** 2, axis=1))) <= self.tol * scale:
+                break
+        self.centers = centers
+        return centers
+
+    def _label_block(self, row_slice):
+        spectra = _get_block(
+            self.image_set, range(len(self.image_set.images)), row_slice
+        ).T
+        labels = self._nearest(spectra, self.centers).astype(np.int8)
+        labels[np.isnan(spectra).any(axis=1)] = -1
+        return labels
+
+    def predict(self):
+        """Get the cluster of each pixel
+
+        The centers are fit first if :meth:`fit` has not been called
+
+        Returns
+        -------
+        labels : :class:`numpy.ndarray`
+            Array the shape of the image set of the index of each pixel's
+            cluster. Pixels with a ``NaN`` value are ``-1``
+        """
+
+        if self.centers is None:
+            self.fit()
+        return _label_row_blocks(
+            self._label_block, self.image_set.shape[:2], self.chunk_rows,
+            self.workers
+        )
+
+    def apply(self):
+        """Replace the ROIs with the clusters
+
+        Each cluster becomes the ROI of its color in :attr:`colors` in a
+        single update of the views. When
+        :attr:`~.pdsspect_image_set.PDSSpectImageSet.simultaneous_roi` is
+        set, the ROIs of the subsets are replaced as well
+
+        Returns
+        -------
+        labels : :class:`numpy.ndarray`
+            The labels from :meth:`predict`
+        """
+
+        labels = self.predict()
+        image_sets = [self.image_set]
+        if self.image_set.simultaneous_roi:
+            image_sets += self.image_set.subsets
+        with self.image_set.batch():
+            for image_set in image_sets:
+                image_set.delete_all_rois()
+                for index, color in enumerate(self.colors):
+                    image_set.add_coords_to_roi_data_with_color(
+                        np.nonzero(labels == index), color
+                    )
+        return labels
@@ -0,0 +1,216 @@
+"""Persistent on-disk cache of decoded image data"""
+import os
+import json
+import hashlib
+import threading
+
+import numpy as np
+
+
+#: Environment variable with the directory to cache images in
+CACHE_DIR_ENV = 'PDSSPECT_CACHE'
+
+#: Environment variable with the size cap of the cache in megabytes
+CACHE_SIZE_ENV = 'PDSSPECT_CACHE_SIZE'
+
+DEFAULT_CACHE_DIR = os.path.join(
+    os.path.expanduser('~'), '.cache', 'pdsspect'
+)
+
+#: Default size cap of the cache in megabytes
+DEFAULT_CACHE_SIZE = 2048
+
+
+class ImageCache(object):
+    """Cache of decoded image data and label summaries
+
+    The data of each image is saved as a ``.npy`` file and the label summary
+    (i.e., the wavelength) as a ``.json`` file. Entries are keyed on the
+    absolute path, size and modification time of the image so a changed
+    image is decoded again. When the cache is larger than :attr:`max_size`,
+    the least recently used entries are removed.
+
+    Parameters
+    ----------
+    directory : :obj:`str` [:data:`DEFAULT_CACHE_DIR`]
+        Directory to save the cache in. It is created if it does not exist
+    max_size : :obj:`int` [:data:`DEFAULT_CACHE_SIZE`]
+        Size cap of the cache in megabytes
+
+    Attributes
+    ----------
+    directory : :obj:`str`
+        Directory the cache is saved in
+    max_size : :obj:`int`
+        Size cap of the cache in bytes
+    """
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR,
+                 max_size=DEFAULT_CACHE_SIZE):
+        self.directory = os.path.abspath(os.path.expanduser(directory))
+        self.max_size = int(max_size * 1024 * 1024)
+        self._lock = threading.Lock()
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+
+    @classmethod
+    def from_environ(cls):
+        """Create the cache from :data:`CACHE_DIR_ENV` and
+        :data:`CACHE_SIZE_ENV`
+
+        Returns
+        -------
+        cache : :class:`ImageCache` or None
+            ``None`` if :data:`CACHE_DIR_ENV` is not set
+        """
+
+        directory = os.environ.get(CACHE_DIR_ENV)
+        if not directory:
+            return None
+        max_size = float(os.environ.get(CACHE_SIZE_ENV, DEFAULT_CACHE_SIZE))
+        return cls(directory, max_size)
+
+    def key(self, filepath):
+        """Key of the image's entry in the cache
+
+        Parameters
+        ----------
+        filepath : :obj:`str`
+            The path to the image
+
+        Returns
+        -------
+        key : :obj:`str`
+            Hash of the absolute path, size and modification time of the image
+        """
+
+        filepath = os.path.abspath(filepath)
+        stat = os.stat(filepath)
+        key = '%s\0%d\0%r' % (filepath, stat.st_size, stat.st_mtime)
+        return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+    def _paths(self, filepath):
+        path = os.path.join(self.directory, self.key(filepath))
+        return path + '.npy', path + '.json'
+
+    def __contains__(self, filepath):
+        try:
+            return all(os.path.isfile(path) for path in self._paths(filepath))
+        except OSError:
+            return False
+
+    def get(self, filepath):
+        """Get the cached data and label summary of an image
+
+        Parameters
+        ----------
+        filepath : :obj:`str`
+            The path to the image
+
+        Returns
+        -------
+        data : :class:`numpy.memmap` or None
+            The read-only memory-mapped data. ``None`` if the image is not in
+            the cache
+        summary : :obj:`dict` or None
+            The label summary saved with the data. ``None`` if the image is not
+            in the cache
+        """
+
+        try:
+            data_path, summary_path = self._paths(filepath)
+            with open(summary_path) as summary_file:
+                summary = json.load(summary_file)
+            data = np.load(data_path, mmap_mode='r')
+            # Mark the entry as recently used
+            os.utime(data_path, None)
+        except (IOError, OSError, ValueError):
+            return None, None
+        return data, summary
+
+    def put(self, filepath, data, summary):
+        """Save the data and label summary of an image in the cache
+
+        Parameters
+        ----------
+        filepath : :obj:`str`
+            The path to the image
+        data : :class:`numpy.ndarray`
+            The decoded image data
+        summary : :obj:`dict`
+            JSON serializable summary of the image's label
+        """
+
+        try:
+            data_path, summary_path = self._paths(filepath)
+        except OSError:
+            return
+        suffix = '.%d.%d.tmp' % (os.getpid(), threading.current_thread().ident)
+        try:
+            with open(data_path + suffix, 'wb') as data_file:
+                np.save(data_file, np.ascontiguousarray(data))
+            with open(summary_path + suffix, 'w') as summary_file:
+                json.dump(summary, summary_file)
+            # Rename the files so a partially written entry is never read
+            with self._lock:
+                for path in (data_path, summary_path):
+                    if os.path.exists(path):
+                        os.remove(path)
+                    os.rename(path + suffix, path)
+        except (IOError, OSError):
+            for path in (data_path, summary_path):
+                if os.path.exists(path + suffix):
+                    os.remove(path + suffix)
+            return
+        self.evict()
+
+    @property
+    def size(self):
+        """:obj:`int` : Size of the cache in bytes"""
+        return sum(size for _, _, size in self._entries())
+
+    def _entries(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith('.npy'):
+                continue
+            data_path = os.path.join(self.directory, name)
+            summary_path = data_path[:-len('.npy')] + '.json'
+            try:
+                size = os.path.getsize(data_path)
+                last_used = os.path.getmtime(data_path)
+                if os.path.exists(summary_path):
+                    size += os.path.getsize(summary_path)
+            except OSError:
+                continue
+            entries.append((last_used, data_path, size))
+        return entries
+
+    def evict(self):
+        """Remove the least recently used entries until the cache is smaller
+        than :attr:`max_size`
+        """
+
+        with self._lock:
+            entries = sorted(self._entries())
+            size = sum(entry_size for _, _, entry_size in entries)
+            for _, data_path, entry_size in entries:
+                if size <= self.max_size:
+                    break
+                summary_path = data_path[:-len('.npy')] + '.json'
+                for path in (data_path, summary_path):
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+                size -= entry_size
+
+    def clear(self):
+        """Remove every entry in the cache"""
+        with self._lock:
+            for name in os.listdir(self.directory):
+                if name.endswith(('.npy', '.json')):
+                    try:
+                        os.remove(os.path.join(self.directory, name))
+                    except OSError:
+                        pass
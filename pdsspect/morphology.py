@@ -0,0 +1,154 @@
+"""Morphology operations on boolean ROI masks
+
+The operations use a square structuring element of ``2 * radius + 1`` pixels
+on a side, applied as a row pass and a column pass of shifted arrays. Pixels
+outside the mask are background.
+"""
+from collections import OrderedDict
+
+import numpy as np
+
+
+def _shift_or(mask, radius, axis):
+    """Set each pixel to True if a pixel within radius along axis is True"""
+    result = mask.copy()
+    length = mask.shape[axis]
+    for shift in range(1, min(radius, length - 1) + 1):
+        before = [slice(None)] * mask.ndim
+        after = [slice(None)] * mask.ndim
+        before[axis] = slice(shift, None)
+        after[axis] = slice(None, -shift)
+        result[tuple(before)] |= mask[tuple(after)]
+        result[tuple(after)] |= mask[tuple(before)]
+    return result
+
+
+def dilate(mask, radius=1):
+    """Grow the True pixels of a mask
+
+    Parameters
+    ----------
+    mask : :class:`numpy.ndarray`
+        2D boolean mask
+    radius : :obj:`int` [``1``]
+        Number of pixels to grow by
+
+    Returns
+    -------
+    dilated : :class:`numpy.ndarray`
+        The dilated mask
+    """
+
+    return _shift_or(_shift_or(mask, radius, 0), radius, 1)
+
+
+def erode(mask, radius=1):
+    """Shrink the True pixels of a mask
+
+    Pixels within ``radius`` of the edge of the mask are removed
+
+    Parameters
+    ----------
+    mask : :class:`numpy.ndarray`
+        2D boolean mask
+    radius : :obj:`int` [``1``]
+        Number of pixels to shrink by
+
+    Returns
+    -------
+    eroded : :class:`numpy.ndarray`
+        The eroded mask
+    """
+
+    padded = np.pad(~mask, radius, mode='constant', constant_values=True)
+    return ~dilate(padded, radius)[radius:-radius or None,
+                                   radius:-radius or None]
+
+
+def opening(mask, radius=1):
+    """Remove parts of a mask narrower than the structuring element
+
+    Parameters
+    ----------
+    mask : :class:`numpy.ndarray`
+        2D boolean mask
+    radius : :obj:`int` [``1``]
+        Radius of the structuring element
+
+    Returns
+    -------
+    opened : :class:`numpy.ndarray`
+        The eroded then dilated mask
+    """
+
+    return dilate(erode(mask, radius), radius)
+
+
+def closing(mask, radius=1):
+    """Fill gaps in a mask narrower than the structuring element
+
+    Parameters
+    ----------
+    mask : :class:`numpy.ndarray`
+        2D boolean mask
+    radius : :obj:`int` [``1``]
+        Radius of the structuring element
+
+    Returns
+    -------
+    closed : :class:`numpy.ndarray`
+        The dilated then eroded mask
+    """
+
+    padded = np.pad(mask, radius, mode='constant')
+    return erode(dilate(padded, radius), radius)[radius:-radius or None,
+                                                 radius:-radius or None]
+
+
+def fill_holes(mask):
+    """Fill the background pixels that are surrounded by the mask
+
+    The background is grown from the edge of the mask one ring of
+    4-connected pixels at a time. Background pixels it does not reach are
+    holes.
+
+    Parameters
+    ----------
+    mask : :class:`numpy.ndarray`
+        2D boolean mask
+
+    Returns
+    -------
+    filled : :class:`numpy.ndarray`
+        The mask with its holes filled
+    """
+
+    rows, cols = mask.shape
+    background = ~mask.ravel()
+    outside = np.zeros(rows * cols, dtype=bool)
+    edge = np.zeros((rows, cols), dtype=bool)
+    edge[[0, -1], :] = True
+    edge[:, [0, -1]] = True
+    frontier = np.flatnonzero(edge.ravel() & background)
+    outside[frontier] = True
+    while frontier.size:
+        frontier_rows, frontier_cols = np.divmod(frontier, cols)
+        neighbors = np.unique(np.concatenate((
+            frontier[frontier_rows > 0] - cols,
+            frontier[frontier_rows < rows - 1] + cols,
+            frontier[frontier_cols > 0] - 1,
+            frontier[frontier_cols < cols - 1] + 1,
+        )))
+        frontier = neighbors[background[neighbors] & ~outside[neighbors]]
+        outside[frontier] = True
+    return ~outside.reshape(rows, cols)
+
+
+#: The operations by name. Each takes a mask and a radius
+OPERATIONS = OrderedDict([
+    ('dilate', dilate),
+    ('erode', erode),
+    ('open', opening),
+    ('close', closing),
+    ('fill holes', lambda mask, radius=1: fill_holes(mask)),
+])
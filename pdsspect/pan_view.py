@@ -3,7 +3,7 @@ from functools import wraps
 
 from qtpy import QtWidgets
 
-from .roi import Polygon, Rectangle, Pencil
+from .roi import Polygon, Rectangle, Pencil, Brush, MagicWand
 from .pds_image_view_canvas import PDSImageViewCanvas
 from .pdsspect_image_set import PDSSpectImageSetViewBase, SubPDSSpectImageSet
 
@@ -52,11 +52,12 @@ class PanViewController(object):
 
         if self.image_set.simultaneous_roi:
             parent_set = self._get_parent_set()
-            for image_set in [parent_set] + parent_set.subsets:
-                image_set.add_coords_to_roi_data_with_color(
-                    coordinates=coordinates,
-                    color=image_set.color,
-                )
+            with parent_set.batch():
+                for image_set in [parent_set] + parent_set.subsets:
+                    image_set.add_coords_to_roi_data_with_color(
+                        coordinates=coordinates,
+                        color=image_set.color,
+                    )
         else:
             self.image_set.add_coords_to_roi_data_with_color(
                 coordinates=coordinates,
@@ -78,10 +79,11 @@ class PanViewController(object):
 
         if self.image_set.simultaneous_roi:
             parent_set = self._get_parent_set()
-            for image_set in [parent_set] + parent_set.subsets:
-                image_set._erase_coords(coordinates)
+            with parent_set.batch():
+                for image_set in [parent_set] + parent_set.subsets:
+                    image_set.erase_coords(coordinates)
         else:
-            self.image_set._erase_coords(coordinates)
+            self.image_set.erase_coords(coordinates)
 
 
 class PanView(QtWidgets.QWidget, PDSSpectImageSetViewBase):
@@ -126,6 +128,8 @@ class PanView(QtWidgets.QWidget, PDSSpectImageSetViewBase):
 
         self.view_canvas = PDSImageViewCanvas()
         self.view_canvas.set_callback('cursor-down', self.start_ROI)
+        self.view_canvas.set_callback('cursor-move', self.drag_ROI)
+        self.view_canvas.set_callback('cursor-up', self.release_ROI)
         self.view_canvas.set_callback('draw-down', self.stop_ROI)
         self.view_canvas.set_callback('motion', self.extend_ROI)
         self.view_canvas.set_window_size(*self.image_set.pan_data.shape)
@@ -154,7 +158,8 @@ class PanView(QtWidgets.QWidget, PDSSpectImageSetViewBase):
         self.view_canvas.redraw()
 
     def change_roi_opacity(self):
-        self.set_roi_data()
+        """Redraw the ROIs with the new opacity"""
+        self.view_canvas.redraw()
 
     def set_image(self):
         """Set the data"""
@@ -195,6 +200,10 @@ class PanView(QtWidgets.QWidget, PDSSpectImageSetViewBase):
                 ROI = Rectangle
             elif self.image_set.selection_type == 'pencil':
                 ROI = Pencil
+            elif self.image_set.selection_type == 'brush':
+                ROI = Brush
+            elif self.image_set.selection_type == 'magic wand':
+                ROI = MagicWand
             fillalpha = self.image_set.alpha if not self.is_erasing else 0
             self._current_roi = ROI(
                 self.image_set,
@@ -207,7 +216,7 @@ class PanView(QtWidgets.QWidget, PDSSpectImageSetViewBase):
             )
             self._current_roi.start_ROI(data_x, data_y)
             self._making_roi = True
-            if ROI == Pencil:
+            if ROI in (Pencil, MagicWand):
                 self.stop_ROI(view_canvas, button, data_x, data_y)
 
     def check_roi_in_process(func):
@@ -228,9 +237,23 @@ class PanView(QtWidgets.QWidget, PDSSpectImageSetViewBase):
             self._current_roi.continue_ROI(data_x, data_y)
         elif self.image_set.selection_type == 'filled rectangle':
             self.stop_ROI(view_canvas, button, data_x, data_y)
-        elif self.image_set.selection_type == 'pencil':
+        elif self.image_set.selection_type in ('pencil', 'brush'):
+            self._current_roi.continue_ROI(data_x, data_y)
+
+    @check_ROI_in_pan
+    @check_roi_in_process
+    def drag_ROI(self, view_canvas, button, data_x, data_y):
+        """Paint with the brush while the mouse is dragged"""
+        if isinstance(self._current_roi, Brush):
             self._current_roi.continue_ROI(data_x, data_y)
 
+    @check_ROI_in_pan
+    @check_roi_in_process
+    def release_ROI(self, view_canvas, button, data_x, data_y):
+        """Stop the brush ROI when the mouse is released"""
+        if isinstance(self._current_roi, Brush):
+            self.stop_ROI(view_canvas, button, data_x, data_y)
+
     @check_ROI_in_pan
     @check_roi_in_process
     def extend_ROI(self, view_canvas, button, data_x, data_y):
@@ -1,5 +1,6 @@
 import os
 import sys
+import logging
 import argparse
 from glob import glob
 
@@ -13,7 +14,48 @@ from .transforms import Transforms
 from .pdsspect_view import PDSSpectViewWidget
 from .roi_line_plot import ROILinePlotWidget, ROILinePlotModel
 from .roi_histogram import ROIHistogramWidget, ROIHistogramModel
-from .pdsspect_image_set import PDSSpectImageSet, PDSSpectImageSetViewBase
+from .pdsspect_image_set import (
+    PDSSpectImageSet, PDSSpectImageSetViewBase, is_pds3_image
+)
+from .image_cache import ImageCache, DEFAULT_CACHE_DIR, DEFAULT_CACHE_SIZE
+from .catalog import Catalog, DEFAULT_CATALOG
+
+
+class ImageLoader(QtCore.QThread):
+    """Thread to open the pending images of an image set
+
+    See :meth:`~.pdsspect_image_set.PDSSpectImageSet.load_pending_images`
+
+    Parameters
+    ----------
+    image_set : :class:`~.pdsspect_image_set.PDSSpectImageSet`
+        pdsspect model
+    parent : :class:`QtCore.QObject <PySide.QtCore.QObject>` [``None``]
+        Parent of the thread
+
+    Attributes
+    ----------
+    image_set : :class:`~.pdsspect_image_set.PDSSpectImageSet`
+        pdsspect model
+    image_loaded : :class:`QtCore.Signal <PySide.QtCore.Signal>`
+        Emitted with the filepath, image and load time of each image as it is
+        opened
+    """
+
+    image_loaded = QtCore.Signal(object, object, object)
+
+    def __init__(self, image_set, parent=None):
+        super(ImageLoader, self).__init__(parent)
+        self.image_set = image_set
+
+    def run(self):
+        for filepath, image, load_time in (
+                self.image_set.load_pending_images()):
+            self.image_loaded.emit(filepath, image, load_time)
+
+    def cancel(self):
+        """Stop opening images after the current one"""
+        self.image_set.cancel_loading()
 
 
 class PDSSpect(QtWidgets.QMainWindow, PDSSpectImageSetViewBase):
@@ -56,6 +98,13 @@ class PDSSpect(QtWidgets.QMainWindow, PDSSpectImageSetViewBase):
         Add another window
     quit_btn : :class:`QtWidgets.QPushButton <PySide.QtGui.QPushButton>`
         Quit
+    loader : :class:`ImageLoader`
+        Thread opening the pending images. ``None`` if there were no pending
+        images
+    progress_bar : :class:`QProgressBar <PySide.QtGui.QProgressBar>`
+        Number of images opened while images are opened in the background
+    cancel_btn : :class:`QtWidgets.QPushButton <PySide.QtGui.QPushButton>`
+        Stop opening images in the background
     button_layout1 : :class:`QtWidgets.QHBoxLayout <PySide.QtGui.QHBoxLayout>`
         Layout for the buttons. If you want to re-adjust where the buttons
         go, override this attribute
@@ -127,7 +176,83 @@ class PDSSpect(QtWidgets.QMainWindow, PDSSpectImageSetViewBase):
         central_widget = QtWidgets.QWidget()
         central_widget.setLayout(self.main_layout)
         self.setCentralWidget(central_widget)
+
+        self.loader = None
+        self.progress_bar = QtWidgets.QProgressBar()
+        self.progress_bar.setFormat('%v/%m images')
+        self.cancel_btn = QtWidgets.QPushButton('Cancel')
+        self.cancel_btn.clicked.connect(self.cancel_loading)
+        self.statusBar().addPermanentWidget(self.progress_bar)
+        self.statusBar().addPermanentWidget(self.cancel_btn)
+        self.progress_bar.hide()
+        self.cancel_btn.hide()
         self.open_basic()
+        if self.image_set.pending_filepaths:
+            self.start_loading()
+
+    def start_loading(self):
+        """Open the pending images of the image set in the background"""
+        opened = len(self.image_set.filepaths)
+        total = opened + len(self.image_set.pending_filepaths)
+        self.progress_bar.setRange(0, total)
+        self.progress_bar.setValue(opened)
+        self.progress_bar.show()
+        self.cancel_btn.setEnabled(True)
+        self.cancel_btn.show()
+        self.loader = ImageLoader(self.image_set, self)
+        self.loader.image_loaded.connect(self.add_loaded_image)
+        self.loader.finished.connect(self.finish_loading)
+        self.loader.start()
+
+    @QtCore.Slot(object, object, object)
+    def add_loaded_image(self, filepath, image, load_time):
+        """Add an image opened in the background to the image set
+
+        Parameters
+        ----------
+        filepath : :obj:`str`
+            The path to the image
+        image : :class:`~.pdsspect_image_set.ImageStamp` or None
+            The image or ``None`` if it could not be opened
+        load_time : :obj:`float`
+            The time it took to open the image
+        """
+
+        self.image_set.add_image(filepath, image, load_time)
+        self.progress_bar.setValue(len(self.image_set.filepaths))
+
+    def finish_loading(self):
+        """Hide the progress when the images are done opening"""
+        self.progress_bar.hide()
+        self.cancel_btn.hide()
+        pending = len(self.image_set.pending_filepaths)
+        if pending:
+            self.statusBar().showMessage(
+                'Cancelled, %d images were not opened' % (pending)
+            )
+        else:
+            self.statusBar().showMessage(
+                'Opened %d images' % (len(self.image_set.images)), 5000
+            )
+
+    def cancel_loading(self):
+        """Stop opening images in the background"""
+        if self.loader is not None:
+            self.loader.cancel()
+            self.cancel_btn.setEnabled(False)
+
+    def stop_loading(self):
+        """Stop opening images and wait for the background thread to end"""
+        if self.loader is not None:
+            self.loader.cancel()
+            self.loader.wait()
+
+    def add_image(self):
+        """Add new images to the Set Wavelengths window"""
+        if self.set_wavelength_window:
+            image_menu = self.set_wavelength_window.image_menu
+            for image in self.image_set.images[image_menu.count():]:
+                image_menu.addItem(image.image_name)
 
     @property
     def image_sets(self):
@@ -183,6 +308,8 @@ class PDSSpect(QtWidgets.QMainWindow, PDSSpectImageSetViewBase):
             self.roi_histogram_window.add_view()
         if self.roi_line_plot_window:
             self.roi_line_plot_window.add_view()
+        if self.selection_window:
+            self.selection_window.update_roi_menus()
         spect_view.show()
         spect_view.pan_view.show()
         spect_view.pan_view.resizeEvent(None)
@@ -199,6 +326,7 @@ class PDSSpect(QtWidgets.QMainWindow, PDSSpectImageSetViewBase):
 
     def quit(self, *args):
         """Quit pdsspect"""
+        self.stop_loading()
         self.pdsspect_view.close()
         self.pan_view.close()
         if self.selection_window:
@@ -216,7 +344,7 @@ class PDSSpect(QtWidgets.QMainWindow, PDSSpectImageSetViewBase):
         self.close()
 
 
-def open_pdsspect(app, inlist=None):
+def open_pdsspect(app, inlist=None, query=None, catalog=None, **kwargs):
     """Open pdsspect
 
     This method should be used for opening pdsspect from another application
@@ -227,7 +355,27 @@ def open_pdsspect(app, inlist=None):
     app : :class:`QtWidgets.QApplication <PySide.QtCore.QApplication>`
         Application manager
     inlist : :obj:`list`
-        A list of file names/paths to display in the pdsspect
+        A list of file names/paths to display in the pdsspect. Files found in
+        a directory (or the current directory when ``inlist`` is not given)
+        that do not look like PDS3 images (see
+        :func:`~.pdsspect_image_set.is_pds3_image`) are skipped. Named files
+        that cannot be opened are warned about
+    query : :obj:`dict` [``None``]
+        Keyword arguments for :meth:`.catalog.Catalog.query` (i.e.,
+        ``instrument``, ``filter_name``, ``min_wavelength``, and
+        ``max_wavelength``). If given, the images are found in the
+        ``catalog`` instead of opening every file. If ``inlist`` is also
+        given, only the images in ``inlist`` that match the query are opened
+    catalog : :class:`~.catalog.Catalog` or :obj:`str` [``None``]
+        The catalog or the path to the catalog to query. If ``None``, the
+        catalog at :data:`.catalog.DEFAULT_CATALOG` is used
+    **kwargs
+        Keyword arguments to pass to
+        :class:`~.pdsspect_image_set.PDSSpectImageSet` (i.e., ``workers``,
+        ``pool``, ``lazy``, ``memmap``, ``dtype``, ``cache``, ``cube``, and
+        ``background``). With ``background``, the window opens as soon as the
+        first image is open and the rest are added as they are opened. A
+        smaller image opened later crops the images and ROIs to its shape
 
     Returns
     -------
@@ -236,20 +384,24 @@ def open_pdsspect(app, inlist=None):
     """
 
     files = []
-    if isinstance(inlist, list):
+    if query is not None and not inlist:
+        files = None
+    elif isinstance(inlist, list):
         if inlist:
             for item in inlist:
-                files += arg_parser(item)
+                files += _find_files(item)
         else:
-            files = glob('*')
+            files = _find_files('')
     elif isinstance(inlist, str):
         names = inlist.split(',')
         for name in names:
-            files = files + arg_parser(name.strip())
+            files = files + _find_files(name.strip())
     elif inlist is None:
-        files = glob('*')
+        files = _find_files('')
 
-    image_set = PDSSpectImageSet(files)
+    if query is not None:
+        files = _query_catalog(files, query, catalog)
+    image_set = PDSSpectImageSet(files, **kwargs)
     window = PDSSpect(image_set)
     geometry = app.desktop().screenGeometry()
     geo_center = geometry.center()
@@ -276,13 +428,68 @@ def open_pdsspect(app, inlist=None):
     return window
 
 
-def pdsspect(inlist=None):
+def _find_files(name):
+    """Find the files that a name in the ``inlist`` of :func:`open_pdsspect`
+    refers to
+
+    Only the files that look like PDS3 images are kept from a directory (or
+    the current directory when ``name`` is empty). Other names are kept as
+    they are so the image set warns about the files it is unable to open
+
+    Parameters
+    ----------
+    name : :obj:`str`
+        A file name, glob, or directory
+
+    Returns
+    -------
+    files : :obj:`list` of :obj:`str`
+        The files the name refers to
+    """
+
+    files = arg_parser(name)
+    if not name or os.path.isdir(name):
+        files = [filepath for filepath in files if is_pds3_image(filepath)]
+    return files
+
+
+def _query_catalog(files, query, catalog=None):
+    """Find the images that match a query in a catalog
+
+    Parameters
+    ----------
+    files : :obj:`list` of :obj:`str`
+        Only keep the images in this list. If ``None``, keep every match
+    query : :obj:`dict`
+        Keyword arguments for :meth:`.catalog.Catalog.query`
+    catalog : :class:`~.catalog.Catalog` or :obj:`str` [``None``]
+        The catalog or the path to the catalog
+
+    Returns
+    -------
+    filepaths : :obj:`list` of :obj:`str`
+        The images that match the query
+    """
+
+    if not isinstance(catalog, Catalog):
+        catalog = Catalog(catalog or DEFAULT_CATALOG)
+    filepaths = catalog.query(**query)
+    if files is not None:
+        files = set(os.path.abspath(filepath) for filepath in files)
+        filepaths = [filepath for filepath in filepaths if filepath in files]
+    return filepaths
+
+
+def pdsspect(inlist=None, **kwargs):
     """Run pdsspect from python shell or command line with arguments
 
     Parameters
     ----------
     inlist : :obj:`list`
         A list of file names/paths to display in the pdsspect
+    **kwargs
+        Keyword arguments to pass to :func:`open_pdsspect` (i.e., ``query``
+        and ``catalog``) and :class:`~.pdsspect_image_set.PDSSpectImageSet`
 
     Examples
     --------
@@ -323,6 +530,29 @@ def pdsspect(inlist=None):
     separating each item by a command
     >>> pdsspect(['a1.img, b3.img, c1.img, d*img'])
     You can also pass in a list of files/globs
+    >>> pdsspect('path/to/large/sequence', workers=4)
+    Open the images with 4 threads. Use ``pool='process'`` to open the images
+    in 4 processes instead
+    >>> pdsspect('path/to/large/sequence', lazy=True)
+    Only read the labels when opening and decode each image when it is viewed
+    >>> pdsspect('path/to/large/product.img', memmap=True)
+    Memory-map the image data instead of reading it into memory
+    >>> pdsspect('path/to/large/sequence', dtype='float32')
+    Cast the image data to 32-bit floats instead of keeping the sample type
+    >>> pdsspect('path/to/large/sequence', cube=True)
+    Hold the images in one cube ordered by wavelength
+    >>> pdsspect('path/to/large/sequence', background=True)
+    Open the window with the first image and open the rest in the background
+    >>> from pdsspect.image_cache import ImageCache
+    >>> pdsspect('path/to/large/sequence', cache=ImageCache())
+    Save the decoded images in ``~/.cache/pdsspect`` and memory-map them from
+    there the next time they are opened. Setting the ``PDSSPECT_CACHE``
+    environment variable to a directory caches the images there by default
+    >>> pdsspect(query={'instrument': 'mast camera right',
+    ...                 'min_wavelength': 400, 'max_wavelength': 900})
+    Displays all of the Mastcam right-eye images between 400 and 900 nm in
+    the catalog made with ``pdsspect-index``. See
+    :meth:`.catalog.Catalog.query` for the possible queries
     pdsspect returns a dictionary of the ROIs:
     >>> rois = pdsspect(['a1.img, b3.img, c1.img, d*img'])
     >>> rois['red'][:2, :2]
@@ -338,11 +568,12 @@ def pdsspect(inlist=None):
     app = QtWidgets.QApplication.instance()
     if not app:
         app = QtWidgets.QApplication(sys.argv)
-    window = open_pdsspect(app, inlist)
+    window = open_pdsspect(app, inlist, **kwargs)
     try:
         sys.exit(app.exec_())
     except SystemExit:
         pass
+    window.stop_loading()
     return window.image_set.get_rois_masks_to_export()
 
 
@@ -363,5 +594,95 @@ def cli():
         'file', nargs='*',
         help="Input filename or glob for files with certain extensions"
     )
+    parser.add_argument(
+        '-w', '--workers', type=int, default=1,
+        help="Number of workers to open the images with"
+    )
+    parser.add_argument(
+        '--pool', choices=PDSSpectImageSet.pool_types, default='thread',
+        help="Type of pool to open the images with"
+    )
+    parser.add_argument(
+        '--lazy', action='store_true',
+        help="Only decode an image when it is viewed"
+    )
+    parser.add_argument(
+        '--memmap', action='store_true',
+        help="Memory-map uncompressed images instead of reading them"
+    )
+    parser.add_argument(
+        '--dtype', default=None,
+        help="Type to cast the image data to (i.e., float32)"
+    )
+    parser.add_argument(
+        '--cube', action='store_true',
+        help="Hold the images in one cube ordered by wavelength"
+    )
+    parser.add_argument(
+        '--no-background', dest='background', action='store_false',
+        help="Open every image before showing the window"
+    )
+    parser.add_argument(
+        '--timings', action='store_true',
+        help="Print the time it took to open each image"
+    )
+    parser.add_argument(
+        '--cache', nargs='?', const=DEFAULT_CACHE_DIR, default=None,
+        metavar='DIR',
+        help="Cache the decoded images in DIR (default: %s)" % (
+            DEFAULT_CACHE_DIR
+        )
+    )
+    parser.add_argument(
+        '--cache-size', type=float, default=DEFAULT_CACHE_SIZE,
+        metavar='MB',
+        help="Size cap of the cache in megabytes"
+    )
+    parser.add_argument(
+        '--catalog', default=DEFAULT_CATALOG,
+        help="Catalog made with pdsspect-index to query (default: %s)" % (
+            DEFAULT_CATALOG
+        )
+    )
+    parser.add_argument(
+        '--instrument',
+        help="Only open images from the instrument in the catalog"
+    )
+    parser.add_argument(
+        '--filter', dest='filter_name',
+        help="Only open images with the filter in the catalog"
+    )
+    parser.add_argument(
+        '--min-wavelength', type=float,
+        help="Only open images at or above the wavelength (nm) in the catalog"
+    )
+    parser.add_argument(
+        '--max-wavelength', type=float,
+        help="Only open images at or below the wavelength (nm) in the catalog"
+    )
     args = parser.parse_args()
-    pdsspect(args.file)
+    if args.timings:
+        timings_logger = logging.getLogger('pdsspect.pdsspect_image_set')
+        timings_logger.setLevel(logging.DEBUG)
+        timings_logger.addHandler(logging.StreamHandler())
+    query = {}
+    for key in ('instrument', 'filter_name', 'min_wavelength',
+                'max_wavelength'):
+        if getattr(args, key) is not None:
+            query[key] = getattr(args, key)
+    cache = None
+    if args.cache:
+        cache = ImageCache(args.cache, args.cache_size)
+    pdsspect(
+        args.file,
+        query=query or None,
+        catalog=args.catalog,
+        workers=args.workers,
+        pool=args.pool,
+        lazy=args.lazy,
+        memmap=args.memmap,
+        dtype=args.dtype,
+        cache=cache,
+        cube=args.cube,
+        background=args.background and not args.cube,
+    )
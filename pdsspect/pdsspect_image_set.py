@@ -1,17 +1,37 @@
 """The main model for all the views in pdsspect"""
 import os
+import re
+import bz2
+import math
+import gzip
+import time
+import logging
 import warnings
+import threading
+from functools import partial
+from contextlib import contextmanager
+from collections import OrderedDict
+from concurrent import futures
 
+import pvl
 import numpy as np
 from astropy import units as astro_units
-from ginga.util.dp import masktorgb
 from planetaryimage import PDS3Image
+from planetaryimage.pds3image import Pointer
+from ginga.misc import Bunch
 from ginga.BaseImage import BaseImage
+from ginga.RGBImage import RGBImage
 from ginga import colors as ginga_colors
 from ginga.canvas.types.image import Image
 
 from instrument_models.get_wavelength import get_wavelength
 
+from .image_cache import ImageCache
+from .morphology import OPERATIONS as MORPHOLOGY_OPERATIONS
+from .roi_statistics import RunningStatistics
+
+logger = logging.getLogger(__name__)
+
 
 ginga_colors.add_color('crimson', (0.86275, 0.07843, 0.23529))
 ginga_colors.add_color('teal', (0.0, 0.50196, 0.50196))
@@ -23,6 +43,253 @@ ACCEPTED_UNITS = [
     'AA',
 ]
 
+POOL_TYPES = [
+    'thread',
+    'process',
+]
+
+
+def _decode_image(filepath, dtype=None):
+    """Decode the image data and get the wavelength of a PDS3 image
+
+    This is defined at the module level so it can be sent to a process pool
+
+    Parameters
+    ----------
+    filepath : :obj:`str`
+        The path to the image to be decoded
+    dtype : :class:`numpy.dtype` [``None``]
+        Type to cast the data to. If ``None``, the data keeps the image's
+        sample type
+
+    Returns
+    -------
+    data : :class:`numpy.ndarray`
+        The image data
+    wavelength : :obj:`float`
+        The image's filter wavelength in ``nm``
+    """
+
+    pds_image = PDS3Image.open(filepath)
+    data = pds_image.image
+    if dtype is not None:
+        data = data.astype(dtype, copy=False)
+    return data, get_wavelength(pds_image.label, 'nm')
+
+
+def _memmap_image(filepath, label):
+    """Memory-map the data of an uncompressed PDS3 image
+
+    Parameters
+    ----------
+    filepath : :obj:`str`
+        The path to the image
+    label : :class:`pvl.PVLModule`
+        The image's label
+
+    Returns
+    -------
+    data : :class:`numpy.memmap` or None
+        Read-only memory-mapped data with the same shape as
+        :attr:`planetaryimage.pds3image.PDS3Image.image`. ``None`` if the
+        image is compressed, has line prefixes or suffixes, or the label does
+        not describe the data well enough to map it
+    """
+
+    image = label.get('IMAGE')
+    if image is None or '^IMAGE' not in label:
+        return None
+    if filepath.endswith(('.gz', '.bz2')) or 'ENCODING_TYPE' in image:
+        return None
+    if image.get('LINE_PREFIX_BYTES', 0) or image.get('LINE_SUFFIX_BYTES', 0):
+        return None
+    bands = image.get('BANDS', 1)
+    band_storage = image.get('BAND_STORAGE_TYPE', 'BAND_SEQUENTIAL')
+    if bands != 1 and band_storage != 'BAND_SEQUENTIAL':
+        return None
+
+    try:
+        sample_type = PDS3Image.SAMPLE_TYPES[image['SAMPLE_TYPE']]
+        dtype = np.dtype('%s%d' % (sample_type, image['SAMPLE_BITS'] // 8))
+        pointer = Pointer.parse(label['^IMAGE'], label.get('RECORD_BYTES', 0))
+        data_filepath = filepath
+        if pointer.filename is not None:
+            data_filepath = os.path.join(
+                os.path.dirname(filepath), pointer.filename
+            )
+        shape = (bands, image['LINES'], image['LINE_SAMPLES'])
+        if dtype.kind == 'S':
+            return None
+        data = np.memmap(
+            data_filepath, dtype=dtype, mode='r', offset=pointer.bytes,
+            shape=shape,
+        )
+    except (KeyError, TypeError, ValueError, IOError):
+        return None
+
+    if bands == 1:
+        return data[0]
+    return np.moveaxis(data, 0, -1)
+
+
+def _block_average(data):
+    """Average each 2x2 block of pixels in the data
+
+    Parameters
+    ----------
+    data : :class:`numpy.ndarray`
+        The data to average. An odd last row or column is dropped
+
+    Returns
+    -------
+    averaged : :class:`numpy.ndarray`
+        The averaged data as ``float32`` with half the rows and columns
+    """
+
+    rows, cols = data.shape[0] // 2, data.shape[1] // 2
+    data = data[:rows * 2, :cols * 2]
+    data = data.reshape((rows, 2, cols, 2) + data.shape[2:])
+    return data.mean(axis=(1, 3), dtype=np.float32)
+
+
+def _time_call(func, filepath):
+    """Call ``func`` with ``filepath`` and time how long it takes
+
+    Parameters
+    ----------
+    func : :obj:`callable`
+        Function that takes a filepath as its only argument
+    filepath : :obj:`str`
+        The path to the image
+
+    Returns
+    -------
+    result : :obj:`object` or None
+        The result of ``func`` or ``None`` if ``func`` raised an exception
+    seconds : :obj:`float`
+        The time it took to call ``func``
+    """
+
+    start = time.time()
+    try:
+        result = func(filepath)
+    except Exception:
+        result = None
+    return result, time.time() - start
+
+
+#: Number of bytes :func:`is_pds3_image` reads from the start of a file
+SNIFF_BYTES = 16384
+
+_PDS_VERSION = re.compile(br'^\s*(PDS|ODL)_VERSION_ID\s*=', re.M)
+_IMAGE_OBJECT = re.compile(
+    br'^\s*(\^IMAGE\s*=|OBJECT\s*=\s*IMAGE\s*$)', re.M
+)
+
+
+def is_pds3_image(filepath, sniff_bytes=SNIFF_BYTES):
+    """Check if a file looks like a PDS3 image without decoding it
+
+    Only the start of the file is read. The file must have a PDS3 label with
+    an ``^IMAGE`` pointer or an ``IMAGE`` object in the first ``sniff_bytes``
+
+    Parameters
+    ----------
+    filepath : :obj:`str`
+        The path to the file
+    sniff_bytes : :obj:`int` [:data:`SNIFF_BYTES`]
+        Number of bytes to read from the start of the file
+
+    Returns
+    -------
+    is_image : :obj:`bool`
+        True if the file looks like a PDS3 image, False otherwise
+    """
+
+    if filepath.endswith('.gz'):
+        open_file = gzip.open
+    elif filepath.endswith('.bz2'):
+        open_file = bz2.BZ2File
+    else:
+        open_file = open
+    try:
+        with open_file(filepath, 'rb') as stream:
+            header = stream.read(sniff_bytes)
+    except (IOError, OSError, EOFError):
+        return False
+    version = _PDS_VERSION.search(header)
+    return (
+        version is not None and
+        _IMAGE_OBJECT.search(header, version.start()) is not None
+    )
+
+
+def _unite_boxes(first, second):
+    """Get the bounding box of two boxes, either of which may be ``None``"""
+    if first is None:
+        return second
+    if second is None:
+        return first
+    return (
+        min(first[0], second[0]), max(first[1], second[1]),
+        min(first[2], second[2]), max(first[3], second[3]),
+    )
+
+
+def _intersect_boxes(first, second):
+    """Get the overlap of two boxes or ``None`` if they do not overlap"""
+    if first is None or second is None:
+        return None
+    y1, y2 = max(first[0], second[0]), min(first[1], second[1])
+    x1, x2 = max(first[2], second[2]), min(first[3], second[3])
+    if y1 >= y2 or x1 >= x2:
+        return None
+    return y1, y2, x1, x2
+
+
+class ROIOverlay(RGBImage):
+    """RGBImage of the ROIs drawn over the pan
+
+    The opacity of the ROIs is applied to the scaled cutouts the canvas draws,
+    so changing it does not change the data
+
+    Parameters
+    ----------
+    data_np : :class:`numpy.ndarray` [``None``]
+        The RGBA values of the ROIs
+    alpha : :obj:`float` [``1.0``]
+        The opacity of the ROIs between 0 and 1
+
+    Attributes
+    ----------
+    alpha : :obj:`float`
+        The opacity of the ROIs between 0 and 1
+    """
+
+    def __init__(self, data_np=None, alpha=1.0, **kwargs):
+        self.alpha = alpha
+        super(ROIOverlay, self).__init__(data_np=data_np, **kwargs)
+
+    def _apply_alpha(self, cutout):
+        scale = np.ones(cutout.data.shape[-1])
+        scale[self.order.index('A')] = self.alpha
+        cutout.data = cutout.data * scale
+        return cutout
+
+    def get_scaled_cutout_wdht(self, x1, y1, x2, y2, new_wd, new_ht,
+                               method='basic'):
+        cutout = super(ROIOverlay, self).get_scaled_cutout_wdht(
+            x1, y1, x2, y2, new_wd, new_ht, method
+        )
+        return self._apply_alpha(cutout)
+
+    def get_scaled_cutout(self, x1, y1, x2, y2, scale_x, scale_y,
+                          method='basic'):
+        cutout = super(ROIOverlay, self).get_scaled_cutout(
+            x1, y1, x2, y2, scale_x, scale_y, method
+        )
+        return self._apply_alpha(cutout)
+
 
 class ImageStamp(BaseImage):
     """BaseImage for the image view canvas
@@ -41,11 +308,35 @@ class ImageStamp(BaseImage):
         wavelength
     unit : :obj:`str` [``nm``]
         Wavelength unit. Must be one of :attr:`accepted_units`
+    data : :class:`numpy.ndarray` [``None``]
+        Already decoded image data. If given, the image is not opened until
+        :attr:`pds_image` or :attr:`label` is needed. The data is saved in the
+        ``cache`` if one is given
+    lazy : :obj:`bool` [``False``]
+        If True, only the label is read when the image is created. The data
+        is decoded the first time it is accessed
+    memmap : :obj:`bool` [``False``]
+        If True and the image is uncompressed, memory-map the data instead of
+        reading it into memory. The data keeps the image's sample type
+    dtype : :class:`numpy.dtype` [``None``]
+        Type to cast the decoded data to (i.e., ``float32``). If ``None``, the
+        data keeps the image's sample type. Memory-mapped data is never cast
+    cache : :class:`~.image_cache.ImageCache` [``None``]
+        Cache to get the data and wavelength from. If the image is not in the
+        cache, the decoded data is saved in it. Cached data is memory-mapped
 
     Attributes
     ----------
-    pds_image : :class:`~planetaryimage.pds3image.PDS3Image`
-        Image object that holds data and the image label
+    filepath : :obj:`str`
+        The path to the image
+    lazy : :obj:`bool`
+        True if the data is decoded the first time it is accessed
+    memmap : :obj:`bool`
+        True if the data should be memory-mapped when possible
+    dtype : :class:`numpy.dtype` or None
+        Type the decoded data is cast to. ``None`` for the image's sample type
+    cache : :class:`~.image_cache.ImageCache` or None
+        Cache the data is saved in
     image_name : :obj:`str`
         The basename of the filepath
     seen : :obj:`bool`
@@ -55,26 +346,393 @@ class ImageStamp(BaseImage):
         The cut levels of the image. Default is two `None` types
     accepted_units : :obj:`list`
         List of accepted units: ``nm``, ``um``, and ``AA``
+
+    Notes
+    -----
+    When a canvas shows the image at half its size or less, the image is
+    rendered from a level of a pyramid of block-averaged copies of the data
+    (see :meth:`get_pyramid_level`) instead of sampling the full resolution
+    data. The levels are computed the first time they are needed
+
+    Memory-mapped data is read in tiles of :attr:`tile_size` rows and columns
+    by :meth:`get_region`. The most recently used :attr:`tile_cache_size`
+    tiles are kept in memory so panning only reads the tiles that come into
+    view
     """
 
     accepted_units = ACCEPTED_UNITS
 
+    #: Most samples :meth:`_get_fast_data` returns for memory-mapped data
+    fast_data_samples = 1000000
+
+    #: Number of rows and columns in the tiles :meth:`get_region` reads
+    tile_size = 256
+
+    #: Most tiles :meth:`get_region` keeps in memory
+    tile_cache_size = 64
+
     def __init__(self, filepath, metadata=None, logger=None,
-                 wavelength=float('nan'), unit='nm'):
-        self.pds_image = PDS3Image.open(filepath)
-        data = self.pds_image.image.astype(float)
-        BaseImage.__init__(self, data_np=data,
-                           metadata=metadata, logger=logger)
-        self.set_data(data)
+                 wavelength=float('nan'), unit='nm', data=None, lazy=False,
+                 memmap=False, dtype=None, cache=None):
+        self._check_acceptable_unit(unit)
+        self.filepath = filepath
+        self.cache = cache
+        self.memmap = memmap
+        self.dtype = None if dtype is None else np.dtype(dtype)
+        self._pds_image = None
+        self._label = None
+        self._pyramid = []
+        self._tiles = OrderedDict()
+        self._cache_summary = None
+        if cache is not None and data is None:
+            data, self._cache_summary = cache.get(filepath)
+        elif cache is not None:
+            nm_wavelength = wavelength * astro_units.Unit(unit)
+            self._save_in_cache(data, nm_wavelength.to('nm').value)
+        self.lazy = lazy and data is None
+        # The placeholder data BaseImage creates for a lazy image must not be
+        # mistaken for unloaded data while BaseImage is being initialized
+        self._loaded = True
+        if self.lazy:
+            self._shape = self._get_shape_from_label()
+            BaseImage.__init__(self, metadata=metadata, logger=logger)
+            self._loaded = False
+        else:
+            if data is None:
+                data = self._read_data()
+            elif self.dtype is not None:
+                data = data.astype(self.dtype, copy=False)
+            BaseImage.__init__(self, data_np=data,
+                               metadata=metadata, logger=logger)
+            self.set_data(data)
         self.image_name = os.path.basename(filepath)
         self.seen = False
         self.cuts = (None, None)
-        self._check_acceptable_unit(unit)
-        if np.isnan(wavelength):
-            wavelength = get_wavelength(self.pds_image.label, unit)
+        if np.isnan(wavelength) and self._cache_summary is not None:
+            wavelength = self._cache_summary['wavelength'] * astro_units.nm
+            wavelength = wavelength.to(unit).value
+        elif np.isnan(wavelength):
+            wavelength = get_wavelength(self.label, unit)
         unit = astro_units.Unit(unit)
         self._wavelength = wavelength * unit
 
+    @property
+    def pds_image(self):
+        """:class:`~planetaryimage.pds3image.PDS3Image` : Image object that
+        holds data and the image label
+
+        If the image was created with already decoded data, the image is
+        opened the first time this is accessed
+        """
+
+        if self._pds_image is None:
+            self._pds_image = PDS3Image.open(self.filepath)
+            self._label = self._pds_image.label
+        return self._pds_image
+
+    @property
+    def label(self):
+        """:class:`pvl.PVLModule` : The image's label
+
+        If the image was created with already decoded data, only the label is
+        read the first time this is accessed
+        """
+
+        if self._label is None:
+            self._label = pvl.load(self.filepath)
+        return self._label
+
+    def _get_shape_from_label(self):
+        """Get the shape the image data will have from the label
+
+        Returns
+        -------
+        shape : :obj:`tuple`
+            ``(lines, samples)`` for single band images and
+            ``(lines, samples, bands)`` otherwise
+        """
+
+        image = self.label['IMAGE']
+        shape = (image['LINES'], image['LINE_SAMPLES'])
+        bands = image.get('BANDS', 1)
+        if bands != 1:
+            shape += (bands,)
+        return shape
+
+    def _read_data(self):
+        """Read the data from :attr:`filepath`
+
+        Returns
+        -------
+        data : :class:`numpy.ndarray`
+            The memory-mapped data if :attr:`memmap` and the image can be
+            memory-mapped, otherwise the decoded data cast to :attr:`dtype`
+        """
+
+        if self.memmap:
+            data = _memmap_image(self.filepath, self.label)
+            if data is not None:
+                return data
+        if self._pds_image is None and self.lazy:
+            # Do not hold on to the PDS3Image so only the data is in memory
+            data = PDS3Image.open(self.filepath).image
+        else:
+            data = self.pds_image.image
+        if self.cache is not None:
+            self._save_in_cache(data)
+        if self.dtype is not None:
+            data = data.astype(self.dtype, copy=False)
+        return data
+
+    def _save_in_cache(self, data, wavelength=float('nan')):
+        """Save the data and the wavelength in :attr:`cache`
+
+        Parameters
+        ----------
+        data : :class:`numpy.ndarray`
+            The image data
+        wavelength : :obj:`float` [``nan``]
+            The wavelength in ``nm``. If ``nan``, the wavelength is gotten from
+            the :attr:`label`
+        """
+
+        if np.isnan(wavelength):
+            wavelength = get_wavelength(self.label, 'nm')
+        self.cache.put(self.filepath, data, {'wavelength': wavelength})
+
+    @property
+    def memmapped(self):
+        """:obj:`bool` : True if the data is memory-mapped"""
+        return self._loaded and isinstance(self._data, np.memmap)
+
+    @property
+    def loaded(self):
+        """:obj:`bool` : True if the data has been decoded"""
+        return self._loaded
+
+    def _load_data(self):
+        """Decode the data if it has not been decoded yet"""
+        if self._loaded:
+            return
+        rows, cols = self._shape[:2]
+        self._data = self._read_data()[:rows, :cols]
+        self._loaded = True
+        self._set_minmax()
+
+    def get_data(self):
+        """Get the image data, decoding the data if it has not been yet
+
+        Returns
+        -------
+        data : :class:`numpy.ndarray`
+            Image data
+        """
+
+        self._load_data()
+        return self._data
+
+    def _get_data(self):
+        self._load_data()
+        return self._data
+
+    def _get_fast_data(self):
+        self._load_data()
+        data = self._data
+        if isinstance(data, np.memmap):
+            # Only read a sample of the rows and columns so finding the min
+            # and max does not page in the whole file
+            rows, cols = data.shape[:2]
+            step = int(math.ceil(
+                math.sqrt(rows * cols / float(self.fast_data_samples))
+            ))
+            data = data[::max(step, 1), ::max(step, 1)]
+        return data
+
+    @property
+    def shape(self):
+        """:obj:`tuple` : Shape of the image data
+
+        The shape comes from the label if the data has not been decoded
+        """
+
+        if self._loaded:
+            return self._data.shape
+        return self._shape
+
+    def set_data(self, data_np, metadata=None, astype=None):
+        self._pyramid = []
+        self._tiles = OrderedDict()
+        super(ImageStamp, self).set_data(data_np, metadata, astype)
+
+    @property
+    def pyramid_depth(self):
+        """:obj:`int` : Number of levels in the pyramid below the full data"""
+        rows, cols = self.shape[:2]
+        smallest = min(rows, cols)
+        return int(math.log(smallest, 2)) if smallest > 1 else 0
+
+    def get_pyramid_level(self, level):
+        """Get the data averaged down to a level of the pyramid
+
+        Each level averages each 2x2 block of pixels in the level above it.
+        Levels are computed the first time they are needed and kept
+
+        Parameters
+        ----------
+        level : :obj:`int`
+            The level of the pyramid. ``0`` is the full resolution data. Must
+            not be larger than :attr:`pyramid_depth`
+
+        Returns
+        -------
+        data : :class:`numpy.ndarray`
+            The data with ``1 / 2 ** level`` the number of rows and columns
+        """
+
+        if level == 0:
+            return self.get_data()
+        if level > self.pyramid_depth:
+            raise ValueError(
+                'Level must be at most the pyramid depth %d' % (
+                    self.pyramid_depth
+                )
+            )
+        while len(self._pyramid) < level:
+            self._pyramid.append(
+                _block_average(self.get_pyramid_level(len(self._pyramid)))
+            )
+        return self._pyramid[level - 1]
+
+    def get_scaled_cutout_wdht(self, x1, y1, x2, y2, new_wd, new_ht,
+                               method='basic'):
+        """Extract a region of the image and resample it to a new size
+
+        When the region is shrunk to half its size or less, the region is
+        sampled from the pyramid level closest to, but not smaller than, the
+        new size. Otherwise the full resolution data is sampled. See
+        :meth:`ginga.BaseImage.BaseImage.get_scaled_cutout_wdht`
+        """
+
+        old_wd, old_ht = x2 - x1 + 1, y2 - y1 + 1
+        if method not in ('basic', 'view') or min(new_wd, new_ht) < 1:
+            level = 0
+        else:
+            scale = max(float(new_wd) / old_wd, float(new_ht) / old_ht)
+            level = min(int(math.floor(-math.log(scale, 2))),
+                        self.pyramid_depth) if scale <= .5 else 0
+        if level <= 0:
+            return super(ImageStamp, self).get_scaled_cutout_wdht(
+                x1, y1, x2, y2, new_wd, new_ht, method
+            )
+
+        data = self.get_pyramid_level(level)
+        factor = 2 ** level
+        rows, cols = data.shape[:2]
+        yi = np.arange(new_ht).reshape(-1, 1) * (float(old_ht) / new_ht)
+        xi = np.arange(new_wd).reshape(1, -1) * (float(old_wd) / new_wd)
+        yi = ((y1 + yi) / factor).astype(int).clip(0, rows - 1)
+        xi = ((x1 + xi) / factor).astype(int).clip(0, cols - 1)
+        return Bunch.Bunch(
+            data=data[yi, xi],
+            scale_x=float(new_wd) / old_wd,
+            scale_y=float(new_ht) / old_ht,
+        )
+
+    def _get_tile(self, row, col):
+        """Get a tile of the data, reading it if it is not in memory
+
+        Parameters
+        ----------
+        row : :obj:`int`
+            Row of the tile
+        col : :obj:`int`
+            Column of the tile
+
+        Returns
+        -------
+        tile : :class:`numpy.ndarray`
+            The tile's data. Tiles on the bottom and right edges of the image
+            may be smaller than :attr:`tile_size`
+        """
+
+        key = (row, col)
+        tile = self._tiles.pop(key, None)
+        if tile is None:
+            size = self.tile_size
+            tile = np.array(
+                self._data[row * size:(row + 1) * size,
+                           col * size:(col + 1) * size]
+            )
+            while len(self._tiles) >= self.tile_cache_size:
+                self._tiles.popitem(last=False)
+        self._tiles[key] = tile
+        return tile
+
+    def get_region(self, x1, y1, x2, y2):
+        """Get the data in a region of the image
+
+        Memory-mapped data is read one tile at a time so only the tiles under
+        the region are read from the file. Other data is sliced
+
+        Parameters
+        ----------
+        x1 : :obj:`int`
+            Left edge of the region
+        y1 : :obj:`int`
+            Bottom edge of the region
+        x2 : :obj:`int`
+            Right edge of the region (exclusive)
+        y2 : :obj:`int`
+            Top edge of the region (exclusive)
+
+        Returns
+        -------
+        region : :class:`numpy.ndarray`
+            The data in the region
+        """
+
+        data = self.get_data()
+        if not isinstance(data, np.memmap):
+            return data[y1:y2, x1:x2]
+
+        rows, cols = data.shape[:2]
+        x1, y1 = max(x1, 0), max(y1, 0)
+        x2, y2 = min(x2, cols), min(y2, rows)
+        region = np.empty(
+            (max(y2 - y1, 0), max(x2 - x1, 0)) + data.shape[2:],
+            dtype=data.dtype
+        )
+        size = self.tile_size
+        for row in range(y1 // size, (y2 - 1) // size + 1):
+            for col in range(x1 // size, (x2 - 1) // size + 1):
+                tile = self._get_tile(row, col)
+                top, left = row * size, col * size
+                bottom = min(y2, top + tile.shape[0])
+                right = min(x2, left + tile.shape[1])
+                start_y, start_x = max(y1, top), max(x1, left)
+                region[start_y - y1:bottom - y1, start_x - x1:right - x1] = (
+                    tile[start_y - top:bottom - top,
+                         start_x - left:right - left]
+                )
+        return region
+
+    def crop(self, shape):
+        """Crop the image to the given number of rows and columns
+
+        If the data has not been decoded, it will be cropped when it is
+
+        Parameters
+        ----------
+        shape : :obj:`tuple`
+            The number of rows and columns to crop the image to
+        """
+
+        rows, cols = shape[:2]
+        if not self._loaded:
+            self._shape = (rows, cols) + self._shape[2:]
+        elif self._data.shape[:2] != (rows, cols):
+            self.set_data(self._data[:rows, :cols])
+
     @property
     def data(self):
         """:class:`numpy.ndarray` : Image data"""
@@ -135,6 +793,38 @@ class PDSSpectImageSet(object):
     ----------
     filepaths : :obj:`list`
         List of filepaths to images
+    workers : :obj:`int` [``1``]
+        Number of workers to open the images with. If ``1``, the images are
+        opened one after another
+    pool : :obj:`str` [``thread``]
+        Type of pool the workers are in. Must be one of :attr:`pool_types`.
+        Lazy and memory-mapped images are always opened in threads since
+        their data is not decoded when opened
+    lazy : :obj:`bool` [``False``]
+        If True, only the labels of the images are read when opened. The data
+        of each image is decoded the first time it is accessed. See
+        :class:`ImageStamp`
+    memmap : :obj:`bool` [``False``]
+        If True, memory-map the data of uncompressed images instead of reading
+        it into memory. See :class:`ImageStamp`
+    dtype : :class:`numpy.dtype` [``None``]
+        Type to cast the image data to (i.e., ``float32``). If ``None``, each
+        image keeps its sample type. See :class:`ImageStamp`
+    cache : :class:`~.image_cache.ImageCache` [``None``]
+        Cache of decoded images. If ``None``, the cache is created from the
+        environment with :meth:`.image_cache.ImageCache.from_environ`. Use
+        ``False`` to not cache the images. See :class:`ImageStamp`
+    cube : :obj:`bool` [``False``]
+        If True, copy the data of every image into a single :attr:`cube` and
+        order :attr:`images` by wavelength. The data of each image becomes a
+        view of the cube. This reads the data of lazy and memory-mapped
+        images
+    background : :obj:`bool` [``False``]
+        If True, only the first image is opened. The rest are put in
+        :attr:`pending_filepaths` to be opened in the background with
+        :meth:`load_pending_images` and added with :meth:`add_image`. The
+        :attr:`shape` starts as the shape of the first image and shrinks if a
+        smaller image is added, cropping the images and ROIs
 
     Attributes
     ----------
@@ -149,16 +839,43 @@ class PDSSpectImageSet(object):
         Selection types for making ROIs. The possible types are
         :class:`Filled Rectangle <.pdsspect.roi.Rectangle>`,
         :class:`Filled Polygon <.pdsspect.roi.Polygon>`, and
-        :class:`Filled Rectangle <.pdsspect.roi.Pencil>`, (single points).
+        :class:`Filled Rectangle <.pdsspect.roi.Pencil>`, (single points),
+        :class:`Brush <.pdsspect.roi.Brush>`, and
+        :class:`Magic Wand <.pdsspect.roi.MagicWand>`
+    roi_operations : :obj:`list` of :obj:`str`
+        Operations to combine ROIs with :meth:`combine_rois`: ``union``,
+        ``intersection``, ``difference``, and ``xor``
     accepted_units : :obj:`list`
         List of accepted units: ``nm``, ``um``, and ``AA``
+    pool_types : :obj:`list`
+        List of pool types to open images with: ``thread`` and ``process``
     images : :obj:`list` of :class:`ImageStamp`
         Images to view and make selections. Must all have the same dimensions
     filepaths : :obj:`list`
         List of filepaths to images
+    pending_filepaths : :obj:`list`
+        List of filepaths to images that have not been opened yet
+    load_times : :obj:`dict`
+        The time in seconds it took to open each image, keyed by filepath.
+        Each time is also logged to the ``pdsspect.pdsspect_image_set``
+        logger at the ``DEBUG`` level
+    cache : :class:`~.image_cache.ImageCache` or None
+        Cache of decoded images
+    cube : :class:`numpy.ndarray` or None
+        ``(n_images, rows, cols)`` array of the data of :attr:`images` in the
+        same order. ``None`` if the image set was not created with ``cube``
     current_color_index : :obj:`int`
         Index of the current color in :attr:`colors` list for ROI creation
         (Default is 0)
+    brush_radius : :obj:`int`
+        Radius in pixels of the :class:`~.roi.Brush` (Default is 1)
+    wand_tolerance : :obj:`float`
+        Relative distance from the seed's spectrum of pixels selected with
+        the :class:`~.roi.MagicWand` (Default is 0.05). See
+        :meth:`grow_region`
+    wand_max_area : :obj:`int`
+        Most pixels the :class:`~.roi.MagicWand` selects at once (Default is
+        ``2 ** 20``)
     """
 
     colors = [
@@ -182,32 +899,73 @@ class PDSSpectImageSet(object):
     selection_types = [
         'filled rectangle',
         'filled polygon',
-        'pencil'
+        'pencil',
+        'brush',
+        'magic wand',
+    ]
+
+    roi_operations = [
+        'union',
+        'intersection',
+        'difference',
+        'xor',
     ]
 
     accepted_units = ACCEPTED_UNITS
 
-    def __init__(self, filepaths):
+    pool_types = POOL_TYPES
+
+    def __init__(self, filepaths, workers=1, pool='thread', lazy=False,
+                 memmap=False, dtype=None, cache=None, cube=False,
+                 background=False):
+        if pool not in self.pool_types:
+            raise ValueError(
+                'Pool must be one of the following %s' % (
+                    ', '.join(self.pool_types)
+                )
+            )
+        if cube and background:
+            raise ValueError('Cannot create a cube when loading in background')
         self._views = []
         self.images = []
-        self.filepaths = filepaths
+        self.filepaths = list(filepaths)
+        self.pending_filepaths = []
+        self.background = background
+        self._cancel_loading = threading.Event()
+        self.workers = workers
+        self.pool = pool
+        self.lazy = lazy
+        self.memmap = memmap
+        self.dtype = dtype
+        if cache is None:
+            cache = ImageCache.from_environ()
+        self.cache = cache or None
         self._create_image_list()
         self._determin_shape()
+        if cube:
+            self._create_cube()
         self._current_image_index = 0
         self.current_color_index = 0
         self._selection_index = 0
+        self.brush_radius = 1
+        self.wand_tolerance = 0.05
+        self.wand_max_area = 2 ** 20
         self._zoom = 1.0
         self._center = None
         self._alpha = 1.0
         self._flip_x = False
         self._flip_y = False
         self._swap_xy = False
-        mask = np.zeros(self.shape[:2], dtype=np.bool)
-        self._maskrgb = masktorgb(mask, self.color, self.alpha)
-        self._roi_data = self._maskrgb.get_data().astype(float)
+        # Label map of the ROIs. Each pixel is 0 or the label of its color
+        # (see _get_label_from_color). RGBA is only made for the pan when a
+        # view sets the ROI data
+        self._roi_data = np.zeros(self.shape[:2], dtype=np.uint8)
+        self._maskrgb = ROIOverlay(np.zeros((1, 1, 4)), alpha=self.alpha)
         self._maskrgb_obj = Image(0, 0, self._maskrgb)
         self._subsets = []
         self._simultaneous_roi = False
+        self._batch_depth = 0
+        self._roi_data_changed = False
         self._unit = 'nm'
         self.set_unit()
 
@@ -221,18 +979,274 @@ class PDSSpectImageSet(object):
                 shape[0] = rows if shape[0] > rows else shape[0]
                 shape[1] = cols if shape[1] > cols else shape[1]
         self.shape = tuple(shape)
-        s_ = np.s_[:self.shape[0], :self.shape[1]]
         for image in self.images:
-            image.set_data(image.data[s_])
+            image.crop(self.shape)
+
+    def _iter_load_images(self, filepaths):
+        """Open each image, stopping early if :meth:`cancel_loading` is called
+
+        Parameters
+        ----------
+        filepaths : :obj:`list` of :obj:`str`
+            The paths to the images to open
+
+        Yields
+        ------
+        image : :class:`ImageStamp` or None
+            The image or ``None`` if the image could not be opened. The images
+            are yielded in the same order as ``filepaths``
+        load_time : :obj:`float`
+            The time it took to open the image
+        """
+
+        open_image = partial(
+            _time_call,
+            partial(
+                ImageStamp, lazy=self.lazy, memmap=self.memmap,
+                dtype=self.dtype, cache=self.cache,
+            ),
+        )
+        if self.workers <= 1:
+            for filepath in filepaths:
+                if self._cancel_loading.is_set():
+                    return
+                yield open_image(filepath)
+            return
+
+        use_threads = self.pool == 'thread' or self.lazy or self.memmap
+        if use_threads:
+            executor = futures.ThreadPoolExecutor(self.workers)
+            jobs = [executor.submit(open_image, path) for path in filepaths]
+        else:
+            # Image stamps and labels cannot be pickled so the processes only
+            # decode the data and get the wavelength. Cached images are not
+            # decoded. The data is cached with its sample type
+            executor = futures.ProcessPoolExecutor(self.workers)
+            dtype = self.dtype if self.cache is None else None
+            decode = partial(_time_call, partial(_decode_image, dtype=dtype))
+            jobs = [
+                None if self.cache is not None and path in self.cache
+                else executor.submit(decode, path)
+                for path in filepaths
+            ]
+        try:
+            for filepath, job in zip(filepaths, jobs):
+                if self._cancel_loading.is_set():
+                    return
+                if use_threads:
+                    yield job.result()
+                elif job is None:
+                    yield open_image(filepath)
+                else:
+                    yield self._stamp_decoded(filepath, *job.result())
+        finally:
+            for job in jobs:
+                if job is not None:
+                    job.cancel()
+            executor.shutdown()
+
+    def _stamp_decoded(self, filepath, result, decode_time):
+        """Create the image from the data decoded in a process
+
+        Returns
+        -------
+        image : :class:`ImageStamp` or None
+            The image or ``None`` if the image could not be decoded
+        load_time : :obj:`float`
+            The time it took to decode the data and create the image
+        """
+
+        if result is None:
+            return None, decode_time
+        data, wavelength = result
+        image, stamp_time = _time_call(
+            partial(
+                ImageStamp, data=data, wavelength=wavelength,
+                dtype=self.dtype, cache=self.cache,
+            ),
+            filepath
+        )
+        return image, decode_time + stamp_time
+
+    def _load_images(self):
+        """Open each image in :attr:`filepaths`
+
+        Returns
+        -------
+        results : :obj:`list` of :obj:`tuple`
+            The :class:`ImageStamp` (or ``None`` if the image could not be
+            opened) and the time it took to open, in the same order as
+            :attr:`filepaths`
+        """
+
+        return list(self._iter_load_images(self.filepaths))
 
     def _create_image_list(self):
         self.images = []
-        for filepath in self.filepaths:
-            try:
-                image = ImageStamp(filepath)
-                self.images.append(image)
-            except Exception:
+        self.load_times = {}
+        self.cube = None
+        if self.background:
+            self._open_first_image()
+            return
+        results = self._load_images()
+        for filepath, (image, load_time) in zip(self.filepaths, results):
+            if image is None:
                 warnings.warn("Unable to open %s" % (filepath))
+            else:
+                self.images.append(image)
+                self._record_load_time(filepath, load_time)
+
+    def _record_load_time(self, filepath, load_time):
+        """Record the time it took to open an image in :attr:`load_times`
+        and log it at the ``DEBUG`` level
+        """
+
+        self.load_times[filepath] = load_time
+        logger.debug('Opened %s in %.3f s', filepath, load_time)
+
+    def _open_first_image(self):
+        """Open the first image that can be opened in :attr:`filepaths`
+
+        The rest of the filepaths are moved to :attr:`pending_filepaths`
+        """
+
+        self.pending_filepaths = list(self.filepaths)
+        del self.filepaths[:]
+        while self.pending_filepaths and not self.images:
+            filepath = self.pending_filepaths.pop(0)
+            self.filepaths.append(filepath)
+            for image, load_time in self._iter_load_images([filepath]):
+                if image is None:
+                    warnings.warn("Unable to open %s" % (filepath))
+                else:
+                    self.images.append(image)
+                    self._record_load_time(filepath, load_time)
+
+    def load_pending_images(self):
+        """Open the images in :attr:`pending_filepaths`
+
+        This is meant to be run in a background thread. The images are not
+        added to the image set, pass each one to :meth:`add_image` in the main
+        thread. Call :meth:`cancel_loading` to stop opening images
+
+        Yields
+        ------
+        filepath : :obj:`str`
+            The path to the image
+        image : :class:`ImageStamp` or None
+            The image or ``None`` if the image could not be opened
+        load_time : :obj:`float`
+            The time it took to open the image
+        """
+
+        self._cancel_loading.clear()
+        filepaths = list(self.pending_filepaths)
+        results = self._iter_load_images(filepaths)
+        for filepath, (image, load_time) in zip(filepaths, results):
+            yield filepath, image, load_time
+
+    def cancel_loading(self):
+        """Stop opening the images in :meth:`load_pending_images`"""
+        self._cancel_loading.set()
+
+    def add_image(self, filepath, image, load_time=0.0):
+        """Add an image opened with :meth:`load_pending_images`
+
+        The image is cropped to the :attr:`shape` of the image set. When the
+        image is smaller than the :attr:`shape`, the image set, its subsets
+        and their ROIs are cropped to the smallest common shape like they are
+        when the images are opened at once (see :meth:`_crop_to_shape`). The
+        views of the image set and its subsets are told about the new image
+
+        Parameters
+        ----------
+        filepath : :obj:`str`
+            The path to the image
+        image : :class:`ImageStamp` or None
+            The image. If ``None``, the image is not added
+        load_time : :obj:`float` [``0.0``]
+            The time it took to open the image
+        """
+
+        if filepath in self.pending_filepaths:
+            self.pending_filepaths.remove(filepath)
+        self.filepaths.append(filepath)
+        if image is None:
+            warnings.warn("Unable to open %s" % (filepath))
+            return
+        rows, cols = image.shape[:2]
+        shape = (min(rows, self.shape[0]), min(cols, self.shape[1]))
+        is_smaller = shape != tuple(self.shape[:2])
+        image.crop(shape)
+        self.images.append(image)
+        self._record_load_time(filepath, load_time)
+        for image_set in [self] + self.subsets:
+            if is_smaller:
+                image_set._crop_to_shape(shape)
+            # The statistics do not have the new image
+            image_set._roi_stats = {}
+            for view in image_set._views:
+                view.add_image()
+
+    def _crop_to_shape(self, shape):
+        """Crop the images and ROIs to a smaller shape and update the views
+
+        The pixels of the ROIs outside of the new shape are lost. The pan is
+        moved so it stays inside the image
+
+        Parameters
+        ----------
+        shape : :obj:`tuple`
+            The number of rows and columns to crop to
+        """
+
+        rows, cols = shape
+        for image in self.images:
+            image.crop(shape)
+        self.shape = (rows, cols)
+        self._roi_data = self._roi_data[:rows, :cols].copy()
+        x, y = self.center
+        self._center = (
+            self._determine_center_x(x), self._determine_center_y(y)
+        )
+        for view in self._views:
+            view.set_image()
+            view.adjust_pan_size()
+            view.move_pan()
+        self._set_roi_data_in_views()
+
+    def _create_cube(self):
+        """Copy the data of the images into :attr:`cube` by wavelength
+
+        Images without a wavelength are put at the end in the order they were
+        opened. The :attr:`filepaths` are put in the same order as the images,
+        followed by the filepaths that could not be opened
+        """
+
+        if not self.images:
+            return
+        shapes = set(image.shape for image in self.images)
+        if len(shapes) != 1:
+            warnings.warn(
+                "Unable to create a cube of images with different bands"
+            )
+            return
+        self.images = sorted(
+            self.images,
+            key=lambda image: (
+                np.isnan(image.wavelength),
+                0.0 if np.isnan(image.wavelength) else image.wavelength,
+            )
+        )
+        opened = [image.filepath for image in self.images]
+        self.filepaths[:] = opened + [
+            filepath for filepath in self.filepaths if filepath not in opened
+        ]
+        dtype = np.result_type(*[image.data.dtype for image in self.images])
+        self.cube = np.empty((len(self.images),) + shapes.pop(), dtype=dtype)
+        for index, image in enumerate(self.images):
+            self.cube[index] = image.data
+            image.set_data(self.cube[index])
 
     def register(self, view):
         """Register a View with the model"""
@@ -450,7 +1464,145 @@ class PDSSpectImageSet(object):
         """:obj:`tuple` of two :class:`numpy.ndarray` : Coordinates of where
         there is a pixel selected in a ROI
         """
-        return np.where((self._roi_data != 0).any(axis=2))
+        flat_indices = np.sort(np.concatenate(
+            [np.empty(0, dtype=np.intp)] + list(self.roi_index.values())
+        ))
+        return np.unravel_index(flat_indices, self._roi_data.shape)
+
+    @property
+    def _roi_data(self):
+        """:class:`numpy.ndarray` : Label map of the ROIs
+
+        Each pixel is ``0`` or the label of its color (see
+        :meth:`_get_label_from_color`). Only change the labels with
+        :meth:`_set_roi_labels` so :attr:`roi_index` and the statistics of
+        :meth:`get_roi_statistics` stay up to date. Setting the label map
+        rebuilds them
+        """
+
+        return self._roi_labels
+
+    @_roi_data.setter
+    def _roi_data(self, roi_labels):
+        self._roi_labels = roi_labels
+        self._roi_index = None
+        self._roi_stats = {}
+
+    @property
+    def roi_index(self):
+        """:obj:`dict` : Sorted flat indices of the pixels of each label in
+        the ROI label map
+
+        The index is built from the label map the first time it is needed and
+        then kept up to date as ROIs are added and erased, so looking up the
+        pixels of a color does not need to search the whole image
+        """
+
+        if self._roi_index is None:
+            flat_labels = self._roi_labels.ravel()
+            flat_indices = np.flatnonzero(flat_labels)
+            labels = flat_labels[flat_indices]
+            self._roi_index = {}
+            for label in np.unique(labels):
+                self._roi_index[int(label)] = flat_indices[labels == label]
+        return self._roi_index
+
+    def _set_roi_labels(self, rows, cols, label):
+        """Set the label of pixels in the ROI label map and update
+        :attr:`roi_index` and the ROI statistics
+
+        Parameters
+        ----------
+        rows : :class:`numpy.ndarray`
+            Rows of the pixels
+        cols : :class:`numpy.ndarray`
+            Columns of the pixels
+        label : :obj:`int`
+            The new label of the pixels. ``0`` erases the pixels
+        """
+
+        rows, cols = np.asarray(rows, dtype=int), np.asarray(cols, dtype=int)
+        roi_index = self.roi_index
+        old_labels = self._roi_labels[rows, cols]
+        # Negative coordinates wrap around like they do when indexing
+        flat_indices = np.ravel_multi_index(
+            (rows, cols), self._roi_labels.shape, mode='wrap'
+        )
+        flat_indices, first = np.unique(flat_indices, return_index=True)
+        old_labels = old_labels[first]
+        for old_label in np.unique(old_labels).tolist():
+            if old_label == 0 or old_label == label:
+                continue
+            remaining = np.setdiff1d(
+                roi_index[old_label], flat_indices[old_labels == old_label],
+                assume_unique=True,
+            )
+            if remaining.size:
+                roi_index[old_label] = remaining
+            else:
+                del roi_index[old_label]
+            self._update_roi_statistics(
+                old_label, flat_indices[old_labels == old_label], False
+            )
+        if label != 0:
+            new_indices = flat_indices[old_labels != label]
+            if new_indices.size:
+                roi_index[label] = np.union1d(
+                    roi_index.get(label, new_indices[:0]), new_indices
+                )
+            self._update_roi_statistics(label, new_indices, True)
+        self._roi_labels[rows, cols] = label
+
+    def _update_roi_statistics(self, label, flat_indices, added):
+        """Add or remove pixels from the statistics of a label
+
+        Only labels whose statistics were asked for with
+        :meth:`get_roi_statistics` are kept up to date
+        """
+
+        stats = self._roi_stats.get(label)
+        if stats is None or flat_indices.size == 0:
+            return
+        spectra = self._get_spectra(
+            *np.unravel_index(flat_indices, self._roi_labels.shape)
+        )
+        if added:
+            stats.add(spectra)
+        else:
+            stats.remove(spectra)
+        if not stats.is_finite:
+            # Infinite pixels cannot be removed again, rebuild from the ROI
+            # the next time they are asked for
+            del self._roi_stats[label]
+
+    def get_roi_statistics(self, color):
+        """Get the mean and standard deviation of the ROI in each image
+
+        The statistics are computed from every pixel in the ROI the first
+        time and then updated with only the pixels that are added and erased
+
+        Parameters
+        ----------
+        color : :obj:`str`
+            The name a color in :attr:`colors`
+
+        Returns
+        -------
+        stats : :class:`~.roi_statistics.RunningStatistics`
+            The statistics of the ROI in each image in :attr:`images`
+        """
+
+        label = self._get_label_from_color(color)
+        stats = self._roi_stats.get(label)
+        if stats is None:
+            stats = RunningStatistics(len(self.images))
+            flat_indices = self.roi_index.get(label)
+            if flat_indices is not None:
+                stats.add(self._get_spectra(
+                    *np.unravel_index(flat_indices, self._roi_labels.shape)
+                ))
+            self._roi_stats[label] = stats
+        return stats
 
     @property
     def alpha255(self):
@@ -461,8 +1613,8 @@ class PDSSpectImageSet(object):
     def alpha(self):
         """:obj:`float` : The alpha value between 0 and 1
 
-        Setting the alpha value will change the opacity of all the ROIs and
-        then set the data in the views
+        Setting the alpha value will change the opacity of all the ROIs when
+        they are drawn. The ROI data is not changed
         """
 
         return self._alpha
@@ -470,8 +1622,7 @@ class PDSSpectImageSet(object):
     @alpha.setter
     def alpha(self, new_alpha):
         self._alpha = new_alpha
-        rows, cols = self.all_rois_coordinates
-        self._roi_data[rows, cols, 3] = self.alpha255
+        self._maskrgb.alpha = new_alpha
         for view in self._views:
             view.change_roi_opacity()
 
@@ -547,12 +1698,48 @@ class PDSSpectImageSet(object):
     @property
     def pan_data(self):
         """:class:`numpy.ndarray` : The data within the pan"""
-        return self.current_image.get_data()[self.pan_slice]
+        return self.current_image.get_region(*self.edges)
 
     @property
     def pan_roi_data(self):
-        """:class:`numpy.ndarray` : The ROI data in the pan"""
-        return self._roi_data[self.pan_slice]
+        """:class:`numpy.ndarray` : The opaque RGBA values of the ROIs in the
+        pan. :attr:`alpha` is applied when the ROIs are drawn
+        """
+        return self._get_roi_rgba_table()[self._roi_data[self.pan_slice]]
+
+    def _get_label_from_color(self, color):
+        """Get the label of a color in the ROI label map
+
+        Parameters
+        ----------
+        color : :obj:`str`
+            Name of a color in :attr:`colors`
+
+        Returns
+        -------
+        label : :obj:`int`
+            The label of the color. ``0`` is reserved for pixels not in a ROI
+        """
+
+        return self.colors.index(color) + 1
+
+    def _get_roi_rgba_table(self):
+        """Get the RGBA values of each label in the ROI label map
+
+        Returns
+        -------
+        rgba_table : :class:`numpy.ndarray`
+            ``(len(colors) + 1) x 4`` array where each row is the red, green,
+            blue, and alpha values normalized between 0 and 255 of the label
+            with the same index. The colors are opaque
+        """
+
+        rgba_table = np.zeros((len(self.colors) + 1, 4))
+        for color in self.colors:
+            label = self._get_label_from_color(color)
+            rgba_table[label, :3] = self._get_rgb255_from_color(color)
+            rgba_table[label, 3] = 255.
+        return rgba_table
 
     def _get_rgb255_from_color(self, color):
         """Get the rgb values normalized between 0 and 255 given a color
@@ -606,7 +1793,7 @@ class PDSSpectImageSet(object):
         if isinstance(coordinates, np.ndarray):
             coordinates = np.column_stack(coordinates)
         rows, cols = coordinates
-        self._roi_data[rows, cols] = [0.0, 0.0, 0.0, 0.0]
+        self._set_roi_labels(rows, cols, 0)
 
     def add_coords_to_roi_data_with_color(self, coordinates, color):
         """Add coordinates to ROI data in the with the given color
@@ -626,10 +1813,8 @@ class PDSSpectImageSet(object):
         if isinstance(coordinates, np.ndarray):
             coordinates = np.column_stack(coordinates)
         rows, cols = coordinates
-        rgba = self._get_rgba_from_color(color)
-        self._roi_data[rows, cols] = rgba
-        for view in self._views:
-            view.set_roi_data()
+        self._set_roi_labels(rows, cols, self._get_label_from_color(color))
+        self._set_roi_data_in_views()
 
     def map_zoom_to_full_view(self):
         """Get the change in x and y values to the center of the image
@@ -663,13 +1848,308 @@ class PDSSpectImageSet(object):
             corresponding y coordinates
         """
 
-        rgba = self._get_rgba_from_color(color)
-        coordinates = np.where(
-            (self._roi_data == rgba).all(axis=2)
-        )
+        label = self._get_label_from_color(color)
+        flat_indices = self.roi_index.get(label, np.empty(0, dtype=np.intp))
+        coordinates = np.unravel_index(flat_indices, self._roi_data.shape)
 
         return coordinates
 
+    def get_coordinates_in_ranges(self, ranges):
+        """The coordinates of the pixels within value ranges in images
+
+        A pixel is selected when its value in every image is within that
+        image's range. In a multi-band image, the pixel's value in every band
+        must be within the range
+
+        Parameters
+        ----------
+        ranges : :obj:`list` of :obj:`tuple`
+            ``(image, low, high)`` for each image where ``image`` is an
+            :class:`ImageStamp` in :attr:`images` or its index. ``low`` or
+            ``high`` may be ``None`` to leave the range open on that side
+
+        Returns
+        -------
+        coordinates : :obj:`tuple` of two :class:`numpy.ndarray`
+            The first array are the x coordinates and the second are the
+            corresponding y coordinates
+        """
+
+        mask = np.ones(self.shape[:2], dtype=bool)
+        in_range = np.empty_like(mask)
+        for image, low, high in ranges:
+            if not isinstance(image, ImageStamp):
+                image = self.images[image]
+            data = image.data
+            if in_range.shape != data.shape:
+                in_range = np.empty(data.shape, dtype=bool)
+            for bound, compare in ((low, np.greater_equal),
+                                   (high, np.less_equal)):
+                if bound is None:
+                    continue
+                compare(data, bound, out=in_range)
+                if in_range.ndim > 2:
+                    mask &= in_range.all(axis=2)
+                else:
+                    mask &= in_range
+        return np.nonzero(mask)
+
+    def _get_spectra(self, rows, cols):
+        """Get the values of the pixels in every image
+
+        Parameters
+        ----------
+        rows : :class:`numpy.ndarray`
+            The rows of the pixels
+        cols : :class:`numpy.ndarray`
+            The columns of the pixels
+
+        Returns
+        -------
+        spectra : :class:`numpy.ndarray`
+            ``(n_images, n_pixels)`` array of the values of the pixels in
+            each image in :attr:`images`
+        """
+
+        if self.cube is not None:
+            return self.cube[:, rows, cols].astype(float)
+        spectra = np.empty((len(self.images), len(rows)))
+        for index, image in enumerate(self.images):
+            spectra[index] = image.data[rows, cols]
+        return spectra
+
+    def grow_region(self, row, col, tolerance=None, max_area=None):
+        """Get the connected pixels with a spectrum similar to a seed pixel
+
+        The region grows from the seed one ring of neighboring pixels at a
+        time. Only the neighbors of the pixels added in the last ring are
+        compared to the seed, so each pixel is read at most once. A pixel is
+        added when the distance between its spectrum and the seed's spectrum
+        across all the images is at most ``tolerance`` times the magnitude of
+        the seed's spectrum
+
+        Parameters
+        ----------
+        row : :obj:`int`
+            The row of the seed pixel
+        col : :obj:`int`
+            The column of the seed pixel
+        tolerance : :obj:`float` [``None``]
+            The relative distance from the seed's spectrum. If ``None``, use
+            :attr:`wand_tolerance`
+        max_area : :obj:`int` [``None``]
+            Stop growing when the region has this many pixels. If ``None``,
+            use :attr:`wand_max_area`
+
+        Returns
+        -------
+        coordinates : :class:`numpy.ndarray`
+            ``n x 2`` array of the row and column of each pixel in the region
+        """
+
+        if tolerance is None:
+            tolerance = self.wand_tolerance
+        if max_area is None:
+            max_area = self.wand_max_area
+        rows, cols = self.shape[:2]
+        seed = self._get_spectra(np.array([row]), np.array([col]))
+        limit = (tolerance ** 2) * np.sum(seed ** 2)
+        visited = np.zeros(rows * cols, dtype=bool)
+        frontier = np.array([row * cols + col])
+        visited[frontier] = True
+        region = [frontier]
+        area = 1
+        while frontier.size and area < max_area:
+            frontier_rows, frontier_cols = np.divmod(frontier, cols)
+            neighbors = np.unique(np.concatenate((
+                frontier[frontier_rows > 0] - cols,
+                frontier[frontier_rows < rows - 1] + cols,
+                frontier[frontier_cols > 0] - 1,
+                frontier[frontier_cols < cols - 1] + 1,
+            )))
+            neighbors = neighbors[~visited[neighbors]]
+            visited[neighbors] = True
+            spectra = self._get_spectra(*np.divmod(neighbors, cols))
+            distance = np.sum((spectra - seed) ** 2, axis=0)
+            frontier = neighbors[distance <= limit][:max_area - area]
+            region.append(frontier)
+            area += frontier.size
+        coordinates = np.column_stack(np.divmod(np.concatenate(region), cols))
+        return coordinates
+
+    def morph_roi(self, color, operation, radius=1):
+        """Apply a morphology operation to the ROI with the given color
+
+        The operation is only applied within the bounding box of the ROI
+        grown by ``radius``. Pixels added to the ROI replace the ROIs of other
+        colors and the views are updated once
+
+        Parameters
+        ----------
+        color : :obj:`str`
+            The name a color in :attr:`colors`
+        operation : :obj:`str`
+            One of ``dilate``, ``erode``, ``open``, ``close`` or
+            ``fill holes``. See :mod:`~pdsspect.morphology`
+        radius : :obj:`int` [``1``]
+            Radius of the square structuring element
+
+        Raises
+        ------
+        ValueError
+            When the operation is not a morphology operation
+        """
+
+        if operation not in MORPHOLOGY_OPERATIONS:
+            raise ValueError(
+                'Operation must be one of the following %s' % (
+                    ', '.join(MORPHOLOGY_OPERATIONS)
+                )
+            )
+        label = self._get_label_from_color(color)
+        box = self._get_roi_bounding_box(label, pad=max(radius, 1))
+        if box is None:
+            return
+        y1, y2, x1, x2 = box
+        before = self._roi_data[y1:y2, x1:x2] == label
+        after = MORPHOLOGY_OPERATIONS[operation](before, radius)
+        self._replace_roi_in_box(label, box, before, after)
+
+    def _get_roi_bounding_box(self, label, pad=0):
+        """Get the bounding box of the ROI with the given label
+
+        Parameters
+        ----------
+        label : :obj:`int`
+            The label of the ROI
+        pad : :obj:`int` [``0``]
+            Number of pixels to grow the box by on each side. The box is
+            clipped to the image
+
+        Returns
+        -------
+        box : :obj:`tuple` of four :obj:`int` or None
+            The ``y1``, ``y2``, ``x1``, and ``x2`` where the ROI is within
+            ``[y1:y2, x1:x2]``. ``None`` if the ROI has no pixels
+        """
+
+        flat_indices = self.roi_index.get(label)
+        if flat_indices is None or flat_indices.size == 0:
+            return None
+        height, width = self._roi_data.shape
+        # The flat indices are sorted so the first and last are in the top
+        # and bottom rows
+        y1 = flat_indices[0] // width
+        y2 = flat_indices[-1] // width + 1
+        cols = flat_indices % width
+        x1, x2 = cols.min(), cols.max() + 1
+        return (
+            int(max(y1 - pad, 0)), int(min(y2 + pad, height)),
+            int(max(x1 - pad, 0)), int(min(x2 + pad, width)),
+        )
+
+    def _replace_roi_in_box(self, label, box, before, after):
+        """Replace the pixels of an ROI within a box and update the views
+
+        Parameters
+        ----------
+        label : :obj:`int`
+            The label of the ROI
+        box : :obj:`tuple` of four :obj:`int`
+            The ``y1``, ``y2``, ``x1``, and ``x2`` of the box
+        before : :class:`numpy.ndarray`
+            Mask of the ROI in the box
+        after : :class:`numpy.ndarray`
+            Mask of the new ROI in the box
+        """
+
+        y1, _, x1, _ = box
+        added_rows, added_cols = np.nonzero(after & ~before)
+        removed_rows, removed_cols = np.nonzero(before & ~after)
+        self._set_roi_labels(removed_rows + y1, removed_cols + x1, 0)
+        self._set_roi_labels(added_rows + y1, added_cols + x1, label)
+        self._set_roi_data_in_views()
+
+    def _get_roi_operand(self, operand):
+        """Get the image set, label, and bounding box of an ROI operand"""
+        if isinstance(operand, tuple):
+            image_set, color = operand
+        else:
+            image_set, color = self, operand
+        label = image_set._get_label_from_color(color)
+        return image_set, label, image_set._get_roi_bounding_box(label)
+
+    def combine_rois(self, operation, first, second, target):
+        """Set an ROI to the union, intersection, difference or XOR of two
+        ROIs
+
+        Each ROI is compared as a mask within the bounding box of the result
+        in one pass, so the time depends on the size of the box and not the
+        number of pixels in the ROIs
+
+        Parameters
+        ----------
+        operation : :obj:`str`
+            One of :attr:`roi_operations`. ``difference`` is the pixels in
+            ``first`` that are not in ``second``
+        first : :obj:`str` or :obj:`tuple`
+            The name of a color in :attr:`colors` or a tuple of an image set
+            (i.e., a :class:`SubPDSSpectImageSet` of another window) and the
+            name of the color in that set
+        second : :obj:`str` or :obj:`tuple`
+            The second ROI, like ``first``
+        target : :obj:`str`
+            The name of the color in this image set whose ROI is replaced by
+            the result. If ``eraser``, the pixels of the result are erased
+            from every ROI instead
+
+        Raises
+        ------
+        ValueError
+            When the operation is not in :attr:`roi_operations`
+        """
+
+        if operation not in self.roi_operations:
+            raise ValueError(
+                'Operation must be one of the following %s' % (
+                    ', '.join(self.roi_operations)
+                )
+            )
+        first_set, first_label, first_box = self._get_roi_operand(first)
+        second_set, second_label, second_box = self._get_roi_operand(second)
+        if operation == 'intersection':
+            result_box = _intersect_boxes(first_box, second_box)
+        elif operation == 'difference':
+            result_box = first_box
+        else:
+            result_box = _unite_boxes(first_box, second_box)
+        if target == 'eraser':
+            box = result_box
+        else:
+            target_label = self._get_label_from_color(target)
+            box = _unite_boxes(
+                result_box, self._get_roi_bounding_box(target_label)
+            )
+        if box is None:
+            return
+        y1, y2, x1, x2 = box
+        first_mask = first_set._roi_data[y1:y2, x1:x2] == first_label
+        second_mask = second_set._roi_data[y1:y2, x1:x2] == second_label
+        if operation == 'union':
+            result = first_mask | second_mask
+        elif operation == 'intersection':
+            result = first_mask & second_mask
+        elif operation == 'difference':
+            result = first_mask & ~second_mask
+        else:
+            result = first_mask ^ second_mask
+        if target == 'eraser':
+            rows, cols = np.nonzero(result)
+            self.erase_coords((rows + y1, cols + x1))
+            return
+        before = self._roi_data[y1:y2, x1:x2] == target_label
+        self._replace_roi_in_box(target_label, box, before, result)
+
     def delete_rois_with_color(self, color):
         """Delete the ROIs with the given color
 
@@ -681,15 +2161,65 @@ class PDSSpectImageSet(object):
 
         coords = self.get_coordinates_of_color(color)
         self._erase_coords(coords)
-        for view in self._views:
-            view.set_roi_data()
+        self._set_roi_data_in_views()
+
+    def erase_coords(self, coordinates):
+        """Erase the ROIs in the coordinates and update the views
+
+        Parameters
+        ----------
+        coordinates : :class:`numpy.ndarray` or :obj:`tuple`
+            Either a ``(m x 2)`` array or a tuple of two arrays of the rows
+            and columns of the pixels
+        """
+
+        self._erase_coords(coordinates)
+        self._set_roi_data_in_views()
 
     def delete_all_rois(self):
         """Delete all of the ROIs"""
         self._erase_coords(self.all_rois_coordinates)
+        self._set_roi_data_in_views()
+
+    def _set_roi_data_in_views(self):
+        """Set the ROI data in the views, or wait until the current
+        :meth:`batch` is closed
+        """
+
+        if self._batch_depth:
+            self._roi_data_changed = True
+            return
         for view in self._views:
             view.set_roi_data()
 
+    @contextmanager
+    def batch(self):
+        """Context manager to change the ROIs of the image set and its subsets
+        with one update of each view
+
+        The views of the image set and its subsets are not updated while ROIs
+        are added or deleted in the batch. When the batch is closed, each view
+        whose ROIs changed is updated once. Batches can be nested
+
+        Example
+        -------
+        >>> with image_set.batch():
+        ...     image_set.add_coords_to_roi_data_with_color(coords, 'red')
+        ...     image_set.add_coords_to_roi_data_with_color(coords2, 'brown')
+        """
+
+        image_sets = [self] + self.subsets
+        for image_set in image_sets:
+            image_set._batch_depth += 1
+        try:
+            yield self
+        finally:
+            for image_set in image_sets:
+                image_set._batch_depth -= 1
+                if image_set._batch_depth == 0 and image_set._roi_data_changed:
+                    image_set._roi_data_changed = False
+                    image_set._set_roi_data_in_views()
+
     def create_subset(self):
         """Create a subset and add it to the list of subsets
 
@@ -764,11 +2294,11 @@ class PDSSpectImageSet(object):
     def simultaneous_roi(self, state):
         self._simultaneous_roi = state
         if state:
-            for subset in self.subsets:
-                subset._simultaneous_roi = state
-                subset._roi_data = self._roi_data.copy()
-                for view in subset._views:
-                    view.set_roi_data()
+            with self.batch():
+                for subset in self.subsets:
+                    subset._simultaneous_roi = state
+                    subset._roi_data = self._roi_data.copy()
+                    subset._set_roi_data_in_views()
         else:
             for subset in self.subsets:
                 subset._simultaneous_roi = state
@@ -822,9 +2352,12 @@ class SubPDSSpectImageSet(PDSSpectImageSet):
         self._zoom = parent_set.zoom
         self._center = parent_set.center
         self._alpha = parent_set.alpha
-        self._roi_data = parent_set._roi_data.copy()
-        self._roi_data.fill(0)
+        self._maskrgb.alpha = parent_set.alpha
+        self._roi_data = np.zeros_like(parent_set._roi_data)
         self._selection_index = parent_set.selection_index
+        self.brush_radius = parent_set.brush_radius
+        self.wand_tolerance = parent_set.wand_tolerance
+        self.wand_max_area = parent_set.wand_max_area
         self._flip_x = parent_set.flip_x
         self._flip_y = parent_set.flip_y
         self._swap_xy = parent_set.swap_xy
@@ -835,6 +2368,11 @@ class SubPDSSpectImageSet(PDSSpectImageSet):
 
     def _create_image_list(self):
         self.images = self.parent_set.images
+        self.filepaths = self.parent_set.filepaths
+        self.pending_filepaths = self.parent_set.pending_filepaths
+        self.load_times = self.parent_set.load_times
+        self.cache = self.parent_set.cache
+        self.cube = self.parent_set.cube
 
 
 class PDSSpectImageSetViewBase(object):
@@ -864,3 +2402,6 @@ class PDSSpectImageSetViewBase(object):
 
     def change_roi_opacity(self):
         pass
+
+    def add_image(self):
+        pass
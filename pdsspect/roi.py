@@ -7,7 +7,9 @@ from functools import wraps
 from contextlib import contextmanager
 
 import numpy as np
+from ginga.RGBImage import RGBImage
 from ginga.canvas.types import basic
+from ginga.canvas.types.image import Image
 
 
 @six.add_metaclass(abc.ABCMeta)
@@ -262,62 +264,79 @@ class ROIBase(basic.Polygon):
             Boolean array where coordinates that are in ROI are True
         """
 
-        # NOTE: we use a version of the ray casting algorithm
-        # See: http://alienryderflex.com/polygon/
-        xa, ya = x_arr, y_arr
-
-        # Result 1 and 2 are used to inclusively select pixels on left and
-        # right side of the ROI. Result is the combination of the two
-        result = np.zeros(y_arr.shape, dtype=np.bool)
-        result1 = np.zeros(y_arr.shape, dtype=np.bool)
-        result2 = np.zeros(y_arr.shape, dtype=np.bool)
-
-        points = self.get_data_points()
-
-        xj, yj = points[-1]
-        for point in points:
-            xi, yi = point
-            tf = np.logical_and(
-                np.logical_or(np.logical_and(yi < ya, yj >= ya),
-                              np.logical_and(yj < ya, yi >= ya)),
-                np.logical_or(xi <= xa, xj <= xa)
-            )
-            rs, cs = np.where(tf)
-            cross1 = np.zeros(ya.shape, dtype=bool)
-            cross2 = np.zeros(ya.shape, dtype=bool)
-            mask1 = (
-                (xi + (ya[rs, cs] - yi) / (yj - yi) * (xj - xi)) < xa[rs, cs]
-            )
-            mask2 = (
-                (xi + (ya[rs, cs] - yi) / (yj - yi) * (xj - xi)) <= xa[rs, cs]
-            )
-            cross1[rs, cs] = mask1
-            cross2[rs, cs] = mask2
-            result1[tf] ^= cross1[tf]
-            result2[tf] ^= cross2[tf]
-            xj, yj = xi, yi
-        result = np.logical_or(result1, result2)
-
-        return result
-
-    def _get_mask_from_roi(self, roi, mask=None):
-        """Get mask array from ROI
+        # NOTE: This is a scanline fill that gives the same result as the ray
+        # casting algorithm (see: http://alienryderflex.com/polygon/). Each
+        # edge is crossed by the rows of points whose y value is above the
+        # edge's lower end and at or below its upper end. The crossings are
+        # only computed for those rows and a point is inside if an odd number
+        # of crossings in its row are to the left of it. A point is also
+        # inside if an odd number of crossings are to the left of it or on it
+        # so pixels on the left and right edges of the ROI are included
+        xa, ya = np.asarray(x_arr), np.asarray(y_arr)
+        result = np.zeros(ya.shape, dtype=bool)
+        points = np.asarray(self.get_data_points(), dtype=float)
+        if ya.size == 0 or len(points) == 0:
+            return result
+
+        # Each edge goes from the previous point (j) to the point (i)
+        xi, yi = points[:, 0], points[:, 1]
+        xj, yj = np.roll(xi, 1), np.roll(yi, 1)
+
+        # Group the points by their y value
+        flat_y = ya.ravel()
+        point_order = np.argsort(flat_y, kind='mergesort')
+        sorted_y = flat_y[point_order]
+        point_starts = np.flatnonzero(
+            np.concatenate([[True], sorted_y[1:] != sorted_y[:-1]])
+        )
+        y_values = sorted_y[point_starts]
+        point_starts = np.append(point_starts, len(sorted_y))
+
+        first = np.searchsorted(y_values, np.minimum(yi, yj), side='right')
+        last = np.searchsorted(y_values, np.maximum(yi, yj), side='right')
+        spans = last - first
+        edges = np.repeat(np.arange(len(points)), spans)
+        rows = (
+            np.arange(spans.sum()) - np.repeat(np.cumsum(spans) - spans, spans)
+            + np.repeat(first, spans)
+        )
+        xi, yi, xj, yj = xi[edges], yi[edges], xj[edges], yj[edges]
+        crossings = xi + (y_values[rows] - yi) / (yj - yi) * (xj - xi)
+        order = np.lexsort((crossings, rows))
+        rows, crossings = rows[order], crossings[order]
+        row_starts = np.searchsorted(rows, np.arange(len(y_values) + 1))
+
+        flat_x = xa.ravel()
+        flat_result = result.ravel()
+        for row in np.unique(rows):
+            row_crossings = crossings[row_starts[row]:row_starts[row + 1]]
+            indices = point_order[point_starts[row]:point_starts[row + 1]]
+            x = flat_x[indices]
+            left = np.searchsorted(row_crossings, x, side='left')
+            left_or_on = np.searchsorted(row_crossings, x, side='right')
+            flat_result[indices] = (left % 2 == 1) | (left_or_on % 2 == 1)
+
+        return flat_result.reshape(ya.shape)
+
+    def _get_mask_from_roi(self, roi):
+        """Get mask array of the ROI's bounding box
 
         Parameters
         ----------
         roi : :class:`ROIBase`
             The region of interest
-        mask : :class:`numpy.ndarray`
-            Boolean array of the image
 
         Returns
         -------
         mask : :class:`numpy.ndarray`
-            Boolean array of the image with ROI coordinates as ``True``
+            Boolean array the size of the ROI's bounding box with ROI
+            coordinates as ``True``
+        row : :obj:`int`
+            The row in the image of the first row of the mask
+        col : :obj:`int`
+            The column in the image of the first column of the mask
         """
 
-        if mask is None:
-            mask = np.zeros(self.image_set.current_image.shape, dtype=np.bool)
         x1, y1, x2, y2 = roi.get_llur()
         x1, y1, = int(math.floor(x1)), int(math.floor(y1))
         x2, y2 = int(math.ceil(x2)), int(math.ceil(y2))
@@ -333,11 +352,9 @@ class ROIBase(basic.Polygon):
                 self.move_delta(0, -1)
             y2 = int(self.top - 1.5)
 
-        X, Y = np.mgrid[x1:x2, y1:y2]
-        rows, cols = Y, X
-        coords = roi.contains_arr(X, Y)
-        mask[rows, cols] = coords
-        return mask
+        Y, X = np.mgrid[y1:y2, x1:x2]
+        mask = roi.contains_arr(X, Y)
+        return mask, y1, x1
 
     @contextmanager
     def _temporary_move_by_delta(self, delta):
@@ -363,9 +380,13 @@ class ROIBase(basic.Polygon):
         """Get the coordinates in the region of interest"""
         delta = self.image_set.map_zoom_to_full_view()
         with self._temporary_move_by_delta(delta) as moved_roi:
-            mask = self._get_mask_from_roi(moved_roi)
-            roi_coords = np.where(mask)
-        return roi_coords
+            mask, row, col = self._get_mask_from_roi(moved_roi)
+        rows, cols = np.where(mask)
+        rows += row
+        cols += col
+        height, width = self.image_set.current_image.shape[:2]
+        in_image = (rows >= 0) & (rows < height) & (cols >= 0) & (cols < width)
+        return rows[in_image], cols[in_image]
 
 
 class Polygon(ROIBase):
@@ -686,3 +707,192 @@ class Pencil(ROIBase):
             coords.append((row, column))
         coordinates = np.array(coords)
         return coordinates
+
+
+class Brush(ROIBase):
+    """Paint pixels with a round brush while the mouse is dragged
+
+    The painted pixels are kept in a boolean buffer the size of the pan and
+    shown as a single image on the canvas, so a stroke does not add a canvas
+    object for every pixel. The radius of the brush is the image set's
+    :attr:`~.pdsspect_image_set.PDSSpectImageSet.brush_radius`
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(Brush, self).__init__(*args, **kwargs)
+        left, bottom, right, top = self.image_set.edges
+        self._offset = np.array([bottom, left])
+        self._painted = np.zeros((top - bottom, right - left), dtype=bool)
+        self._stroke = RGBImage(
+            data_np=np.zeros(self._painted.shape + (4,), dtype=np.uint8)
+        )
+        self._rgba = np.append(
+            self.image_set._get_rgb255_from_color(self.color),
+            self.alpha * 255.
+        ).astype(np.uint8)
+        radius = int(self.image_set.brush_radius)
+        rows, cols = np.mgrid[-radius:radius + 1, -radius:radius + 1]
+        inside = rows ** 2 + cols ** 2 <= radius ** 2
+        self._footprint = np.column_stack((rows[inside], cols[inside]))
+        self._last_pixel = None
+        self._current_path = Image(0, 0, self._stroke)
+        self.view_canvas.add(self._current_path)
+
+    def _get_pixel(self, data_x, data_y):
+        """Get the pixel in the pan that contains the coordinates
+
+        Parameters
+        ----------
+        data_x : :obj:`float`
+            The x coordinate
+        data_y : :obj:`float`
+            The y coordinate
+
+        Returns
+        -------
+        pixel : :class:`numpy.ndarray`
+            The row and column of the pixel
+        """
+
+        return np.floor([data_y + .5, data_x + .5]).astype(int)
+
+    def _paint(self, data_x, data_y):
+        """Paint the brush from the last painted pixel to the coordinates
+
+        The pixels in between are painted as well so a fast drag does not
+        leave gaps in the stroke
+
+        Parameters
+        ----------
+        data_x : :obj:`float`
+            The x coordinate
+        data_y : :obj:`float`
+            The y coordinate
+        """
+
+        pixel = self._get_pixel(data_x, data_y)
+        if self._last_pixel is None:
+            centers = pixel[np.newaxis]
+        else:
+            steps = max(np.abs(pixel - self._last_pixel).max(), 1)
+            fractions = np.linspace(0, 1, steps + 1)[:, np.newaxis]
+            centers = np.round(
+                self._last_pixel + fractions * (pixel - self._last_pixel)
+            ).astype(int)
+        self._last_pixel = pixel
+        pixels = (
+            centers[:, np.newaxis, :] + self._footprint[np.newaxis]
+        ).reshape(-1, 2)
+        height, width = self._painted.shape
+        inside = (
+            (pixels[:, 0] >= 0) & (pixels[:, 0] < height) &
+            (pixels[:, 1] >= 0) & (pixels[:, 1] < width)
+        )
+        rows, cols = pixels[inside].T
+        self._painted[rows, cols] = True
+        self._stroke.get_data()[rows, cols] = self._rgba
+
+    @ROIBase.draw_after
+    def start_ROI(self, data_x, data_y):
+        """Start painting on left click
+
+        Parameters
+        ----------
+        data_x : :obj:`float`
+            The x coordinate
+        data_y : :obj:`float`
+            The y coordinate
+        """
+
+        self._paint(data_x, data_y)
+
+    @ROIBase.draw_after
+    def continue_ROI(self, data_x, data_y):
+        """Paint while the mouse is dragged
+
+        Parameters
+        ----------
+        data_x : :obj:`float`
+            The x coordinate
+        data_y : :obj:`float`
+            The y coordinate
+        """
+
+        self._paint(data_x, data_y)
+
+    def extend_ROI(self, data_x, data_y):
+        pass
+
+    @ROIBase.draw_after
+    def stop_ROI(self, data_x, data_y):
+        """Set the painted pixels as roi coordinates when the mouse is released
+
+        Parameters
+        ----------
+        data_x : :obj:`float`
+            The x coordinate
+        data_y : :obj:`float`
+            The y coordinate
+
+        Returns
+        -------
+        coordinates : :class:`numpy.ndarray`
+            Coordinates of the painted pixels
+        """
+
+        self.view_canvas.deleteObject(self._current_path)
+        coordinates = np.column_stack(np.nonzero(self._painted))
+        return coordinates + self._offset
+
+
+class MagicWand(ROIBase):
+    """Select the connected pixels with a spectrum similar to the clicked
+    pixel
+
+    See :meth:`~.pdsspect_image_set.PDSSpectImageSet.grow_region`
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(MagicWand, self).__init__(*args, **kwargs)
+        self._seed = None
+
+    def start_ROI(self, data_x, data_y):
+        """Choose the seed pixel on left click
+
+        Parameters
+        ----------
+        data_x : :obj:`float`
+            The x coordinate
+        data_y : :obj:`float`
+            The y coordinate
+        """
+
+        left, bottom, _, _ = self.image_set.edges
+        self._seed = (
+            int(math.floor(data_y + .5)) + bottom,
+            int(math.floor(data_x + .5)) + left,
+        )
+
+    def continue_ROI(self, data_x, data_y):
+        self.start_ROI(data_x, data_y)
+
+    def extend_ROI(self, data_x, data_y):
+        pass
+
+    def stop_ROI(self, data_x, data_y):
+        """Grow the region from the seed pixel
+
+        Parameters
+        ----------
+        data_x : :obj:`float`
+            The x coordinate
+        data_y : :obj:`float`
+            The y coordinate
+
+        Returns
+        -------
+        coordinates : :class:`numpy.ndarray`
+            Coordinates of the pixels in the region
+        """
+
+        return self.image_set.grow_region(*self._seed)
@@ -80,7 +80,7 @@ class ROIHistogramModel(ROIPlotModel):
     def xlim(self):
         """:obj:`list` of two :obj:`float` : min max of current image's data"""
         data = self.image_set.current_image.data
-        xlim = [data.min(), data.max()]
+        xlim = [float(data.min()), float(data.max())]
         return xlim
 
     @property
@@ -89,7 +89,7 @@ class ROIHistogramModel(ROIPlotModel):
         if not self.compare_data:
             raise RuntimeError('Cannot call when not comparing images')
         data = self.image_set.images[self.image_index].data
-        ylim = [data.min(), data.max()]
+        ylim = [float(data.min()), float(data.max())]
         return ylim
 
 
@@ -184,6 +184,12 @@ class ROIHistogramWidget(ROIPlotWidget):
 
         self.controller.set_image_index(index)
 
+    def add_image(self):
+        """Add new images to the :attr:`image_menu`"""
+        images = self.model.image_set.images
+        for image in images[self.image_menu.count():]:
+            self.image_menu.addItem(image.image_name)
+
     def set_image(self):
         if self.model.image_index == self.model.image_set.current_image_index:
             self.select_image(-1)
@@ -2,6 +2,7 @@ import numpy as np
 from qtpy import QtWidgets
 
 from .pdsspect_image_set import ginga_colors
+from .classification import SpectralAngleMapper
 from .roi_plot import ROIPlotModel, ROIPlotController, ROIPlotWidget, ROIPlot
 
 
@@ -17,6 +18,19 @@ class ROILinePlotModel(ROIPlotModel):
                 wavelengths.append(image.wavelength)
         return sorted(wavelengths)
 
+    @property
+    def wavelength_indices(self):
+        """:obj:`list` : Indices of the images with a wavelength in the
+        :attr:`image_set` sorted by wavelength
+        """
+
+        images = self.image_set.images
+        indices = [
+            index for index, image in enumerate(images)
+            if not np.isnan(image.wavelength)
+        ]
+        return sorted(indices, key=lambda index: images[index].wavelength)
+
     def data_with_color(self, color):
         """Get the data inside the ROI color if the image has a wavelength
 
@@ -28,23 +42,37 @@ class ROILinePlotModel(ROIPlotModel):
         Returns
         -------
         data : :obj:`list` or :class:`numpy.ndarray`
-            Sorted list of arrays of data by wavelength
+            Sorted list of arrays of data by wavelength. If the
+            :attr:`image_set` has a
+            :attr:`~.pdsspect_image_set.PDSSpectImageSet.cube`, the data is a
+            single array gathered from the cube
         """
 
-        images = []
         rows, cols = self.image_set.get_coordinates_of_color(color)
-        for image in self.image_set.images:
-            if not np.isnan(image.wavelength):
-                images.append(image)
-        images = sorted(images, key=lambda image: image.wavelength)
-        data = [image.data[rows, cols] for image in images]
+        images = self.image_set.images
+        indices = self.wavelength_indices
+        if self.image_set.cube is not None:
+            return self.image_set.cube[:, rows, cols][indices]
+        data = [images[index].data[rows, cols] for index in indices]
         return data
 
 
 class ROILinePlotController(ROIPlotController):
     """Controller for :class:`ROILinePlotWidget`"""
 
-    pass
+    def classify(self, threshold):
+        """Add pixels to the ROI whose mean spectrum is closest to theirs
+
+        See :class:`~.classification.SpectralAngleMapper`
+
+        Parameters
+        ----------
+        threshold : :obj:`float`
+            The largest spectral angle in radians of a classified pixel
+        """
+
+        mapper = SpectralAngleMapper(self.model, threshold)
+        mapper.apply(self.model.selected_colors or None)
 
 
 class ROILinePlotWidget(ROIPlotWidget):
@@ -61,14 +89,32 @@ class ROILinePlotWidget(ROIPlotWidget):
         The model
     controller : :class:`ROILinePlotController`
         The controller
+    angle_label : :class:`QtWidgets.QLabel <PySide.QtGui.QLabel>`
+        Label for the :attr:`angle_box`
+    angle_box : :class:`QtWidgets.QDoubleSpinBox\
+    <PySide.QtGui.QDoubleSpinBox>`
+        The largest spectral angle in radians of a classified pixel
+    classify_btn : :class:`QtWidgets.QPushButton <PySide.QtGui.QPushButton>`
+        Classify the pixels by the mean spectra of the selected colors
     """
 
     def __init__(self, model):
         self.model = model
         self.controller = ROILinePlotController(model, self)
+        self.angle_label = QtWidgets.QLabel('Max Angle:')
+        self.angle_box = QtWidgets.QDoubleSpinBox()
+        self.angle_box.setRange(0., 1.57)
+        self.angle_box.setSingleStep(.01)
+        self.angle_box.setValue(.1)
+        self.classify_btn = QtWidgets.QPushButton('Classify')
+        self.classify_btn.clicked.connect(self.classify)
         super(ROILinePlotWidget, self).__init__(model)
         self.setWindowTitle('ROI Line Plot')
 
+    def classify(self):
+        """Classify the pixels with the angle in :attr:`angle_box`"""
+        self.controller.classify(self.angle_box.value())
+
     def _create_roi_plot(self):
         self.roi_plot = ROILinePlot(self.model)
 
@@ -76,10 +122,16 @@ class ROILinePlotWidget(ROIPlotWidget):
         save_layout = QtWidgets.QHBoxLayout()
         save_layout.addWidget(self.save_btn)
         save_layout.addStretch()
+        classify_layout = QtWidgets.QHBoxLayout()
+        classify_layout.addWidget(self.angle_label)
+        classify_layout.addWidget(self.angle_box)
+        classify_layout.addWidget(self.classify_btn)
+        classify_layout.addStretch()
         self.main_layout.addLayout(save_layout, 0, 0)
         self.main_layout.addLayout(self.view_boxes_layout, 0, 1, 1, 2)
         self.main_layout.addWidget(self.roi_plot, 1, 0, 2, 2)
         self.main_layout.addLayout(self.checkbox_layout, 1, 2)
+        self.main_layout.addLayout(classify_layout, 3, 0, 1, 2)
         self.main_layout.setColumnStretch(1, 1)
         self.main_layout.setRowStretch(1, 1)
         self.setLayout(self.main_layout)
@@ -109,23 +161,17 @@ class ROILinePlot(ROIPlot):
         """Set the data of the selected colors on the line plot"""
         self._ax.cla()
         wavelengths = self.model.wavelengths
+        indices = self.model.wavelength_indices
         for color in self.model.selected_colors:
             rgb = ginga_colors.lookup_color(color)
-            data = self.model.data_with_color(color)
-            means = []
-            stdevs = []
-            for array in data:
-                if len(array) == 0:
-                    break
-                means.append(array.mean())
-                stdevs.append(np.std(array))
-            should_not_plot = len(means) != len(wavelengths)
+            stats = self.model.image_set.get_roi_statistics(color)
+            should_not_plot = stats.count == 0 and len(wavelengths) > 0
             if should_not_plot:
                 continue
             self._ax.errorbar(
                 x=wavelengths,
-                y=means,
-                yerr=stdevs,
+                y=stats.mean[indices],
+                yerr=stats.std[indices],
                 fmt='-s',
                 color=rgb,
                 capsize=5,
@@ -474,3 +474,7 @@ class ROIPlot(FigureCanvasQTAgg, PDSSpectImageSetViewBase):
     def set_roi_data(self):
         """Set data when ROI is created/destroyed or checkbox is toggled"""
         self.set_data()
+
+    def add_image(self):
+        """Set data when an image is added to the image set"""
+        self.set_data()
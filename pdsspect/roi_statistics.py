@@ -0,0 +1,136 @@
+"""Running mean and standard deviation of the pixels in an ROI"""
+import numpy as np
+
+
+class RunningStatistics(object):
+    """Mean and standard deviation of the pixels in an ROI in each image
+
+    The statistics are kept as a count, mean and sum of squared differences
+    from the mean (Welford's method). Pixels are added and removed in batches
+    by combining the statistics of the batch with the running statistics, so
+    updating an ROI only reads the pixels that changed. ``NaN`` values are
+    left out like :func:`numpy.nanmean` and :func:`numpy.nanstd` and counted
+    in :attr:`nan_count`
+
+    Parameters
+    ----------
+    n_images : :obj:`int`
+        Number of images
+
+    Attributes
+    ----------
+    count : :obj:`int`
+        Number of pixels
+    """
+
+    def __init__(self, n_images):
+        self.count = 0
+        self._counts = np.zeros(n_images)
+        self._mean = np.zeros(n_images)
+        self._m2 = np.zeros(n_images)
+
+    @staticmethod
+    def _batch(spectra):
+        spectra = np.asarray(spectra, dtype=np.float64)
+        is_value = ~np.isnan(spectra)
+        counts = is_value.sum(axis=1).astype(float)
+        values = np.where(is_value, spectra, 0.0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = np.where(counts > 0, values.sum(axis=1) / counts, 0.0)
+            deviations = np.where(
+                is_value, spectra - mean[:, np.newaxis], 0.0
+            )
+        m2 = np.square(deviations).sum(axis=1)
+        return spectra.shape[1], counts, mean, m2
+
+    def add(self, spectra):
+        """Add pixels to the statistics
+
+        Parameters
+        ----------
+        spectra : :class:`numpy.ndarray`
+            ``(n_images, n_pixels)`` array of the values of the pixels in each
+            image
+        """
+
+        n_pixels, counts, mean, m2 = self._batch(spectra)
+        if n_pixels == 0:
+            return
+        totals = self._counts + counts
+        delta = mean - self._mean
+        with np.errstate(invalid='ignore', divide='ignore'):
+            weight = np.where(totals > 0, counts / totals, 0.0)
+        self._mean = self._mean + delta * weight
+        self._m2 = self._m2 + m2 + delta ** 2 * self._counts * weight
+        self._counts = totals
+        self.count += n_pixels
+
+    def remove(self, spectra):
+        """Remove pixels that were added from the statistics
+
+        Parameters
+        ----------
+        spectra : :class:`numpy.ndarray`
+            ``(n_images, n_pixels)`` array of the values of the pixels in each
+            image
+        """
+
+        n_pixels, counts, mean, m2 = self._batch(spectra)
+        if n_pixels == 0:
+            return
+        remaining = self._counts - counts
+        has_values = remaining > 0
+        with np.errstate(invalid='ignore', divide='ignore'):
+            remaining_mean = np.where(
+                has_values,
+                (self._mean * self._counts - mean * counts) / remaining,
+                0.0
+            )
+            weight = np.where(has_values, counts / self._counts, 0.0)
+        delta = mean - remaining_mean
+        self._m2 = np.where(
+            has_values,
+            np.maximum(self._m2 - m2 - delta ** 2 * remaining * weight, 0.0),
+            0.0
+        )
+        self._mean = remaining_mean
+        self._counts = np.maximum(remaining, 0.0)
+        self.count = max(self.count - n_pixels, 0)
+
+    @property
+    def nan_count(self):
+        """:class:`numpy.ndarray` : Number of pixels with a ``NaN`` value in
+        each image
+        """
+
+        return (self.count - self._counts).astype(int)
+
+    @property
+    def is_finite(self):
+        """:obj:`bool` : False if a pixel was infinite
+
+        Removing the pixel does not make the statistics finite again
+        """
+
+        return bool(
+            np.all(np.isfinite(self._mean)) and np.all(np.isfinite(self._m2))
+        )
+
+    @property
+    def mean(self):
+        """:class:`numpy.ndarray` : Mean of the pixels in each image. ``NaN``
+        if there are no pixels with a value
+        """
+
+        return np.where(self._counts > 0, self._mean, np.nan)
+
+    @property
+    def std(self):
+        """:class:`numpy.ndarray` : Standard deviation of the pixels in each
+        image. ``NaN`` if there are no pixels with a value
+        """
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(
+                self._counts > 0, np.sqrt(self._m2 / self._counts), np.nan
+            )
@@ -4,6 +4,8 @@ import os
 import numpy as np
 from qtpy import QtWidgets, QtCore
 
+from .classification import KMeansClustering
+from .morphology import OPERATIONS as MORPHOLOGY_OPERATIONS
 from .pdsspect_image_set import PDSSpectImageSetViewBase
 
 
@@ -55,6 +57,32 @@ class SelectionController(object):
         for subset in self.image_set.subsets:
             subset.selection_index = index
 
+    def change_brush_radius(self, radius):
+        """Change the radius of the brush
+
+        Parameters
+        ----------
+        radius : :obj:`int`
+            The new radius in pixels
+        """
+
+        self.image_set.brush_radius = radius
+        for subset in self.image_set.subsets:
+            subset.brush_radius = radius
+
+    def change_wand_tolerance(self, tolerance):
+        """Change the tolerance of the magic wand
+
+        Parameters
+        ----------
+        tolerance : :obj:`float`
+            The new relative distance from the seed's spectrum
+        """
+
+        self.image_set.wand_tolerance = tolerance
+        for subset in self.image_set.subsets:
+            subset.wand_tolerance = tolerance
+
     def change_alpha(self, new_alpha):
         """Change the alpha value to a new alpha value
 
@@ -75,11 +103,94 @@ class SelectionController(object):
         for subset in self.image_set.subsets:
             subset.delete_rois_with_color(subset.color)
 
+    def morph_current_color(self, operation, radius):
+        """Apply a morphology operation to the ROIs with the current color
+
+        See :meth:`~.pdsspect_image_set.PDSSpectImageSet.morph_roi`
+
+        Parameters
+        ----------
+        operation : :obj:`str`
+            The name of the operation
+        radius : :obj:`int`
+            Radius of the structuring element
+        """
+
+        with self.image_set.batch():
+            self.image_set.morph_roi(self.image_set.color, operation, radius)
+            for subset in self.image_set.subsets:
+                subset.morph_roi(subset.color, operation, radius)
+
+    @property
+    def roi_names(self):
+        """:obj:`list` of :obj:`str` : Names of the ROIs in every window
+
+        The names follow :meth:`Selection.export`: the color for the main
+        window and the color followed by the window's number (i.e., ``red2``)
+        for the other windows
+        """
+        colors = self.image_set.colors[:-1]
+        names = list(colors)
+        for num_view in range(len(self.image_set.subsets)):
+            names += [color + str(num_view + 2) for color in colors]
+        return names
+
+    def _get_roi_operand(self, name):
+        color = name.rstrip('0123456789')
+        if color == name:
+            return color if color in self.image_set.colors[:-1] else None
+        index = int(name[len(color):]) - 2
+        if not 0 <= index < len(self.image_set.subsets):
+            # The window was removed after the menus were filled
+            return None
+        return self.image_set.subsets[index], color
+
+    def combine_rois(self, operation, first, second):
+        """Set the ROI with the current color to the combination of two
+        ROIs
+
+        When the current color is ``eraser``, the pixels of the combination
+        are erased instead. See
+        :meth:`~.pdsspect_image_set.PDSSpectImageSet.combine_rois`. Nothing
+        is done if either name is not in :attr:`roi_names`
+
+        Parameters
+        ----------
+        operation : :obj:`str`
+            The name of the operation
+        first : :obj:`str`
+            Name of the first ROI in :attr:`roi_names`
+        second : :obj:`str`
+            Name of the second ROI in :attr:`roi_names`
+        """
+
+        first = self._get_roi_operand(first)
+        second = self._get_roi_operand(second)
+        if first is None or second is None:
+            return
+        self.image_set.combine_rois(
+            operation, first, second, self.image_set.color
+        )
+
     def clear_all(self):
         """Clear all ROIs"""
-        self.image_set.delete_all_rois()
-        for subset in self.image_set.subsets:
-            subset.delete_all_rois()
+        with self.image_set.batch():
+            self.image_set.delete_all_rois()
+            for subset in self.image_set.subsets:
+                subset.delete_all_rois()
+
+    def cluster(self, n_clusters):
+        """Replace the ROIs with clusters of the pixels' spectra
+
+        See :class:`~.classification.KMeansClustering`
+
+        Parameters
+        ----------
+        n_clusters : :obj:`int`
+            The number of clusters
+        """
+
+        KMeansClustering(self.image_set, n_clusters).apply()
 
     def add_ROI(self, coordinates, color, image_set=None):
         """Add ROI with the given coordinates and color
@@ -138,6 +249,21 @@ class Selection(QtWidgets.QWidget, PDSSpectImageSetViewBase):
         Drop down menu for color selection
     color_layout : :class:`QtWidgets.QHBoxLayout <PySide.QtGui.QHBoxLayout>`
         Horizontal box layout for color selection
+    brush_radius_label : :class:`QtWidgets.QLabel <PySide.QtGui.QLabel>`
+        Label for the :attr:`brush_radius_box`
+    brush_radius_box : :class:`QtWidgets.QSpinBox <PySide.QtGui.QSpinBox>`
+        Radius in pixels of the brush
+    brush_radius_layout : :class:`QtWidgets.QHBoxLayout\
+    <PySide.QtGui.QHBoxLayout>`
+        Horizontal box layout for the brush radius
+    wand_tolerance_label : :class:`QtWidgets.QLabel <PySide.QtGui.QLabel>`
+        Label for the :attr:`wand_tolerance_box`
+    wand_tolerance_box : :class:`QtWidgets.QDoubleSpinBox\
+    <PySide.QtGui.QDoubleSpinBox>`
+        Relative distance from the seed's spectrum for the magic wand
+    wand_tolerance_layout : :class:`QtWidgets.QHBoxLayout\
+    <PySide.QtGui.QHBoxLayout>`
+        Horizontal box layout for the wand tolerance
     opacity_label : :class:`QtWidgets.QLabel <PySide.QtGui.QLabel>`
         Label for the :attr:`opacity_slider`
     opacity_slider : :class:`QtWidgets.QSlider <PySide.QtGui.QSlider>`
@@ -149,6 +275,37 @@ class Selection(QtWidgets.QWidget, PDSSpectImageSetViewBase):
         Button to clear all ROIs will the current color
     clear_all_btn : :class:`QtWidgets.QPushButton <PySide.QtGui.QPushButton>`
         Button to clear all ROIs
+    morphology_menu : :class:`QtWidgets.QComboBox <PySide.QtGui.QComboBox>`
+        Drop down menu of morphology operations
+    morphology_radius_box : :class:`QtWidgets.QSpinBox\
+    <PySide.QtGui.QSpinBox>`
+        Radius of the morphology operation
+    morphology_btn : :class:`QtWidgets.QPushButton <PySide.QtGui.QPushButton>`
+        Apply the morphology operation to the ROIs with the current color
+    morphology_layout : :class:`QtWidgets.QHBoxLayout\
+    <PySide.QtGui.QHBoxLayout>`
+        Horizontal box layout for morphology operations
+    first_roi_menu : :class:`QtWidgets.QComboBox <PySide.QtGui.QComboBox>`
+        Drop down menu of the first ROI to combine
+    roi_operation_menu : :class:`QtWidgets.QComboBox\
+    <PySide.QtGui.QComboBox>`
+        Drop down menu of the operations to combine ROIs with
+    second_roi_menu : :class:`QtWidgets.QComboBox <PySide.QtGui.QComboBox>`
+        Drop down menu of the second ROI to combine
+    combine_btn : :class:`QtWidgets.QPushButton <PySide.QtGui.QPushButton>`
+        Set the ROI with the current color to the combination of the ROIs
+    combine_layout : :class:`QtWidgets.QHBoxLayout\
+    <PySide.QtGui.QHBoxLayout>`
+        Horizontal box layout for combining ROIs
+    clusters_label : :class:`QtWidgets.QLabel <PySide.QtGui.QLabel>`
+        Label for the :attr:`clusters_box`
+    clusters_box : :class:`QtWidgets.QSpinBox <PySide.QtGui.QSpinBox>`
+        Number of clusters
+    cluster_btn : :class:`QtWidgets.QPushButton <PySide.QtGui.QPushButton>`
+        Button to replace the ROIs with clusters of the pixels' spectra
+    cluster_layout : :class:`QtWidgets.QHBoxLayout\
+    <PySide.QtGui.QHBoxLayout>`
+        Horizontal box layout for clustering
     export_btn : :class:`QtWidgets.QPushButton <PySide.QtGui.QPushButton>`
         Export ROIs to ``.npz`` file
     load_btn : :class:`QtWidgets.QPushButton <PySide.QtGui.QPushButton>`
@@ -188,6 +345,27 @@ class Selection(QtWidgets.QWidget, PDSSpectImageSetViewBase):
         self.color_layout.addWidget(self.color_label)
         self.color_layout.addWidget(self.color_menu)
 
+        self.brush_radius_label = QtWidgets.QLabel('Brush Radius:')
+        self.brush_radius_box = QtWidgets.QSpinBox()
+        self.brush_radius_box.setRange(0, 50)
+        self.brush_radius_box.setValue(self.image_set.brush_radius)
+        self.brush_radius_box.valueChanged.connect(self.change_brush_radius)
+        self.brush_radius_layout = QtWidgets.QHBoxLayout()
+        self.brush_radius_layout.addWidget(self.brush_radius_label)
+        self.brush_radius_layout.addWidget(self.brush_radius_box)
+
+        self.wand_tolerance_label = QtWidgets.QLabel('Wand Tolerance:')
+        self.wand_tolerance_box = QtWidgets.QDoubleSpinBox()
+        self.wand_tolerance_box.setRange(0., 1.)
+        self.wand_tolerance_box.setSingleStep(.01)
+        self.wand_tolerance_box.setValue(self.image_set.wand_tolerance)
+        self.wand_tolerance_box.valueChanged.connect(
+            self.change_wand_tolerance
+        )
+        self.wand_tolerance_layout = QtWidgets.QHBoxLayout()
+        self.wand_tolerance_layout.addWidget(self.wand_tolerance_label)
+        self.wand_tolerance_layout.addWidget(self.wand_tolerance_box)
+
         self.opacity_label = QtWidgets.QLabel('Opacity:')
         self.opacity_slider = QtWidgets.QSlider(QtCore.Qt.Horizontal)
         self.opacity_slider.setRange(0.0, 100.)
@@ -205,6 +383,43 @@ class Selection(QtWidgets.QWidget, PDSSpectImageSetViewBase):
         self.clear_all_btn = QtWidgets.QPushButton('Clear All')
         self.clear_all_btn.clicked.connect(self.clear_all)
 
+        self.morphology_menu = QtWidgets.QComboBox()
+        for operation in MORPHOLOGY_OPERATIONS:
+            self.morphology_menu.addItem(operation)
+        self.morphology_radius_box = QtWidgets.QSpinBox()
+        self.morphology_radius_box.setRange(1, 50)
+        self.morphology_btn = QtWidgets.QPushButton('Apply')
+        self.morphology_btn.clicked.connect(self.morph_current_color)
+        self.morphology_layout = QtWidgets.QHBoxLayout()
+        self.morphology_layout.addWidget(self.morphology_menu)
+        self.morphology_layout.addWidget(self.morphology_radius_box)
+        self.morphology_layout.addWidget(self.morphology_btn)
+
+        self.first_roi_menu = QtWidgets.QComboBox()
+        self.roi_operation_menu = QtWidgets.QComboBox()
+        for operation in self.image_set.roi_operations:
+            self.roi_operation_menu.addItem(operation)
+        self.second_roi_menu = QtWidgets.QComboBox()
+        self.update_roi_menus()
+        self.combine_btn = QtWidgets.QPushButton('Combine')
+        self.combine_btn.clicked.connect(self.combine_rois)
+        self.combine_layout = QtWidgets.QHBoxLayout()
+        self.combine_layout.addWidget(self.first_roi_menu)
+        self.combine_layout.addWidget(self.roi_operation_menu)
+        self.combine_layout.addWidget(self.second_roi_menu)
+        self.combine_layout.addWidget(self.combine_btn)
+
+        self.clusters_label = QtWidgets.QLabel('Clusters:')
+        self.clusters_box = QtWidgets.QSpinBox()
+        self.clusters_box.setRange(1, len(self.image_set.colors) - 1)
+        self.clusters_box.setValue(len(self.image_set.colors) - 1)
+        self.cluster_btn = QtWidgets.QPushButton('Cluster')
+        self.cluster_btn.clicked.connect(self.cluster)
+        self.cluster_layout = QtWidgets.QHBoxLayout()
+        self.cluster_layout.addWidget(self.clusters_label)
+        self.cluster_layout.addWidget(self.clusters_box)
+        self.cluster_layout.addWidget(self.cluster_btn)
+
         self.export_btn = QtWidgets.QPushButton("Export ROIs")
         self.export_btn.clicked.connect(self.open_save_dialog)
 
@@ -221,9 +436,14 @@ class Selection(QtWidgets.QWidget, PDSSpectImageSetViewBase):
         self.main_layout = QtWidgets.QVBoxLayout()
         self.main_layout.addLayout(self.type_layout)
         self.main_layout.addLayout(self.color_layout)
+        self.main_layout.addLayout(self.brush_radius_layout)
+        self.main_layout.addLayout(self.wand_tolerance_layout)
         self.main_layout.addLayout(self.opacity_layout)
         self.main_layout.addWidget(self.clear_current_color_btn)
         self.main_layout.addWidget(self.clear_all_btn)
+        self.main_layout.addLayout(self.morphology_layout)
+        self.main_layout.addLayout(self.combine_layout)
+        self.main_layout.addLayout(self.cluster_layout)
         self.main_layout.addWidget(self.export_btn)
         self.main_layout.addWidget(self.load_btn)
         self.main_layout.addWidget(self.simultaneous_roi_box)
@@ -238,6 +458,16 @@ class Selection(QtWidgets.QWidget, PDSSpectImageSetViewBase):
         """Change selection type when selected in :attr:`selection_menu`"""
         self.controller.change_selection_index(index)
 
+    def change_brush_radius(self, radius):
+        """Change the brush radius when :attr:`brush_radius_box` changes"""
+        self.controller.change_brush_radius(radius)
+
+    def change_wand_tolerance(self, tolerance):
+        """Change the wand tolerance when :attr:`wand_tolerance_box`
+        changes
+        """
+        self.controller.change_wand_tolerance(tolerance)
+
     def change_alpha(self, new_alpha):
         """Change alpha value when :attr:`opacity_slider` value changes"""
         self.controller.change_alpha(new_alpha)
@@ -250,6 +480,52 @@ class Selection(QtWidgets.QWidget, PDSSpectImageSetViewBase):
         """Clear all ROIs"""
         self.controller.clear_all()
 
+    def morph_current_color(self):
+        """Apply the operation in :attr:`morphology_menu` to the ROIs with
+        the current color
+        """
+
+        self.controller.morph_current_color(
+            self.morphology_menu.currentText(),
+            self.morphology_radius_box.value()
+        )
+
+    def update_roi_menus(self):
+        """Fill :attr:`first_roi_menu` and :attr:`second_roi_menu` with the
+        ROIs of every window
+        """
+
+        for menu in (self.first_roi_menu, self.second_roi_menu):
+            name = menu.currentText()
+            menu.clear()
+            menu.addItems(self.controller.roi_names)
+            index = menu.findText(name)
+            if index != -1:
+                menu.setCurrentIndex(index)
+
+    def showEvent(self, event):
+        # Windows may have been added since the menus were filled
+        self.update_roi_menus()
+        super(Selection, self).showEvent(event)
+
+    def combine_rois(self):
+        """Set the ROI with the current color to the combination of the
+        ROIs in :attr:`first_roi_menu` and :attr:`second_roi_menu`
+        """
+
+        self.controller.combine_rois(
+            self.roi_operation_menu.currentText(),
+            self.first_roi_menu.currentText(),
+            self.second_roi_menu.currentText(),
+        )
+        self.update_roi_menus()
+
+    def cluster(self):
+        """Replace the ROIs with the number of clusters in
+        :attr:`clusters_box`
+        """
+        self.controller.cluster(self.clusters_box.value())
+
     def export(self, save_file):
         """Export ROIS to the given filename
 
@@ -317,16 +593,20 @@ class Selection(QtWidgets.QWidget, PDSSpectImageSetViewBase):
                     num_views = num_current_views
             else:
                 num_views = 0
-            for color in self.image_set.colors:
-                coords = np.column_stack(np.where(arr_dict[color]))
+            with self.image_set.batch():
+                self._load_selection(arr_dict, num_views)
+
+    def _load_selection(self, arr_dict, num_views):
+        for color in self.image_set.colors:
+            coords = np.column_stack(np.where(arr_dict[color]))
+            if coords.size > 0:
+                self.controller.add_ROI(coords, color)
+            for num_view in range(num_views - 1):
+                subset = self.image_set._subsets[num_view]
+                name = color + str(num_view + 2)
+                coords = np.column_stack(np.where(arr_dict[name]))
                 if coords.size > 0:
-                    self.controller.add_ROI(coords, color)
-                for num_view in range(num_views - 1):
-                    subset = self.image_set._subsets[num_view]
-                    name = color + str(num_view + 2)
-                    coords = np.column_stack(np.where(arr_dict[name]))
-                    if coords.size > 0:
-                        self.controller.add_ROI(coords, color, subset)
+                    self.controller.add_ROI(coords, color, subset)
 
     def show_open_dialog(self):
         """Open file dialog to select ``.npz`` files to load ROIs"""
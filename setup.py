@@ -40,7 +40,8 @@ setup(
         'ginga==2.6.0',
         'planetaryimage>=0.5.0',
         'matplotlib>=1.5.1',
-        'QtPy>=1.2.1'
+        'QtPy>=1.2.1',
+        'futures; python_version < "3.2"',
     ],
     license="BSD",
     zip_safe=False,
@@ -60,7 +61,8 @@ setup(
     ],
     entry_points={
         'console_scripts': [
-            'pdsspect = pdsspect.pdsspect:cli'
+            'pdsspect = pdsspect.pdsspect:cli',
+            'pdsspect-index = pdsspect.catalog:cli',
         ],
     }
 )
@@ -93,14 +93,17 @@ def reset_image_set(image_set):
     image_set._current_image_index = 0
     image_set.current_color_index = 0
     image_set._selection_index = 0
+    image_set.brush_radius = 1
+    image_set.wand_tolerance = 0.05
     image_set._zoom = 1.0
     image_set._center = None
     image_set._move_rois = True
     image_set._alpha = 1.0
+    image_set._maskrgb.alpha = 1.0
     image_set._flip_x = False
     image_set._flip_y = False
     image_set._swap_xy = False
-    image_set._roi_data = image_set._maskrgb.get_data().astype(float)
+    image_set._roi_data = np.zeros(image_set.shape[:2], dtype=np.uint8)
     image_set._subsets = []
     image_set._simultaneous_roi = False
     image_set._unit = 'nm'
@@ -1,3 +1,4 @@
+from . import numpy as np
 from . import TEST_FILES, reset_image_set
 
 import pytest
@@ -87,6 +88,37 @@ class TestBasicController(object):
         self.controller.change_current_image_index(2)
         assert self.image_set.current_image_index == 2
 
+    def test_select_within_cuts(self):
+        reset_image_set(self.image_set)
+        data = self.image_set.current_image.data
+        cut_low, cut_high = np.percentile(data, [25, 75])
+        self.controller.select_within_cuts(cut_low, cut_high)
+        test_mask = (data >= cut_low) & (data <= cut_high)
+        assert np.array_equal(self.image_set._roi_data == 1, test_mask)
+        self.image_set.current_color_index = 14
+        self.controller.select_within_cuts(cut_low, cut_high)
+        assert not self.image_set._roi_data.any()
+
+    def test_select_within_cuts_simultaneously(self):
+        reset_image_set(self.image_set)
+        subset = self.image_set.create_subset()
+        data = self.image_set.current_image.data
+        cut_low, cut_high = np.percentile(data, [25, 75])
+        test_mask = (data >= cut_low) & (data <= cut_high)
+        self.controller.select_within_cuts(cut_low, cut_high)
+        assert not subset._roi_data.any()
+        self.image_set.simultaneous_roi = True
+        subset.current_color_index = 1
+        controller = BasicController(subset, None)
+        controller.select_within_cuts(cut_low, cut_high)
+        assert np.array_equal(self.image_set._roi_data == 1, test_mask)
+        assert np.array_equal(subset._roi_data == 2, test_mask)
+        subset.current_color_index = 14
+        controller.select_within_cuts(cut_low, cut_high)
+        assert np.array_equal(self.image_set._roi_data == 1, test_mask)
+        assert not subset._roi_data.any()
+        reset_image_set(self.image_set)
+
 
 class TestBasicWidget(object):
     image_set = PDSSpectImageSet(TEST_FILES)
@@ -188,3 +220,10 @@ class TestBasic(object):
         basic.change_image(0)
         assert basic.histogram.connected_models == [basic2.histogram]
         assert basic2.histogram.connected_models == [basic.histogram]
+
+    def test_select_within_cuts(self, basic):
+        basic.histogram.cuts = (10, 20)
+        basic.select_within_cuts()
+        data = self.image_set.current_image.data
+        test_mask = (data >= 10) & (data <= 20)
+        assert np.array_equal(self.image_set._roi_data == 1, test_mask)
@@ -0,0 +1,108 @@
+import os
+import shutil
+
+import pytest
+
+from . import numpy as np
+from . import FILE_1, FILE_2, FILE_3, FILE_5, FILE_6, TEST_FILES
+
+from pdsspect.catalog import Catalog, summarize_label
+from pdsspect.pdsspect import _query_catalog
+from pdsspect.pdsspect_image_set import ImageStamp
+
+
+@pytest.fixture
+def image_dir(tmpdir):
+    image_dir = tmpdir.mkdir('images')
+    sub_dir = image_dir.mkdir('sub_dir')
+    for filepath in (FILE_1, FILE_2, FILE_3):
+        shutil.copy(filepath, str(image_dir))
+    for filepath in (FILE_5, FILE_6):
+        shutil.copy(filepath, str(sub_dir))
+    image_dir.join('notes.csv').write('OBJECT,IMAGE\n')
+    return image_dir
+
+
+@pytest.fixture
+def catalog(tmpdir):
+    catalog = Catalog(str(tmpdir.join('catalog.sqlite')))
+    yield catalog
+    catalog.close()
+
+
+def test_summarize_label():
+    image_stamp = ImageStamp(FILE_2)
+    summary = summarize_label(image_stamp.label)
+    assert 'PANORAMIC' in summary['instrument']
+    assert summary['instrument_id'] == 'PANCAM_RIGHT'
+    assert summary['filter_name'] == '8'
+    assert summary['wavelength'] == image_stamp.wavelength
+    assert (summary['lines'], summary['samples']) == image_stamp.shape
+    assert summary['bands'] == 1
+    assert np.dtype(summary['dtype']) == image_stamp.data.dtype
+    summary = summarize_label(ImageStamp(FILE_1).label)
+    assert summary['wavelength'] is None
+
+
+class TestCatalog(object):
+
+    def test_scan(self, catalog, image_dir):
+        assert len(catalog) == 0
+        assert catalog.scan(str(image_dir), recursive=False) == 4
+        assert len(catalog) == 3
+        assert catalog.scan(str(image_dir)) == 2
+        assert len(catalog) == 5
+        assert catalog.scan(str(image_dir)) == 0
+        image = image_dir.join(os.path.basename(FILE_2))
+        os.utime(str(image), (0, 0))
+        assert catalog.scan(str(image_dir)) == 1
+        image_dir.join('sub_dir', os.path.basename(FILE_6)).remove()
+        assert catalog.scan(str(image_dir)) == 0
+        assert len(catalog) == 4
+
+    def test_query(self, catalog, image_dir):
+        catalog.scan(str(image_dir))
+        filepaths = catalog.query()
+        assert len(filepaths) == 5
+        assert filepaths == sorted(filepaths)
+        assert all(os.path.isabs(filepath) for filepath in filepaths)
+        pancam = catalog.query(instrument='pancam')
+        assert sorted(os.path.basename(path) for path in pancam) == sorted(
+            os.path.basename(path) for path in (FILE_2, FILE_3, FILE_5)
+        )
+        right = catalog.query(instrument='PANCAM_RIGHT')
+        assert len(right) == 2
+        assert catalog.query(instrument='pancam%right') == []
+        assert len(catalog.query(instrument='mast camera left')) == 1
+        assert len(catalog.query(filter_name=8)) == 3
+        wavelengths = [
+            record['wavelength'] for record in catalog.records()
+            if record['wavelength'] is not None
+        ]
+        low, high = min(wavelengths), max(wavelengths)
+        assert len(catalog.query(min_wavelength=low)) == len(wavelengths)
+        assert len(catalog.query(max_wavelength=low)) == wavelengths.count(low)
+        assert len(catalog.query(min_wavelength=high + 1)) == 0
+        sub_dir = str(image_dir.join('sub_dir'))
+        assert len(catalog.query(directory=sub_dir)) == 2
+
+    def test_records(self, catalog, image_dir):
+        catalog.scan(str(image_dir))
+        records = catalog.records()
+        assert len(records) == 5
+        filepath = str(image_dir.join(os.path.basename(FILE_2)))
+        record, = catalog.records([filepath])
+        assert record['filepath'] == filepath
+        assert record['instrument_id'] == 'PANCAM_RIGHT'
+        assert record['is_image'] == 1
+
+
+def test_query_catalog(catalog, image_dir):
+    catalog.scan(str(image_dir))
+    filepaths = _query_catalog(None, {'instrument': 'pancam'}, catalog)
+    assert len(filepaths) == 3
+    files = [str(image_dir.join(os.path.basename(FILE_2))), TEST_FILES[0]]
+    filepaths = _query_catalog(files, {'instrument': 'pancam'}, catalog)
+    assert filepaths == files[:1]
+    filepaths = _query_catalog(None, {}, catalog.path)
+    assert len(filepaths) == 5
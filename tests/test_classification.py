@@ -0,0 +1,225 @@
+from . import numpy as np
+from . import TEST_FILES, reset_image_set
+
+import pytest
+
+from pdsspect.classification import SpectralAngleMapper, KMeansClustering
+from pdsspect.roi_line_plot import ROILinePlotModel
+from pdsspect.pdsspect_image_set import PDSSpectImageSet
+
+
+def set_spectra(image_set):
+    """Left half has the spectrum 1, 2, 3 and right half 3, 2, 1 at different
+    brightnesses. The top row is zero and the last image has no wavelength
+    """
+    rows, cols = image_set.shape
+    brightness = np.arange(rows * cols).reshape(rows, cols) % 7 + 1.
+    for index, image in enumerate(image_set.images):
+        data = np.empty((rows, cols))
+        data[:, :cols // 2] = (index + 1) * brightness[:, :cols // 2]
+        data[:, cols // 2:] = (3 - index) * brightness[:, cols // 2:]
+        data[0] = 0
+        image.data[...] = data
+        image.wavelength = 100. * (3 - index)
+    image_set.images[-1].wavelength = float('nan')
+    image_set.images[-1].data[...] = -1
+
+
+class TestSpectralAngleMapper(object):
+    image_set = PDSSpectImageSet(TEST_FILES[:4], dtype='float64', cube=True)
+    set_spectra(image_set)
+
+    @pytest.fixture
+    def mapper(self):
+        reset_image_set(self.image_set)
+        model = ROILinePlotModel(self.image_set)
+        return SpectralAngleMapper(model, chunk_rows=5, workers=2)
+
+    def add_training_rois(self):
+        rows, cols = self.image_set.shape
+        self.image_set.add_coords_to_roi_data_with_color(
+            np.array([[3, 0]]), 'red'
+        )
+        self.image_set.add_coords_to_roi_data_with_color(
+            np.array([[4, cols - 1]]), 'brown'
+        )
+
+    def test_init(self, mapper):
+        assert mapper.threshold == 0.1
+        assert mapper.chunk_rows == 5
+        assert mapper.workers == 2
+        assert mapper.image_set is self.image_set
+        assert SpectralAngleMapper(mapper.model).workers >= 1
+
+    def test_training_colors(self, mapper):
+        assert mapper.training_colors == []
+        self.add_training_rois()
+        assert mapper.training_colors == ['red', 'brown']
+
+    def test_reference_spectra(self, mapper):
+        self.add_training_rois()
+        references = mapper.reference_spectra(['brown', 'red'])
+        red = self.image_set.images[0].data[3, 0]
+        brown = self.image_set.images[0].data[4, -1] / 3
+        # Sorted by wavelength
+        assert np.allclose(
+            references,
+            [[brown, 2 * brown, 3 * brown], [3 * red, 2 * red, red]]
+        )
+        assert np.all(np.isnan(mapper.reference_spectra(['pink'])))
+
+    def test_classify(self, mapper):
+        rows, cols = self.image_set.shape
+        assert np.all(mapper.classify() == -1)
+        self.add_training_rois()
+        labels = mapper.classify()
+        assert labels.shape == (rows, cols)
+        assert np.all(labels[0] == -1)
+        assert np.all(labels[1:, :cols // 2] == 0)
+        assert np.all(labels[1:, cols // 2:] == 1)
+        labels = mapper.classify(['brown'])
+        assert np.all(labels[1:, :cols // 2] == -1)
+        assert np.all(labels[1:, cols // 2:] == 0)
+
+    def test_threshold(self, mapper):
+        self.add_training_rois()
+        # The angle between 1, 2, 3 and 3, 2, 1 is about 0.77 radians
+        cols = self.image_set.shape[1]
+        mapper.threshold = 0.7
+        assert np.all(mapper.classify(['red'])[:, cols // 2:] == -1)
+        mapper.threshold = 0.8
+        assert np.all(mapper.classify(['red'])[1:] == 0)
+
+    def test_classify_without_cube(self, mapper):
+        self.add_training_rois()
+        image_set = PDSSpectImageSet(TEST_FILES[:4], dtype='float64')
+        set_spectra(image_set)
+        image_set._roi_data = self.image_set._roi_data.copy()
+        model = ROILinePlotModel(image_set)
+        test_mapper = SpectralAngleMapper(model, chunk_rows=7)
+        assert np.array_equal(test_mapper.classify(), mapper.classify())
+
+    def test_apply(self, mapper):
+        rows, cols = self.image_set.shape
+        self.add_training_rois()
+        labels = mapper.apply()
+        assert np.array_equal(labels, mapper.classify())
+        assert np.all(self.image_set._roi_data[0] == 0)
+        assert np.all(self.image_set._roi_data[1:, :cols // 2] == 1)
+        assert np.all(self.image_set._roi_data[1:, cols // 2:] == 2)
+
+    def test_apply_simultaneous_roi(self, mapper):
+        cols = self.image_set.shape[1]
+        subset = self.image_set.create_subset()
+        self.add_training_rois()
+        roi_data = self.image_set._roi_data.copy()
+        labels = mapper.apply()
+        # The subsets are only classified when ROIs are made simultaneously
+        assert np.all(subset._roi_data == 0)
+        self.image_set._roi_data = roi_data
+        self.image_set.simultaneous_roi = True
+        assert np.array_equal(mapper.apply(), labels)
+        assert np.array_equal(subset._roi_data, self.image_set._roi_data)
+        assert np.all(subset._roi_data[1:, :cols // 2] == 1)
+        # Classifying from a subset also adds the ROIs to the parent set
+        self.image_set.delete_all_rois()
+        subset.delete_all_rois()
+        subset.add_coords_to_roi_data_with_color(
+            np.array([[4, cols - 1]]), 'brown'
+        )
+        model = ROILinePlotModel(subset)
+        SpectralAngleMapper(model, chunk_rows=5, workers=2).apply()
+        assert np.all(self.image_set._roi_data[:, :cols // 2] == 0)
+        assert np.all(self.image_set._roi_data[1:, cols // 2:] == 2)
+        assert np.array_equal(subset._roi_data, self.image_set._roi_data)
+
+
+def set_clusters(image_set):
+    """Left half has values near 10 and the right half near 40"""
+    rows, cols = image_set.shape
+    noise = np.arange(rows * cols).reshape(rows, cols) % 7 / 7.
+    for index, image in enumerate(image_set.images):
+        image.data[...] = noise + 10. * (index + 1)
+        image.data[:, cols // 2:] += 40. - 20 * index
+
+
+class TestKMeansClustering(object):
+    image_set = PDSSpectImageSet(TEST_FILES[:4], dtype='float64')
+    set_clusters(image_set)
+
+    @pytest.fixture
+    def clustering(self):
+        reset_image_set(self.image_set)
+        return KMeansClustering(
+            self.image_set, n_clusters=2, batch_size=256, chunk_rows=5,
+            workers=2
+        )
+
+    def test_init(self, clustering):
+        assert clustering.n_clusters == 2
+        assert clustering.colors == ['red', 'brown']
+        assert clustering.centers is None
+        assert KMeansClustering(self.image_set).n_clusters == 14
+        with pytest.raises(ValueError):
+            KMeansClustering(self.image_set, n_clusters=15)
+        with pytest.raises(ValueError):
+            KMeansClustering(self.image_set, n_clusters=0)
+
+    def test_nearest(self):
+        spectra = np.array([[0., 0.], [4., 4.], [1., 2.]])
+        centers = np.array([[1., 1.], [3., 3.]])
+        assert np.array_equal(
+            KMeansClustering._nearest(spectra, centers), [0, 1, 0]
+        )
+
+    def test_fit(self, clustering):
+        centers = clustering.fit()
+        assert centers is clustering.centers
+        assert centers.shape == (2, 4)
+        assert 0 < clustering.n_iter <= clustering.max_iter
+        # The same seed gives the same centers
+        test_clustering = KMeansClustering(
+            self.image_set, n_clusters=2, batch_size=256
+        )
+        assert np.array_equal(test_clustering.fit(), centers)
+
+    def test_predict(self, clustering):
+        rows, cols = self.image_set.shape
+        labels = clustering.predict()
+        assert clustering.centers is not None
+        assert labels.shape == (rows, cols)
+        left = labels[:, :cols // 2]
+        right = labels[:, cols // 2:]
+        assert len(np.unique(left)) == 1
+        assert len(np.unique(right)) == 1
+        assert left[0, 0] != right[0, 0]
+
+    def test_predict_nan(self, clustering):
+        image_set = PDSSpectImageSet(TEST_FILES[:4], dtype='float64')
+        set_clusters(image_set)
+        image_set.images[1].data[2, 3] = np.nan
+        labels = KMeansClustering(image_set, n_clusters=2).predict()
+        assert labels[2, 3] == -1
+        assert np.count_nonzero(labels == -1) == 1
+
+    def test_apply(self, clustering):
+        self.image_set.add_coords_to_roi_data_with_color(
+            np.array([[1, 1]]), 'purple'
+        )
+        subset = self.image_set.create_subset()
+        subset.add_coords_to_roi_data_with_color(np.array([[1, 1]]), 'pink')
+        labels = clustering.apply()
+        assert np.array_equal(self.image_set._roi_data, labels + 1)
+        assert sorted(self.image_set.roi_index) == [1, 2]
+        # The subsets are only clustered when ROIs are made simultaneously
+        assert sorted(subset.roi_index) == [7]
+        self.image_set.simultaneous_roi = True
+        clustering.apply()
+        assert np.array_equal(subset._roi_data, labels + 1)
+
+    def test_fit_nan(self):
+        image_set = PDSSpectImageSet(TEST_FILES[:2], dtype='float64')
+        for image in image_set.images:
+            image.data[...] = np.nan
+        with pytest.raises(ValueError):
+            KMeansClustering(image_set, n_clusters=2).fit()
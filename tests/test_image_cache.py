@@ -0,0 +1,101 @@
+import os
+
+import pytest
+
+from . import numpy as np
+from . import FILE_2, FILE_3, TEST_FILES
+
+from pdsspect.image_cache import ImageCache, CACHE_DIR_ENV, CACHE_SIZE_ENV
+from pdsspect.pdsspect_image_set import ImageStamp, PDSSpectImageSet
+
+
+@pytest.fixture
+def cache(tmpdir):
+    return ImageCache(str(tmpdir.join('cache')))
+
+
+class TestImageCache(object):
+
+    def test_init(self, cache, tmpdir):
+        assert os.path.isdir(cache.directory)
+        assert cache.max_size == 2048 * 1024 * 1024
+        assert ImageCache(str(tmpdir), 1).max_size == 1024 * 1024
+
+    def test_from_environ(self, tmpdir, monkeypatch):
+        monkeypatch.delenv(CACHE_DIR_ENV, raising=False)
+        assert ImageCache.from_environ() is None
+        monkeypatch.setenv(CACHE_DIR_ENV, str(tmpdir))
+        monkeypatch.setenv(CACHE_SIZE_ENV, '1')
+        cache = ImageCache.from_environ()
+        assert cache.directory == str(tmpdir)
+        assert cache.max_size == 1024 * 1024
+
+    def test_key(self, cache, tmpdir):
+        filepath = tmpdir.join('image.img')
+        filepath.write('foo')
+        key = cache.key(str(filepath))
+        assert key == cache.key(str(filepath))
+        filepath.write('foobar')
+        assert key != cache.key(str(filepath))
+
+    def test_get_put(self, cache):
+        data = np.arange(12, dtype='>i2').reshape(3, 4)
+        assert FILE_2 not in cache
+        assert cache.get(FILE_2) == (None, None)
+        cache.put(FILE_2, data, {'wavelength': 880.0})
+        assert FILE_2 in cache
+        cached_data, summary = cache.get(FILE_2)
+        assert isinstance(cached_data, np.memmap)
+        assert cached_data.dtype == data.dtype
+        assert np.array_equal(cached_data, data)
+        assert summary == {'wavelength': 880.0}
+        assert cache.size > data.nbytes
+        cache.clear()
+        assert FILE_2 not in cache
+        assert cache.size == 0
+
+    def test_evict(self, cache):
+        data = np.zeros((512, 512))
+        cache.max_size = 3 * data.nbytes
+        cache.put(FILE_2, data, {'wavelength': 880.0})
+        cache.put(FILE_3, data, {'wavelength': 440.0})
+        # Mark the first entry as used more recently than the second
+        npy_path = os.path.join(cache.directory, cache.key(FILE_3) + '.npy')
+        os.utime(npy_path, (0, 0))
+        cache.get(FILE_2)
+        cache.put(TEST_FILES[0], data, {'wavelength': float('nan')})
+        assert FILE_2 in cache
+        assert FILE_3 not in cache
+        assert TEST_FILES[0] in cache
+        assert cache.size <= cache.max_size
+
+
+class TestImageStampCache(object):
+
+    def test_image_stamp(self, cache):
+        image_stamp = ImageStamp(FILE_2, cache=cache)
+        assert FILE_2 in cache
+        assert not image_stamp.memmapped
+        cached_stamp = ImageStamp(FILE_2, cache=cache)
+        assert cached_stamp.memmapped
+        assert cached_stamp._label is None
+        assert cached_stamp.wavelength == image_stamp.wavelength
+        assert np.array_equal(cached_stamp.data, image_stamp.data)
+        um_stamp = ImageStamp(FILE_2, unit='um', cache=cache)
+        assert um_stamp.wavelength == 0.88
+
+    @pytest.mark.parametrize('pool', PDSSpectImageSet.pool_types)
+    def test_image_set(self, cache, pool):
+        test_set = PDSSpectImageSet(TEST_FILES, workers=2, pool=pool,
+                                    cache=cache)
+        assert test_set.cache is cache
+        assert all(filepath in cache for filepath in TEST_FILES)
+        cached_set = PDSSpectImageSet(TEST_FILES, workers=2, pool=pool,
+                                      cache=cache)
+        for image, cached_image in zip(test_set.images, cached_set.images):
+            assert cached_image.memmapped
+            assert np.allclose(
+                image.wavelength, cached_image.wavelength, equal_nan=True
+            )
+            assert np.array_equal(image.data, cached_image.data)
+        assert PDSSpectImageSet(TEST_FILES, cache=False).cache is None
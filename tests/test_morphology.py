@@ -0,0 +1,107 @@
+from . import numpy as np
+
+import pytest
+
+from pdsspect import morphology
+
+
+def square_mask(size, y1, y2, x1, x2):
+    mask = np.zeros((size, size), dtype=bool)
+    mask[y1:y2, x1:x2] = True
+    return mask
+
+
+def reference_dilate(mask, radius):
+    """Dilate by checking every pixel's neighborhood"""
+    rows, cols = mask.shape
+    dilated = np.zeros_like(mask)
+    for row in range(rows):
+        for col in range(cols):
+            dilated[row, col] = mask[
+                max(row - radius, 0):row + radius + 1,
+                max(col - radius, 0):col + radius + 1,
+            ].any()
+    return dilated
+
+
+@pytest.mark.parametrize('radius', [1, 2, 3])
+def test_dilate(radius):
+    mask = square_mask(12, 4, 7, 5, 6)
+    mask[0, 11] = True
+    dilated = morphology.dilate(mask, radius)
+    assert np.array_equal(dilated, reference_dilate(mask, radius))
+    assert np.array_equal(
+        morphology.dilate(mask, 0), mask
+    )
+    random_mask = np.random.RandomState(radius).rand(15, 9) > .9
+    assert np.array_equal(
+        morphology.dilate(random_mask, radius),
+        reference_dilate(random_mask, radius)
+    )
+
+
+def test_erode():
+    mask = square_mask(12, 2, 9, 3, 10)
+    assert np.array_equal(
+        morphology.erode(mask, 1), square_mask(12, 3, 8, 4, 9)
+    )
+    assert np.array_equal(
+        morphology.erode(mask, 3), square_mask(12, 5, 6, 6, 7)
+    )
+    assert not morphology.erode(mask, 4).any()
+    # Pixels outside the mask are background
+    full = np.ones((5, 5), dtype=bool)
+    assert np.array_equal(
+        morphology.erode(full, 1), square_mask(5, 1, 4, 1, 4)
+    )
+    random_mask = np.random.RandomState(0).rand(15, 9) > .2
+    assert np.array_equal(
+        morphology.erode(random_mask, 2),
+        ~reference_dilate(~np.pad(random_mask, 2), 2)[2:-2, 2:-2]
+    )
+
+
+def test_opening():
+    mask = square_mask(12, 2, 9, 3, 10)
+    # A line narrower than the structuring element is removed
+    mask[0, :] = True
+    opened = morphology.opening(mask, 1)
+    assert np.array_equal(opened, square_mask(12, 2, 9, 3, 10))
+
+
+def test_closing():
+    mask = square_mask(12, 2, 9, 3, 10)
+    mask[5, 3:10] = False
+    mask[2, 3] = False
+    closed = morphology.closing(mask, 1)
+    # The gap is filled but the corner is not
+    test_mask = square_mask(12, 2, 9, 3, 10)
+    test_mask[2, 3] = False
+    assert np.array_equal(closed, test_mask)
+    # Closing does not shrink a mask at the edge
+    full = np.ones((5, 5), dtype=bool)
+    assert np.array_equal(morphology.closing(full, 2), full)
+
+
+def test_fill_holes():
+    mask = square_mask(10, 2, 8, 2, 8)
+    mask[4:6, 4:6] = False
+    mask[2:4, 2] = False
+    filled = morphology.fill_holes(mask)
+    test_mask = square_mask(10, 2, 8, 2, 8)
+    test_mask[2:4, 2] = False
+    assert np.array_equal(filled, test_mask)
+    # A hole connected diagonally to the outside is filled
+    ring = np.ones((3, 3), dtype=bool)
+    ring[1, 1] = False
+    assert morphology.fill_holes(ring).all()
+    assert not morphology.fill_holes(np.zeros((4, 4), dtype=bool)).any()
+
+
+def test_operations():
+    assert list(morphology.OPERATIONS) == [
+        'dilate', 'erode', 'open', 'close', 'fill holes'
+    ]
+    mask = square_mask(10, 2, 8, 2, 8)
+    mask[4, 4] = False
+    assert morphology.OPERATIONS['fill holes'](mask, 3).sum() == 36
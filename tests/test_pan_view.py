@@ -3,9 +3,11 @@ from . import FILE_1, reset_image_set
 
 import pytest
 
-from pdsspect.roi import Rectangle, Polygon
+from pdsspect.roi import Rectangle, Polygon, Brush
 from pdsspect.pan_view import PanViewController, PanView, PanViewWidget
-from pdsspect.pdsspect_image_set import PDSSpectImageSet, SubPDSSpectImageSet
+from pdsspect.pdsspect_image_set import (
+    PDSSpectImageSet, SubPDSSpectImageSet, PDSSpectImageSetViewBase,
+)
 
 
 class TestPanViewController(object):
@@ -34,22 +36,22 @@ class TestPanViewController(object):
         rows, cols = np.column_stack(coords)
         assert np.array_equal(
             test_set._roi_data[rows, cols],
-            np.array([[0.0, 0.0, 0.0, 0.0]])
+            np.array([0])
         )
         assert np.array_equal(
             subset._roi_data[rows, cols],
-            np.array([[0.0, 0.0, 0.0, 0.0]])
+            np.array([0])
         )
 
         self.image_set.alpha = 1
         self.controller.add_ROI(coords)
         assert np.array_equal(
             self.image_set._roi_data[rows, cols],
-            np.array([[255.0, 0.0, 0.0, 255.]])
+            np.array([1])
         )
         assert np.array_equal(
             subset._roi_data[rows, cols],
-            np.array([[0.0, 0.0, 0.0, 0.0]])
+            np.array([0])
         )
 
         self.image_set.alpha = .75
@@ -57,11 +59,11 @@ class TestPanViewController(object):
         self.controller.add_ROI(coords)
         assert np.array_equal(
             self.image_set._roi_data[rows, cols],
-            np.array([[165.0, 42.0, 42.0, 191.25]])
+            np.array([2])
         )
         assert np.array_equal(
             subset._roi_data[rows, cols],
-            np.array([[0.0, 0.0, 0.0, 0.0]])
+            np.array([0])
         )
 
         self.image_set.alpha = .25
@@ -69,11 +71,11 @@ class TestPanViewController(object):
         self.controller.add_ROI(coords)
         assert np.array_equal(
             self.image_set._roi_data[rows, cols],
-            np.array([[160.0, 32.0, 240.0, 63.75]])
+            np.array([14])
         )
         assert np.array_equal(
             subset._roi_data[rows, cols],
-            np.array([[0.0, 0.0, 0.0, 0.0]])
+            np.array([0])
         )
 
         self.image_set.alpha = 1
@@ -82,22 +84,22 @@ class TestPanViewController(object):
         self.controller.add_ROI(coords)
         assert np.array_equal(
             self.image_set._roi_data[rows, cols],
-            np.array([[255.0, 0.0, 0.0, 255.0]])
+            np.array([1])
         )
         assert np.array_equal(
             subset._roi_data[rows, cols],
-            np.array([[255.0, 0.0, 0.0, 255.0]])
+            np.array([1])
         )
         self.image_set.current_color_index = 1
         test_set.simultaneous_roi = False
         self.controller.add_ROI(coords)
         assert np.array_equal(
             self.image_set._roi_data[rows, cols],
-            np.array([[165.0, 42.0, 42.0, 255.0]])
+            np.array([2])
         )
         assert np.array_equal(
             subset._roi_data[rows, cols],
-            np.array([[255.0, 0.0, 0.0, 255.0]])
+            np.array([1])
         )
 
     def test_erase_ROI(self, test_set):
@@ -108,30 +110,30 @@ class TestPanViewController(object):
         subset.add_coords_to_roi_data_with_color(coords, 'red')
         assert np.array_equal(
             test_set._roi_data[rows, cols],
-            np.array([[255.0, 0.0, 0.0, 255.0]])
+            np.array([1])
         )
         assert np.array_equal(
             subset._roi_data[rows, cols],
-            np.array([[255.0, 0.0, 0.0, 255.0]])
+            np.array([1])
         )
         self.controller.erase_ROI(coords)
         assert np.array_equal(
             test_set._roi_data[rows, cols],
-            np.array([[0.0, 0.0, 0.0, 0.0]])
+            np.array([0])
         )
         assert np.array_equal(
             subset._roi_data[rows, cols],
-            np.array([[255.0, 0.0, 0.0, 255.0]])
+            np.array([1])
         )
         test_set.add_coords_to_roi_data_with_color(coords, 'brown')
         assert np.array_equal(
             test_set._roi_data[rows, cols],
-            np.array([[165.0, 42.0, 42.0, 255.0]])
+            np.array([2])
         )
         self.controller.erase_ROI(coords)
         assert np.array_equal(
             test_set._roi_data[rows, cols],
-            np.array([[0.0, 0.0, 0.0, 0.0]])
+            np.array([0])
         )
         test_set.simultaneous_roi = True
         test_set.add_coords_to_roi_data_with_color(coords, 'red')
@@ -139,13 +141,36 @@ class TestPanViewController(object):
         self.controller.erase_ROI(coords)
         assert np.array_equal(
             test_set._roi_data[rows, cols],
-            np.array([[0.0, 0.0, 0.0, 0.0]])
+            np.array([0])
         )
         assert np.array_equal(
             subset._roi_data[rows, cols],
-            np.array([[0.0, 0.0, 0.0, 0.0]])
+            np.array([0])
         )
 
+    def test_erase_ROI_updates_views_once(self, test_set):
+        class View(PDSSpectImageSetViewBase):
+            updates = 0
+
+            def set_roi_data(self):
+                self.updates += 1
+
+        subset = test_set.create_subset()
+        view, subset_view = View(), View()
+        test_set.register(view)
+        subset.register(subset_view)
+        coords = np.array([[2, 3], [4, 5]])
+        test_set.add_coords_to_roi_data_with_color(coords, 'red')
+        subset.add_coords_to_roi_data_with_color(coords, 'red')
+        test_set.simultaneous_roi = True
+        view.updates = subset_view.updates = 0
+        self.controller.erase_ROI(coords)
+        assert not test_set._roi_data.any()
+        assert not subset._roi_data.any()
+        assert view.updates == subset_view.updates == 1
+        test_set.simultaneous_roi = False
+        test_set.unregister(view)
+
 
 class TestPanView(object):
     image_set = PDSSpectImageSet([FILE_1])
@@ -287,6 +312,46 @@ class TestPanView(object):
         assert view._making_roi
         assert view._current_roi is not None
 
+    def test_drag_ROI(self, view):
+        self.image_set._selection_index = 3
+        self.image_set.brush_radius = 0
+        assert self.image_set.selection_type == 'brush'
+        view.start_ROI(view.view_canvas, None, 2, 3)
+        # Brush ROIs keep painting until the mouse is released
+        assert view._making_roi
+        assert isinstance(view._current_roi, Brush)
+        view.drag_ROI(view.view_canvas, None, 6, 3)
+        assert view._making_roi
+        view.release_ROI(view.view_canvas, None, 6, 3)
+        assert not view._making_roi
+        assert view._current_roi is None
+        rows, cols = self.image_set.get_coordinates_of_color('red')
+        assert np.array_equal(rows, [3, 3, 3, 3, 3])
+        assert np.array_equal(cols, [2, 3, 4, 5, 6])
+
+    def test_release_ROI(self, view):
+        self.image_set._selection_index = 1
+        view.start_ROI(view.view_canvas, None, 2, 3)
+        # Only the brush stops when the mouse is released
+        view.drag_ROI(view.view_canvas, None, 6, 3)
+        view.release_ROI(view.view_canvas, None, 6, 3)
+        assert view._making_roi
+        assert isinstance(view._current_roi, Polygon)
+        view._making_roi = False
+        view._current_roi = None
+
+    def test_magic_wand_ROI(self, view):
+        self.image_set._selection_index = 4
+        assert self.image_set.selection_type == 'magic wand'
+        view.start_ROI(view.view_canvas, None, 2, 3)
+        # Magic wand ROIs stop directly after starting
+        assert not view._making_roi
+        assert view._current_roi is None
+        rows, cols = self.image_set.get_coordinates_of_color('red')
+        coords = self.image_set.grow_region(3, 2)
+        assert len(rows) == len(coords)
+        assert self.image_set._roi_data[3, 2] == 1
+
     def test_stop_ROI(self, view):
         assert not view._making_roi
         assert view._current_roi is None
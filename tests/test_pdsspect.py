@@ -2,6 +2,7 @@ from . import TEST_FILES, test_dir
 
 import os
 import sys
+import gzip
 from glob import glob
 
 import pytest
@@ -14,7 +15,9 @@ from pdsspect.roi_line_plot import ROILinePlotWidget
 from pdsspect.roi_histogram import ROIHistogramWidget
 from pdsspect.set_wavelength import SetWavelengthWidget
 from pdsspect.pdsspect_image_set import PDSSpectImageSet
-from pdsspect.pdsspect import PDSSpect, open_pdsspect, arg_parser
+from pdsspect.pdsspect import (
+    PDSSpect, open_pdsspect, arg_parser, is_pds3_image, _find_files
+)
 
 
 class TestPDSSpect(object):
@@ -93,6 +96,7 @@ class TestPDSSpect(object):
         assert len(window.image_sets) == 2
         assert len(window.basic_window.basics) == 2
         assert len(window.pan_view.pans) == 2
+        assert window.selection_window.first_roi_menu.findText('red2') != -1
 
     def test_open_set_wavelengths(self, qtbot, window):
         assert window.set_wavelength_window is None
@@ -102,6 +106,41 @@ class TestPDSSpect(object):
         assert window.set_wavelength_window.isVisible()
         assert isinstance(window.set_wavelength_window, SetWavelengthWidget)
 
+    def test_background_loading(self, qtbot):
+        image_set = PDSSpectImageSet(TEST_FILES, background=True)
+        window = PDSSpect(image_set)
+        qtbot.add_widget(window)
+        qtbot.add_widget(window.basic_window)
+        qtbot.add_widget(window.pan_view)
+        window.open_set_wavelengths()
+        qtbot.add_widget(window.set_wavelength_window)
+        assert window.loader is not None
+        assert not window.progress_bar.isHidden()
+        assert window.progress_bar.maximum() == len(TEST_FILES)
+        qtbot.waitUntil(window.progress_bar.isHidden, timeout=10000)
+        assert window.progress_bar.value() == len(TEST_FILES)
+        assert len(image_set.images) == len(TEST_FILES)
+        basic = window.basic_window.basics[0]
+        assert basic.image_menu.count() == len(TEST_FILES)
+        image_menu = window.set_wavelength_window.image_menu
+        assert image_menu.count() == len(TEST_FILES)
+
+    def test_cancel_loading(self, qtbot):
+        image_set = PDSSpectImageSet(TEST_FILES, background=True)
+        image_set.cancel_loading()
+        image_set.load_pending_images = lambda: iter([])
+        window = PDSSpect(image_set)
+        qtbot.add_widget(window)
+        qtbot.add_widget(window.basic_window)
+        qtbot.add_widget(window.pan_view)
+        window.cancel_loading()
+        assert not window.cancel_btn.isEnabled()
+        window.stop_loading()
+        assert not window.loader.isRunning()
+        qtbot.waitUntil(window.progress_bar.isHidden)
+        assert len(image_set.pending_filepaths) == len(TEST_FILES) - 1
+        assert 'Cancelled' in window.statusBar().currentMessage()
+
     def test_quit(self, qtbot, window):
         qtbot.mouseClick(window.transforms_btn, QtCore.Qt.LeftButton)
         qtbot.add_widget(window.transforms_window)
@@ -148,6 +187,26 @@ def test_open_pdsspect(inlist, qtbot):
     assert isinstance(window, PDSSpect)
 
 
+def test_find_files(tmpdir):
+    csv = tmpdir.join('table.csv')
+    csv.write('OBJECT,IMAGE\n')
+    image = tmpdir.join('image.img')
+    with open(TEST_FILES[0], 'rb') as test_image:
+        image.write(test_image.read(), mode='wb')
+    # Files found in a directory that are not images are skipped
+    assert _find_files(str(tmpdir)) == [str(image)]
+    with tmpdir.as_cwd():
+        assert _find_files('') == ['image.img']
+    # Named files are kept so the image set warns about them
+    assert _find_files(str(csv)) == [str(csv)]
+    assert sorted(_find_files(str(tmpdir.join('*')))) == sorted(
+        [str(csv), str(image)]
+    )
+    with pytest.warns(UserWarning, match='Unable to open'):
+        image_set = PDSSpectImageSet([str(image), str(csv)])
+    assert len(image_set.images) == 1
+
+
 @pytest.mark.parametrize(
     'args, expected',
     [
@@ -157,3 +216,25 @@ def test_open_pdsspect(inlist, qtbot):
     ])
 def test_arg_parser(args, expected):
     assert arg_parser(args) == expected
+
+
+def test_is_pds3_image(tmpdir):
+    for filepath in TEST_FILES:
+        assert is_pds3_image(filepath)
+    with open(TEST_FILES[0], 'rb') as image:
+        header = image.read(4096)
+    gz_image = tmpdir.join('image.img.gz')
+    with gzip.open(str(gz_image), 'wb') as stream:
+        stream.write(header)
+    assert is_pds3_image(str(gz_image))
+    table_label = tmpdir.join('table.lbl')
+    table_label.write(
+        'PDS_VERSION_ID = PDS3\r\n^TABLE = "TABLE.TAB"\r\n'
+        'OBJECT = TABLE\r\nEND_OBJECT = TABLE\r\nEND\r\n'
+    )
+    assert not is_pds3_image(str(table_label))
+    csv = tmpdir.join('table.csv')
+    csv.write('OBJECT,IMAGE\n')
+    assert not is_pds3_image(str(csv))
+    assert not is_pds3_image(str(tmpdir))
+    assert not is_pds3_image(str(tmpdir.join('foo.img')))
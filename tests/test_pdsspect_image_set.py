@@ -1,6 +1,9 @@
 from . import numpy as np
 from . import reset_image_set
-from . import FILE_1, FILE_1_NAME, FILE_2, TEST_FILES, TEST_FILE_NAMES
+from . import FILE_1, FILE_1_NAME, FILE_2, FILE_2_NAME, FILE_3, FILE_3_NAME
+from . import TEST_FILES, TEST_FILE_NAMES
+
+import logging
 
 import pytest
 from ginga.RGBImage import RGBImage
@@ -8,10 +11,40 @@ from astropy import units as astro_units
 from ginga.canvas.types.image import Image
 
 from pdsspect.pdsspect_image_set import (
-    ImageStamp, PDSSpectImageSet, ginga_colors, SubPDSSpectImageSet
+    ImageStamp, PDSSpectImageSet, ginga_colors, SubPDSSpectImageSet,
+    PDSSpectImageSetViewBase, _memmap_image, _block_average, ROIOverlay,
+    _unite_boxes, _intersect_boxes,
 )
 
 
+def test_roi_overlay():
+    data = np.zeros((4, 4, 4))
+    data[2, 2] = [255., 0., 0., 255.]
+    overlay = ROIOverlay(data, alpha=.5)
+    cutout = overlay.get_scaled_cutout(0, 0, 3, 3, 1, 1)
+    assert np.array_equal(cutout.data[2, 2], [255., 0., 0., 127.5])
+    assert not cutout.data[0, 0].any()
+    cutout = overlay.get_scaled_cutout_wdht(0, 0, 3, 3, 2, 2)
+    assert np.array_equal(cutout.data[1, 1], [255., 0., 0., 127.5])
+    overlay.alpha = .25
+    cutout = overlay.get_scaled_cutout(0, 0, 3, 3, 1, 1)
+    assert cutout.data[2, 2, 3] == 63.75
+    assert overlay.get_data()[2, 2, 3] == 255.
+
+
+def test_unite_boxes():
+    assert _unite_boxes(None, None) is None
+    assert _unite_boxes((1, 3, 2, 4), None) == (1, 3, 2, 4)
+    assert _unite_boxes(None, (1, 3, 2, 4)) == (1, 3, 2, 4)
+    assert _unite_boxes((1, 3, 2, 4), (0, 2, 5, 8)) == (0, 3, 2, 8)
+
+
+def test_intersect_boxes():
+    assert _intersect_boxes((1, 3, 2, 4), None) is None
+    assert _intersect_boxes((1, 3, 2, 4), (0, 2, 3, 8)) == (1, 2, 3, 4)
+    assert _intersect_boxes((1, 3, 2, 4), (3, 5, 2, 4)) is None
+
+
 class TestImageStamp():
 
     @pytest.fixture()
@@ -33,6 +66,138 @@ class TestImageStamp():
             image_stamp.pds_image.image
         )
 
+    def test_decoded_data(self, pancam_stamp):
+        data = pancam_stamp.pds_image.image
+        image_stamp = ImageStamp(FILE_2, data=data)
+        assert image_stamp._pds_image is None
+        assert image_stamp.wavelength == 880.0
+        assert np.array_equal(image_stamp.data, data)
+        assert image_stamp.label['IMAGE'] == pancam_stamp.label['IMAGE']
+        assert image_stamp._pds_image is None
+        assert np.array_equal(image_stamp.pds_image.image, data)
+
+    def test_dtype(self, pancam_stamp):
+        image = pancam_stamp.pds_image.image
+        assert pancam_stamp.dtype is None
+        assert pancam_stamp.data.dtype == image.dtype
+        image_stamp = ImageStamp(FILE_2, dtype='float32')
+        assert image_stamp.dtype == np.float32
+        assert image_stamp.data.dtype == np.float32
+        assert np.array_equal(image_stamp.data, image)
+        image_stamp = ImageStamp(FILE_2, data=image, dtype='float32')
+        assert image_stamp.data.dtype == np.float32
+        image_stamp = ImageStamp(FILE_2, lazy=True, dtype='float32')
+        assert image_stamp.data.dtype == np.float32
+
+    def test_lazy(self, pancam_stamp):
+        image_stamp = ImageStamp(FILE_2, lazy=True)
+        assert image_stamp.lazy
+        assert not image_stamp.loaded
+        assert image_stamp.wavelength == 880.0
+        assert image_stamp.shape == pancam_stamp.shape
+        assert image_stamp.get_center() == pancam_stamp.get_center()
+        assert not image_stamp.loaded
+        assert np.array_equal(image_stamp.data, pancam_stamp.data)
+        assert image_stamp.loaded
+        assert image_stamp.get_minmax() == pancam_stamp.get_minmax()
+
+    def test_crop(self, pancam_stamp):
+        rows, cols = pancam_stamp.shape
+        lazy_stamp = ImageStamp(FILE_2, lazy=True)
+        for image_stamp in (pancam_stamp, lazy_stamp):
+            image_stamp.crop((rows - 2, cols - 3))
+            assert image_stamp.shape == (rows - 2, cols - 3)
+        assert not lazy_stamp.loaded
+        assert np.array_equal(lazy_stamp.data, pancam_stamp.data)
+
+    def test_memmap(self, pancam_stamp):
+        image_stamp = ImageStamp(FILE_2, memmap=True)
+        assert image_stamp.memmapped
+        assert image_stamp._pds_image is None
+        assert image_stamp.wavelength == 880.0
+        assert image_stamp.data.dtype == pancam_stamp.pds_image.image.dtype
+        assert np.array_equal(image_stamp.data, pancam_stamp.data)
+        assert not pancam_stamp.memmapped
+        lazy_stamp = ImageStamp(FILE_2, lazy=True, memmap=True)
+        assert not lazy_stamp.memmapped
+        assert np.array_equal(lazy_stamp.data, pancam_stamp.data)
+        assert lazy_stamp.memmapped
+
+    def test_memmap_image(self, pancam_stamp):
+        label = pancam_stamp.label
+        assert np.array_equal(_memmap_image(FILE_2, label), pancam_stamp.data)
+        assert _memmap_image(FILE_2 + '.gz', label) is None
+        label['IMAGE']['ENCODING_TYPE'] = 'MSLMMM-COMPRESSED'
+        assert _memmap_image(FILE_2, label) is None
+        del label['IMAGE']['ENCODING_TYPE']
+        label['IMAGE']['SAMPLE_TYPE'] = 'FOO'
+        assert _memmap_image(FILE_2, label) is None
+
+    def test_get_fast_data(self, pancam_stamp):
+        assert pancam_stamp._get_fast_data() is pancam_stamp.data
+        image_stamp = ImageStamp(FILE_2, memmap=True)
+        image_stamp.fast_data_samples = 8
+        fast_data = image_stamp._get_fast_data()
+        rows, cols = image_stamp.shape
+        step = int(np.ceil(np.sqrt(rows * cols / 8.)))
+        assert np.array_equal(fast_data, image_stamp.data[::step, ::step])
+
+    def test_get_region(self, pancam_stamp):
+        data = pancam_stamp.data
+        assert np.array_equal(
+            pancam_stamp.get_region(4, 10, 20, 50), data[10:50, 4:20]
+        )
+        assert not pancam_stamp._tiles
+        image_stamp = ImageStamp(FILE_2, memmap=True)
+        image_stamp.tile_size = 8
+        image_stamp.tile_cache_size = 6
+        region = image_stamp.get_region(4, 10, 20, 50)
+        assert not isinstance(region, np.memmap)
+        assert np.array_equal(region, data[10:50, 4:20])
+        assert len(image_stamp._tiles) == 6
+        assert (6, 2) in image_stamp._tiles
+        assert (1, 0) not in image_stamp._tiles
+        assert np.array_equal(
+            image_stamp.get_region(0, 0, 32, 64), data
+        )
+        assert image_stamp.get_region(0, 0, 0, 0).shape == (0, 0)
+
+    def test_block_average(self):
+        data = np.arange(30).reshape(5, 6)
+        averaged = _block_average(data)
+        assert averaged.shape == (2, 3)
+        assert averaged.dtype == np.float32
+        assert averaged[0, 0] == np.mean([0, 1, 6, 7])
+        assert averaged[1, 2] == np.mean([16, 17, 22, 23])
+
+    def test_get_pyramid_level(self, pancam_stamp):
+        assert pancam_stamp.pyramid_depth == 5
+        assert pancam_stamp.get_pyramid_level(0) is pancam_stamp.data
+        level2 = pancam_stamp.get_pyramid_level(2)
+        assert level2.shape == (16, 8)
+        assert len(pancam_stamp._pyramid) == 2
+        assert np.allclose(
+            level2, _block_average(_block_average(pancam_stamp.data))
+        )
+        assert pancam_stamp.get_pyramid_level(2) is level2
+        assert pancam_stamp.get_pyramid_level(5).shape == (2, 1)
+        with pytest.raises(ValueError):
+            pancam_stamp.get_pyramid_level(6)
+        pancam_stamp.set_data(pancam_stamp.data * 2)
+        assert not pancam_stamp._pyramid
+
+    def test_get_scaled_cutout_wdht(self, pancam_stamp):
+        cutout = pancam_stamp.get_scaled_cutout_wdht(0, 0, 31, 63, 8, 16)
+        assert cutout.data.shape == (16, 8)
+        assert cutout.scale_x == cutout.scale_y == .25
+        assert np.allclose(cutout.data, pancam_stamp.get_pyramid_level(2))
+        cutout = pancam_stamp.get_scaled_cutout_wdht(8, 16, 15, 31, 2, 4)
+        assert np.allclose(
+            cutout.data, pancam_stamp.get_pyramid_level(2)[4:8, 2:4]
+        )
+        cutout = pancam_stamp.get_scaled_cutout_wdht(0, 0, 31, 63, 32, 64)
+        assert np.array_equal(cutout.data, pancam_stamp.data)
+
     def test_wavelength(self, image_stamp):
         assert isinstance(image_stamp.wavelength, float)
         assert np.isnan(image_stamp.wavelength)
@@ -109,12 +274,190 @@ class TestPDSSpectImageSet(object):
         assert not test_set._flip_y
         assert not test_set._swap_xy
         assert isinstance(test_set._maskrgb, RGBImage)
+        assert test_set._roi_data.dtype == np.uint8
+        assert test_set._roi_data.shape == test_set.shape
         assert not test_set._roi_data.any()
         assert isinstance(test_set._maskrgb_obj, Image)
         test_shape = (self.centerV * 2, self.centerH * 2)
         assert np.array_equal(test_set.shape, test_shape)
         assert not test_set._simultaneous_roi
 
+    @pytest.mark.parametrize('pool', ['thread', 'process'])
+    def test_init_with_workers(self, pool):
+        test_set = PDSSpectImageSet(TEST_FILES, workers=3, pool=pool)
+        assert test_set.workers == 3
+        assert test_set.pool == pool
+        assert len(test_set.images) == 5
+        for image, test_image in zip(test_set.images, self.test_set.images):
+            assert image.image_name == test_image.image_name
+            assert np.allclose(
+                image.wavelength, test_image.wavelength, equal_nan=True
+            )
+            assert np.array_equal(image.data, test_image.data)
+        assert sorted(test_set.load_times) == sorted(TEST_FILES)
+        with pytest.raises(ValueError):
+            PDSSpectImageSet(TEST_FILES, pool='foo')
+
+    def test_load_times_are_logged(self, caplog):
+        with caplog.at_level(logging.DEBUG, 'pdsspect.pdsspect_image_set'):
+            test_set = PDSSpectImageSet(TEST_FILES, background=True)
+            for filepath, image, load_time in test_set.load_pending_images():
+                test_set.add_image(filepath, image, load_time)
+        messages = [record.getMessage() for record in caplog.records]
+        assert len(messages) == len(TEST_FILES)
+        for filepath, message in zip(TEST_FILES, messages):
+            assert message == 'Opened %s in %.3f s' % (
+                filepath, test_set.load_times[filepath]
+            )
+
+    @pytest.mark.parametrize('pool', PDSSpectImageSet.pool_types)
+    def test_init_with_dtype(self, pool):
+        test_set = PDSSpectImageSet(
+            TEST_FILES[:2], workers=2, pool=pool, dtype='float32'
+        )
+        assert test_set.dtype == 'float32'
+        for image, test_image in zip(test_set.images, self.test_set.images):
+            assert image.data.dtype == np.float32
+            assert np.array_equal(image.data, test_image.data)
+
+    def test_init_with_cube(self):
+        test_set = PDSSpectImageSet(TEST_FILES, cube=True)
+        assert self.test_set.cube is None
+        assert test_set.cube.shape == (5,) + test_set.shape
+        wavelengths = [image.wavelength for image in test_set.images]
+        known = [wavelength for wavelength in wavelengths
+                 if not np.isnan(wavelength)]
+        assert wavelengths[:len(known)] == sorted(known)
+        for index, image in enumerate(test_set.images):
+            assert np.shares_memory(image.data, test_set.cube[index])
+            # The filepaths are in the same order as the images
+            assert test_set.filenames[index] == image.image_name
+            test_image = self.test_set.images[
+                self.test_set.filenames.index(image.image_name)
+            ]
+            assert np.array_equal(image.data, test_image.data)
+        subset = test_set.create_subset()
+        assert subset.cube is test_set.cube
+        assert subset.filenames == test_set.filenames
+        with pytest.warns(UserWarning):
+            test_set = PDSSpectImageSet(['foo'] + TEST_FILES, cube=True)
+        assert test_set.filenames == [
+            image.image_name for image in test_set.images
+        ] + ['foo']
+
+    def test_init_lazy(self):
+        test_set = PDSSpectImageSet(TEST_FILES, workers=2, lazy=True)
+        assert test_set.lazy
+        assert test_set.shape == self.test_set.shape
+        assert not any(image.loaded for image in test_set.images)
+        assert np.array_equal(test_set.pan_data, self.test_set.pan_data)
+        assert test_set.current_image.loaded
+        assert not any(image.loaded for image in test_set.images[1:])
+
+    @pytest.mark.parametrize('workers', [1, 2])
+    def test_init_in_background(self, workers):
+        class View(PDSSpectImageSetViewBase):
+            added = 0
+
+            def add_image(self):
+                self.added += 1
+
+        with pytest.warns(UserWarning):
+            test_set = PDSSpectImageSet(
+                ['foo', FILE_1, FILE_2, FILE_3], workers, background=True
+            )
+        assert test_set.filenames == ['foo', FILE_1_NAME]
+        assert test_set.pending_filepaths == [FILE_2, FILE_3]
+        assert len(test_set.images) == 1
+        subset = test_set.create_subset()
+        view, subset_view = View(), View()
+        test_set.register(view)
+        subset.register(subset_view)
+        for filepath, image, load_time in test_set.load_pending_images():
+            test_set.add_image(filepath, image, load_time)
+        assert test_set.pending_filepaths == []
+        assert test_set.filenames == ['foo', FILE_1_NAME, FILE_2_NAME,
+                                      FILE_3_NAME]
+        assert len(test_set.images) == 3
+        assert subset.images == test_set.images
+        assert subset.filenames == test_set.filenames
+        assert view.added == subset_view.added == 2
+        assert all(image.shape == test_set.shape for image in subset.images)
+        assert FILE_3 in test_set.load_times
+        with pytest.raises(ValueError):
+            PDSSpectImageSet(TEST_FILES, background=True, cube=True)
+
+    def test_cancel_loading(self):
+        test_set = PDSSpectImageSet(TEST_FILES, background=True)
+        results = test_set.load_pending_images()
+        filepath, image, load_time = next(results)
+        assert filepath == TEST_FILES[1]
+        test_set.cancel_loading()
+        assert list(results) == []
+        test_set.add_image(filepath, image, load_time)
+        assert test_set.pending_filepaths == TEST_FILES[2:]
+        with pytest.warns(UserWarning):
+            test_set.add_image('foo', None)
+        assert len(test_set.images) == 2
+
+    def test_add_smaller_image(self):
+        class View(PDSSpectImageSetViewBase):
+            images_set = 0
+            roi_data_set = 0
+
+            def set_image(self):
+                self.images_set += 1
+
+            def set_roi_data(self):
+                self.roi_data_set += 1
+
+        test_set = PDSSpectImageSet(TEST_FILES, background=True)
+        rows, cols = test_set.shape
+        subset = test_set.create_subset()
+        view, subset_view = View(), View()
+        test_set.register(view)
+        subset.register(subset_view)
+        test_set.add_coords_to_roi_data_with_color(
+            np.array([[0, 0], [rows - 1, cols - 1]]), 'red'
+        )
+        subset.add_coords_to_roi_data_with_color(np.array([[1, 1]]), 'red')
+        filepath = TEST_FILES[1]
+        image = ImageStamp(filepath)
+        image.crop((rows - 2, cols - 3))
+        test_set.add_image(filepath, image)
+        # The images are cropped to the smallest common shape like they are
+        # when they are opened at once
+        shape = (rows - 2, cols - 3)
+        assert test_set.shape == subset.shape == shape
+        assert len(test_set.images) == 2
+        assert all(image.shape[:2] == shape for image in test_set.images)
+        assert test_set._roi_data.shape == subset._roi_data.shape == shape
+        assert np.array_equal(
+            np.column_stack(test_set.get_coordinates_of_color('red')),
+            [[0, 0]]
+        )
+        assert np.array_equal(
+            np.column_stack(subset.get_coordinates_of_color('red')),
+            [[1, 1]]
+        )
+        assert test_set._point_is_in_image(test_set.center)
+        assert view.images_set == subset_view.images_set == 1
+        assert view.roi_data_set and subset_view.roi_data_set
+        # Larger images are cropped to the new shape
+        filepath = TEST_FILES[2]
+        test_set.add_image(filepath, ImageStamp(filepath))
+        assert test_set.images[-1].shape[:2] == shape
+        assert view.images_set == 1
+
+    @pytest.mark.parametrize('workers', [1, 2])
+    def test_create_image_list(self, workers):
+        with pytest.warns(UserWarning):
+            test_set = PDSSpectImageSet([FILE_1, 'foo', FILE_2], workers)
+        assert test_set.filenames == [FILE_1_NAME, 'foo', FILE_2_NAME]
+        assert len(test_set.images) == 2
+        assert test_set.images[0].image_name == FILE_1_NAME
+        assert 'foo' not in test_set.load_times
+
     def test_register(self):
         assert self.test_set._views == []
         self.test_set.register('foo')
@@ -180,14 +523,18 @@ class TestPDSSpectImageSet(object):
             (0, 0),
             (1, 1),
             (2, 2),
-            (3, 0),
-            (4, 1),
-            (5, 2),
-            (6, 0),
-            (-1, 2),
-            (-2, 1),
-            (-3, 0),
-            (-4, 2),
+            (3, 3),
+            (4, 4),
+            (5, 0),
+            (6, 1),
+            (9, 4),
+            (10, 0),
+            (-1, 4),
+            (-2, 3),
+            (-3, 2),
+            (-4, 1),
+            (-5, 0),
+            (-6, 4),
         ]
     )
     def test_selection_index(self, index, expected):
@@ -202,14 +549,18 @@ class TestPDSSpectImageSet(object):
             (0, 'filled rectangle'),
             (1, 'filled polygon'),
             (2, 'pencil'),
-            (3, 'filled rectangle'),
-            (4, 'filled polygon'),
-            (5, 'pencil'),
-            (6, 'filled rectangle'),
-            (-1, 'pencil'),
-            (-2, 'filled polygon'),
-            (-3, 'filled rectangle'),
-            (-4, 'pencil'),
+            (3, 'brush'),
+            (4, 'magic wand'),
+            (5, 'filled rectangle'),
+            (6, 'filled polygon'),
+            (9, 'magic wand'),
+            (10, 'filled rectangle'),
+            (-1, 'magic wand'),
+            (-2, 'brush'),
+            (-3, 'pencil'),
+            (-4, 'filled polygon'),
+            (-5, 'filled rectangle'),
+            (-6, 'magic wand'),
             (0, 'filled rectangle'),
         ]
     )
@@ -375,17 +726,19 @@ class TestPDSSpectImageSet(object):
     )
     def test_alpha(self, alpha, alpha255):
         red_coords = np.array([[0, 0], [32, 16]])
-        rgba = [255.0, 0.0, 0.0, 355.]
-        for red_coord in red_coords:
-            row, col = red_coord
-            assert self.test_set._roi_data[row, col, 3] == 0
-        self.test_set._roi_data[np.column_stack(red_coords)] = rgba
+        rows, cols = np.column_stack(red_coords)
+        assert not self.test_set.pan_roi_data[rows, cols, 3].any()
+        self.test_set.add_coords_to_roi_data_with_color(red_coords, 'red')
         self.test_set.alpha = alpha
         assert self.test_set._alpha == alpha
         assert self.test_set._alpha == self.test_set.alpha
-        for red_coord in red_coords:
-            row, col = red_coord
-            assert self.test_set._roi_data[row, col, 3] == alpha255
+        assert self.test_set._maskrgb.alpha == alpha
+        assert (self.test_set._roi_data[rows, cols] == 1).all()
+        assert (self.test_set.pan_roi_data[rows, cols, 3] == 255.).all()
+        self.test_set._maskrgb.set_data(self.test_set.pan_roi_data)
+        cutout = self.test_set._maskrgb.get_scaled_cutout(0, 0, 31, 63, 1, 1)
+        assert (cutout.data[rows, cols, 3] == alpha255).all()
+        assert np.array_equal(cutout.data[rows, cols, :3], [[255., 0, 0]] * 2)
 
     def test_flip_x(self):
         assert self.test_set._flip_x == self.test_set.flip_x
@@ -477,9 +830,26 @@ class TestPDSSpectImageSet(object):
         self.test_set.zoom = zoom
         self.test_set.center = center
         x1, y1, x2, y2 = edges
-        pan_slice = np.s_[y1:y2:1, x1:x2:1]
-        pan_roi_data = self.test_set._roi_data[pan_slice]
-        assert np.array_equal(self.test_set.pan_roi_data, pan_roi_data)
+        self.test_set.add_coords_to_roi_data_with_color(
+            np.array([[y1, x1], [y2 - 1, x2 - 1]]), 'brown'
+        )
+        pan_roi_data = self.test_set.pan_roi_data
+        assert pan_roi_data.shape == (y2 - y1, x2 - x1, 4)
+        assert np.array_equal(pan_roi_data[0, 0], [165.0, 42.0, 42.0, 255.])
+        assert np.array_equal(pan_roi_data[-1, -1], pan_roi_data[0, 0])
+        assert not pan_roi_data[1:-1, 1:-1].any()
+
+    def test_get_label_from_color(self):
+        assert self.test_set._get_label_from_color('red') == 1
+        assert self.test_set._get_label_from_color('eraser') == 15
+
+    def test_get_roi_rgba_table(self):
+        self.test_set.alpha = .5
+        rgba_table = self.test_set._get_roi_rgba_table()
+        assert rgba_table.shape == (16, 4)
+        assert not rgba_table[0].any()
+        assert np.array_equal(rgba_table[1], [255.0, 0.0, 0.0, 255.])
+        assert np.array_equal(rgba_table[15], [0.0, 0.0, 0.0, 255.])
 
     @pytest.mark.parametrize(
         'color, rgb255',
@@ -540,24 +910,24 @@ class TestPDSSpectImageSet(object):
 
         assert np.array_equal(
             self.test_set._roi_data[rows, cols],
-            np.array([[255.0, 0.0, 0.0, 255.]])
+            np.array([1])
         )
         self.test_set._erase_coords(coords)
 
         assert np.array_equal(
             self.test_set._roi_data[rows, cols],
-            np.array([[0.0, 0.0, 0.0, 0.0]])
+            np.array([0])
         )
         self.test_set.alpha = 1
         self.test_set.add_coords_to_roi_data_with_color(coords, 'brown')
         assert np.array_equal(
             self.test_set._roi_data[rows, cols],
-            np.array([[165.0, 42.0, 42.0, 255.]])
+            np.array([2])
         )
         self.test_set._erase_coords(coords)
         assert np.array_equal(
             self.test_set._roi_data[rows, cols],
-            np.array([[0.0, 0.0, 0.0, 0.0]])
+            np.array([0])
         )
 
     def test_add_coords_to_roi_data_with_color(self):
@@ -565,28 +935,28 @@ class TestPDSSpectImageSet(object):
         rows, cols = np.column_stack(coords)
         assert np.array_equal(
             self.test_set._roi_data[rows, cols],
-            np.array([[0., 0., 0., 0.]])
+            np.array([0])
         )
 
         self.test_set.alpha = 1
         self.test_set.add_coords_to_roi_data_with_color(coords, 'red')
         assert np.array_equal(
             self.test_set._roi_data[rows, cols],
-            np.array([[255.0, 0.0, 0.0, 255.]])
+            np.array([1])
         )
 
         self.test_set.alpha = .75
         self.test_set.add_coords_to_roi_data_with_color(coords, 'brown')
         assert np.array_equal(
             self.test_set._roi_data[rows, cols],
-            np.array([[165.0, 42.0, 42.0, 191.25]])
+            np.array([2])
         )
 
         self.test_set.alpha = .25
         self.test_set.add_coords_to_roi_data_with_color(coords, 'purple')
         assert np.array_equal(
             self.test_set._roi_data[rows, cols],
-            np.array([[160.0, 32.0, 240.0, 63.75]])
+            np.array([14])
         )
 
     @pytest.mark.parametrize(
@@ -610,6 +980,377 @@ class TestPDSSpectImageSet(object):
         test_coords = np.column_stack([rows, cols])
         assert np.array_equal(coords1, test_coords)
 
+    def test_get_coordinates_in_ranges(self):
+        test_set = self.test_set
+        data1 = test_set.images[0].data
+        data2 = test_set.images[1].data
+        low1, high1 = np.percentile(data1, [10, 90])
+        low2 = np.median(data2)
+        rows, cols = test_set.get_coordinates_in_ranges(
+            [(0, low1, high1)]
+        )
+        test_mask = np.zeros(test_set.shape, dtype=bool)
+        test_mask[rows, cols] = True
+        assert np.array_equal(test_mask, (data1 >= low1) & (data1 <= high1))
+        rows, cols = test_set.get_coordinates_in_ranges(
+            [(test_set.images[0], low1, high1), (1, low2, None)]
+        )
+        test_mask = np.zeros(test_set.shape, dtype=bool)
+        test_mask[rows, cols] = True
+        assert np.array_equal(
+            test_mask, (data1 >= low1) & (data1 <= high1) & (data2 >= low2)
+        )
+        rows, cols = test_set.get_coordinates_in_ranges([])
+        assert len(rows) == test_set.shape[0] * test_set.shape[1]
+
+    def test_get_coordinates_in_ranges_multiband(self):
+        test_set = PDSSpectImageSet(TEST_FILES[:2])
+        rows, cols = test_set.shape[:2]
+        data = np.full((rows, cols, 3), 7.)
+        data[..., 0] = np.arange(cols)
+        data[..., 1] = np.arange(rows)[:, np.newaxis]
+        test_set.images[0].set_data(data)
+        data2 = test_set.images[1].data
+        low2 = np.median(data2)
+        coordinates = test_set.get_coordinates_in_ranges(
+            [(0, 0, 10), (1, low2, None)]
+        )
+        test_mask = np.zeros((rows, cols), dtype=bool)
+        test_mask[coordinates] = True
+        assert np.array_equal(
+            test_mask,
+            np.all((data >= 0) & (data <= 10), axis=2) & (data2 >= low2)
+        )
+        rows, cols = test_set.get_coordinates_in_ranges([(0, 5, 10)])
+        assert len(rows) == 36
+        assert np.all((rows >= 5) & (rows <= 10))
+        assert np.all((cols >= 5) & (cols <= 10))
+
+    def test_grow_region(self):
+        test_set = PDSSpectImageSet(TEST_FILES)
+        rows, cols = test_set.shape
+        data = np.zeros((rows, cols))
+        data[:, :cols // 2] = 10.
+        data[:, 1] = 10.3
+        data[:2, -2:] = 10.
+        for index, image in enumerate(test_set.images):
+            image.set_data(data * (index + 1))
+        assert np.array_equal(
+            test_set._get_spectra(np.array([0, 0]), np.array([1, 2])),
+            [[10.3 * n, 10. * n] for n in range(1, 6)]
+        )
+        left = np.zeros((rows, cols), dtype=bool)
+        left[:, :cols // 2] = True
+        coords = test_set.grow_region(rows // 2, 0)
+        test_mask = np.zeros((rows, cols), dtype=bool)
+        test_mask[coords[:, 0], coords[:, 1]] = True
+        assert len(coords) == left.sum()
+        assert np.array_equal(test_mask, left)
+        # Column 1 is not within a tolerance of 1%
+        coords = test_set.grow_region(rows // 2, 0, tolerance=.01)
+        assert np.array_equal(np.sort(coords[:, 0]), np.arange(rows))
+        assert np.all(coords[:, 1] == 0)
+        # The region stops growing at the max area
+        coords = test_set.grow_region(rows // 2, 0, max_area=5)
+        assert len(coords) == 5
+        assert np.array_equal(coords[0], [rows // 2, 0])
+        # Pixels with the same spectrum that are not connected are not added
+        coords = test_set.grow_region(rows - 1, cols - 1, tolerance=0)
+        assert len(coords) == (~left).sum() - 4
+        test_set.wand_max_area = 1
+        assert len(test_set.grow_region(rows - 1, cols - 1)) == 1
+
+    def test_morph_roi(self):
+        test_set = self.test_set
+        coords = np.column_stack(np.nonzero(np.ones((5, 5)))) + [10, 8]
+        test_set.add_coords_to_roi_data_with_color(coords, 'red')
+        test_set.add_coords_to_roi_data_with_color(
+            np.array([[9, 8], [1, 1]]), 'brown'
+        )
+        test_set.morph_roi('red', 'dilate', 1)
+        test_mask = np.zeros(test_set.shape, dtype=bool)
+        test_mask[9:16, 7:14] = True
+        assert np.array_equal(test_set._roi_data == 1, test_mask)
+        # Dilating replaces other colors
+        assert test_set._roi_data[9, 8] == 1
+        assert test_set._roi_data[1, 1] == 2
+        assert np.count_nonzero(test_set._roi_data == 2) == 1
+        test_set.morph_roi('red', 'erode', 2)
+        test_mask[:] = False
+        test_mask[11:14, 9:12] = True
+        assert np.array_equal(test_set._roi_data == 1, test_mask)
+        test_set._erase_coords(np.array([[12, 10]]))
+        test_set.morph_roi('red', 'fill holes')
+        assert np.array_equal(test_set._roi_data == 1, test_mask)
+        for label in (1, 2):
+            assert np.array_equal(
+                test_set.roi_index[label],
+                np.flatnonzero(test_set._roi_data == label)
+            )
+        test_set.morph_roi('pink', 'dilate', 3)
+        assert not np.any(test_set._roi_data == 7)
+        with pytest.raises(ValueError):
+            test_set.morph_roi('red', 'smooth')
+
+    def test_get_roi_bounding_box(self):
+        test_set = self.test_set
+        assert test_set._get_roi_bounding_box(1) is None
+        test_set.add_coords_to_roi_data_with_color(
+            np.array([[2, 9], [5, 1], [3, 4]]), 'red'
+        )
+        assert test_set._get_roi_bounding_box(1) == (2, 6, 1, 10)
+        assert test_set._get_roi_bounding_box(1, pad=3) == (0, 9, 0, 13)
+        height, width = test_set.shape
+        test_set.add_coords_to_roi_data_with_color(
+            np.array([[height - 1, width - 1]]), 'brown'
+        )
+        assert test_set._get_roi_bounding_box(2, pad=2) == (
+            height - 3, height, width - 3, width
+        )
+
+    def test_combine_rois(self):
+        test_set = self.test_set
+        first = np.zeros(test_set.shape, dtype=bool)
+        first[2:6, 2:6] = True
+        # Colors in one window do not overlap
+        second = np.zeros(test_set.shape, dtype=bool)
+        second[4:8, 4:8] = True
+        second &= ~first
+
+        def reset():
+            test_set.delete_all_rois()
+            test_set.add_coords_to_roi_data_with_color(
+                np.column_stack(np.nonzero(first)), 'red'
+            )
+            test_set.add_coords_to_roi_data_with_color(
+                np.column_stack(np.nonzero(second)), 'brown'
+            )
+            test_set.add_coords_to_roi_data_with_color(
+                np.array([[20, 20]]), 'pink'
+            )
+
+        def check(operation, expected):
+            reset()
+            test_set.combine_rois(operation, 'red', 'brown', 'pink')
+            # The target is replaced, including outside of the operands
+            assert np.array_equal(test_set._roi_data == 7, expected)
+            assert np.array_equal(
+                test_set.roi_index.get(7, []), np.flatnonzero(expected)
+            )
+            # The pixels of the result are taken from the operands
+            assert np.array_equal(
+                test_set._roi_data == 1, first & ~expected
+            )
+            assert np.array_equal(
+                test_set._roi_data == 2, second & ~expected
+            )
+
+        check('intersection', first & second)
+        check('difference', first & ~second)
+        check('xor', first ^ second)
+        # The target can be an operand
+        reset()
+        test_set.combine_rois('union', 'red', 'brown', 'red')
+        assert np.array_equal(test_set._roi_data == 1, first | second)
+        assert not np.any(test_set._roi_data == 2)
+        # The same color in another window
+        test_set.delete_all_rois()
+        test_set.add_coords_to_roi_data_with_color(
+            np.column_stack(np.nonzero(first)), 'red'
+        )
+        subset = test_set.create_subset()
+        overlap = np.zeros(test_set.shape, dtype=bool)
+        overlap[4:8, 4:8] = True
+        subset.add_coords_to_roi_data_with_color(
+            np.column_stack(np.nonzero(overlap)), 'red'
+        )
+        test_set.combine_rois(
+            'intersection', 'red', (subset, 'red'), 'brown'
+        )
+        assert np.array_equal(test_set._roi_data == 2, first & overlap)
+        assert np.array_equal(test_set._roi_data == 1, first & ~overlap)
+        test_set.combine_rois('union', 'red', 'brown', 'red')
+        test_set.combine_rois('difference', (subset, 'red'), 'red', 'pink')
+        assert np.array_equal(test_set._roi_data == 7, overlap & ~first)
+        assert np.array_equal(subset._roi_data == 1, overlap)
+        # Operands that do not overlap
+        test_set.combine_rois('intersection', 'red', 'purple', 'pink')
+        assert not np.any(test_set._roi_data == 7)
+        subset.delete_all_rois()
+        with pytest.raises(ValueError):
+            test_set.combine_rois('nand', 'red', 'brown', 'pink')
+
+    def test_combine_rois_into_eraser(self):
+        test_set = self.test_set
+        first = np.zeros(test_set.shape, dtype=bool)
+        first[2:6, 2:6] = True
+        test_set.add_coords_to_roi_data_with_color(
+            np.column_stack(np.nonzero(first)), 'red'
+        )
+        test_set.add_coords_to_roi_data_with_color(
+            np.array([[5, 5], [20, 20]]), 'brown'
+        )
+        subset = test_set.create_subset()
+        overlap = np.zeros(test_set.shape, dtype=bool)
+        overlap[4:8, 4:8] = True
+        subset.add_coords_to_roi_data_with_color(
+            np.column_stack(np.nonzero(overlap)), 'red'
+        )
+        # The result is erased from every ROI instead of labeled as eraser
+        test_set.combine_rois('union', 'red', (subset, 'red'), 'eraser')
+        assert not np.any(test_set._roi_data == 15)
+        assert 15 not in test_set.roi_index
+        assert not np.any(test_set._roi_data[first | overlap])
+        assert np.array_equal(
+            np.column_stack(test_set.get_coordinates_of_color('brown')),
+            [[20, 20]]
+        )
+        assert not test_set.get_rois_masks_to_export()['eraser'].any()
+        assert np.array_equal(subset._roi_data == 1, overlap)
+        subset.delete_all_rois()
+
+    def test_get_roi_statistics(self):
+        test_set = self.test_set
+
+        def check(color):
+            stats = test_set.get_roi_statistics(color)
+            rows, cols = test_set.get_coordinates_of_color(color)
+            spectra = test_set._get_spectra(rows, cols)
+            assert stats.count == len(rows)
+            if len(rows):
+                assert np.allclose(stats.mean, spectra.mean(axis=1))
+                assert np.allclose(stats.std, spectra.std(axis=1))
+            else:
+                assert np.all(np.isnan(stats.mean))
+
+        stats = test_set.get_roi_statistics('red')
+        assert stats.count == 0
+        assert len(stats.mean) == len(test_set.images)
+        coords = np.column_stack(np.nonzero(np.ones((6, 5)))) + [3, 2]
+        test_set.add_coords_to_roi_data_with_color(coords, 'red')
+        # The statistics are updated instead of computed again
+        assert test_set.get_roi_statistics('red') is stats
+        check('red')
+        test_set.get_roi_statistics('brown')
+        test_set.add_coords_to_roi_data_with_color(coords[::3], 'brown')
+        check('red')
+        check('brown')
+        test_set._erase_coords(coords[:7])
+        check('red')
+        check('brown')
+        test_set.morph_roi('red', 'dilate', 1)
+        check('red')
+        check('brown')
+        test_set.delete_all_rois()
+        assert test_set.get_roi_statistics('red').count == 0
+        test_set._roi_data = np.ones(test_set.shape[:2], dtype=np.uint8)
+        check('red')
+
+    def test_get_roi_statistics_with_nan(self):
+        test_set = PDSSpectImageSet(TEST_FILES, dtype='float32', cube=True)
+        test_set.cube[0, 3:6, 2:4] = np.nan
+        test_set.cube[1, 4, 3] = np.nan
+
+        def check():
+            rows, cols = test_set.get_coordinates_of_color('red')
+            spectra = test_set.cube[:, rows, cols].astype(float)
+            assert stats.count == len(rows)
+            assert np.array_equal(
+                stats.nan_count, np.isnan(spectra).sum(axis=1)
+            )
+            assert np.allclose(stats.mean, np.nanmean(spectra, axis=1))
+            assert np.allclose(stats.std, np.nanstd(spectra, axis=1))
+
+        stats = test_set.get_roi_statistics('red')
+        coords = np.column_stack(np.nonzero(np.ones((6, 5)))) + [3, 2]
+        test_set.add_coords_to_roi_data_with_color(coords, 'red')
+        check()
+        test_set.erase_coords(coords[:7])
+        check()
+        test_set.morph_roi('red', 'dilate', 1)
+        check()
+        # The statistics are updated instead of computed again
+        assert test_set.get_roi_statistics('red') is stats
+
+    def test_roi_index(self):
+        test_set = self.test_set
+        assert test_set.roi_index == {}
+        coords1 = np.array([[12, 12], [42, 24], [12, 12], [3, 4]])
+        coords2 = np.array([[42, 24], [50, 30]])
+        test_set.add_coords_to_roi_data_with_color(coords1, 'red')
+        test_set.add_coords_to_roi_data_with_color(coords2, 'brown')
+        test_set._erase_coords(np.array([[3, 4]]))
+        assert sorted(test_set.roi_index) == [1, 2]
+        for label in (1, 2):
+            assert np.array_equal(
+                test_set.roi_index[label],
+                np.flatnonzero(test_set._roi_data == label)
+            )
+        test_set._erase_coords(np.array([[12, 12]]))
+        assert sorted(test_set.roi_index) == [2]
+        roi_data = test_set._roi_data.copy()
+        test_set._roi_data = roi_data
+        assert test_set._roi_index is None
+        assert np.array_equal(
+            test_set.roi_index[2], np.flatnonzero(roi_data == 2)
+        )
+        rows, cols = test_set.all_rois_coordinates
+        assert np.array_equal(rows, [42, 50])
+        assert np.array_equal(cols, [24, 30])
+
+    def test_batch(self):
+        class View(PDSSpectImageSetViewBase):
+            updates = 0
+
+            def set_roi_data(self):
+                self.updates += 1
+
+        subset = self.test_set.create_subset()
+        view, subset_view, other_subset_view = View(), View(), View()
+        self.test_set.register(view)
+        subset.register(subset_view)
+        other_subset = self.test_set.create_subset()
+        other_subset.register(other_subset_view)
+        coords = np.array([[12, 12]])
+        with self.test_set.batch():
+            self.test_set.add_coords_to_roi_data_with_color(coords, 'red')
+            with self.test_set.batch():
+                self.test_set.add_coords_to_roi_data_with_color(
+                    coords, 'brown'
+                )
+                subset.add_coords_to_roi_data_with_color(coords, 'red')
+            assert view.updates == subset_view.updates == 0
+            subset.delete_all_rois()
+        assert view.updates == 1
+        assert subset_view.updates == 1
+        assert other_subset_view.updates == 0
+        assert self.test_set._roi_data[12, 12] == 2
+        assert not subset._roi_data.any()
+        self.test_set.add_coords_to_roi_data_with_color(coords, 'red')
+        assert view.updates == 2
+        self.test_set.unregister(view)
+
+    def test_erase_coords_and_update_views(self):
+        class View(PDSSpectImageSetViewBase):
+            updates = 0
+
+            def set_roi_data(self):
+                self.updates += 1
+
+        test_set = self.test_set
+        view = View()
+        test_set.register(view)
+        coords = np.array([[2, 3], [4, 5], [6, 7]])
+        test_set.add_coords_to_roi_data_with_color(coords, 'red')
+        test_set.erase_coords(coords[:2])
+        assert np.array_equal(
+            np.column_stack(test_set.get_coordinates_of_color('red')),
+            [[6, 7]]
+        )
+        assert view.updates == 2
+        test_set.unregister(view)
+        test_set.delete_all_rois()
+
     def test_delete_rois_with_color(self):
         coords1 = np.array([[12, 12]])
         coords2 = np.array([[42, 24]])
@@ -620,20 +1361,20 @@ class TestPDSSpectImageSet(object):
         self.test_set.add_coords_to_roi_data_with_color(coords2, 'brown')
         assert np.array_equal(
             self.test_set._roi_data[rows1, cols1],
-            np.array([[255.0, 0.0, 0.0, 191.25]])
+            np.array([1])
         )
         assert np.array_equal(
             self.test_set._roi_data[rows2, cols2],
-            np.array([[165.0, 42.0, 42.0, 191.25]])
+            np.array([2])
         )
         self.test_set.delete_rois_with_color('red')
         assert np.array_equal(
             self.test_set._roi_data[rows1, cols1],
-            np.array([[0., 0., 0., 0.]])
+            np.array([0])
         )
         assert np.array_equal(
             self.test_set._roi_data[rows2, cols2],
-            np.array([[165.0, 42.0, 42.0, 191.25]])
+            np.array([2])
         )
 
     def test_create_subset(self):
@@ -716,28 +1457,28 @@ class TestPDSSpectImageSet(object):
         self.test_set.add_coords_to_roi_data_with_color(coords1, 'red')
         assert np.array_equal(
             self.test_set._roi_data[rows1, cols1],
-            np.array([[255.0, 0.0, 0.0, 255.0]])
+            np.array([1])
         )
         assert not np.array_equal(
             subset._roi_data[rows1, cols1],
-            np.array([[255.0, 0.0, 0.0, 255.0]])
+            np.array([1])
         )
         self.test_set.simultaneous_roi = True
         assert self.test_set._simultaneous_roi
         assert subset._simultaneous_roi
         assert np.array_equal(
             subset._roi_data[rows1, cols1],
-            np.array([[255.0, 0.0, 0.0, 255.0]])
+            np.array([1])
         )
         self.test_set.simultaneous_roi = False
         self.test_set.add_coords_to_roi_data_with_color(coords1, 'brown')
         assert np.array_equal(
             self.test_set._roi_data[rows1, cols1],
-            np.array([[165.0, 42.0, 42.0, 255.0]])
+            np.array([2])
         )
         assert np.array_equal(
             subset._roi_data[rows1, cols1],
-            np.array([[255.0, 0.0, 0.0, 255.0]])
+            np.array([1])
         )
 
     def test_unit(self):
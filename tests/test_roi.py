@@ -4,7 +4,9 @@ from . import FILE_1, TEST_FILES, reset_image_set
 import pytest
 from ginga.canvas.types import basic
 
-from pdsspect.roi import Rectangle, Polygon, Pencil, ROIBase
+from pdsspect.roi import (
+    Rectangle, Polygon, Pencil, Brush, MagicWand, ROIBase
+)
 from pdsspect.pdsspect_image_set import PDSSpectImageSet
 from pdsspect.pds_image_view_canvas import PDSImageViewCanvas
 
@@ -42,6 +44,29 @@ def test_abstract_base_class():
     assert mock_roi_base_class.stop_ROI(2, 0)
 
 
+def ray_casting_contains_arr(points, xa, ya):
+    """The ray casting algorithm ROIBase.contains_arr used to use"""
+    result1 = np.zeros(ya.shape, dtype=bool)
+    result2 = np.zeros(ya.shape, dtype=bool)
+    xj, yj = points[-1]
+    for xi, yi in points:
+        tf = np.logical_and(
+            np.logical_or(np.logical_and(yi < ya, yj >= ya),
+                          np.logical_and(yj < ya, yi >= ya)),
+            np.logical_or(xi <= xa, xj <= xa)
+        )
+        rs, cs = np.where(tf)
+        cross1 = np.zeros(ya.shape, dtype=bool)
+        cross2 = np.zeros(ya.shape, dtype=bool)
+        crossing = xi + (ya[rs, cs] - yi) / (yj - yi) * (xj - xi)
+        cross1[rs, cs] = crossing < xa[rs, cs]
+        cross2[rs, cs] = crossing <= xa[rs, cs]
+        result1[tf] ^= cross1[tf]
+        result2[tf] ^= cross2[tf]
+        xj, yj = xi, yi
+    return np.logical_or(result1, result2)
+
+
 class TestPolygon(object):
     image_set = PDSSpectImageSet([FILE_1])
     view_canvas = PDSImageViewCanvas()
@@ -138,6 +163,41 @@ class TestPolygon(object):
         mask = poly.contains_arr(X, Y)
         assert np.array_equal(mask, test_mask)
 
+    def test_get_mask_from_roi(self, poly):
+        poly.create_ROI(self.shape1)
+        mask, row, col = poly._get_mask_from_roi(poly)
+        assert (row, col) == (2, 2)
+        assert np.array_equal(
+            mask,
+            np.array(
+                [
+                    [False, False, False, False, False],
+                    [False, True, True, True, True],
+                    [False, True, True, True, True],
+                    [False, True, False, False, True],
+                ]
+            )
+        )
+        rows, cols = poly._get_roi_coords()
+        assert np.array_equal(rows, np.where(mask)[0] + 2)
+        assert np.array_equal(cols, np.where(mask)[1] + 2)
+        poly.create_ROI([(29.5, 2.5), (35.5, 2.5), (35.5, 5.5), (29.5, 5.5)])
+        rows, cols = poly._get_roi_coords()
+        assert np.array_equal(np.unique(cols), [30, 31])
+        assert np.array_equal(np.unique(rows), [3, 4, 5])
+
+    @pytest.mark.parametrize('seed', range(5))
+    @pytest.mark.parametrize('offset', [.5, 0.])
+    def test_contains_arr_matches_ray_casting(self, seed, offset, poly):
+        random = np.random.RandomState(seed)
+        points = random.randint(0, [30, 62], size=(25, 2)) + offset
+        points[1::3, 1] = points[::3, 1][:len(points[1::3])]
+        poly.create_ROI([tuple(point) for point in points])
+        X, Y = np.mgrid[-2:34, -2:66]
+        expected = ray_casting_contains_arr(poly.get_data_points(), X, Y)
+        assert np.array_equal(poly.contains_arr(X, Y), expected)
+        assert not poly.contains_arr(X[:0], Y[:0]).size
+
     def test_move_by_delta(self, poly):
         poly.create_ROI(self.shape1)
         rect_points = poly.get_points()
@@ -345,3 +405,90 @@ class TestPencil(object):
                 test_coords,
                 np.array([[264, 265], [269, 266]])
             )
+
+
+class TestBrush(object):
+    image_set = PDSSpectImageSet([FILE_1])
+    view_canvas = PDSImageViewCanvas()
+
+    @pytest.fixture
+    def brush(self):
+        reset_image_set(self.image_set)
+        self.view_canvas = PDSImageViewCanvas()
+        return Brush(self.image_set, self.view_canvas)
+
+    def test_init(self, brush):
+        assert brush._current_path in self.view_canvas.objects
+        left, bottom, right, top = self.image_set.edges
+        assert brush._painted.shape == (top - bottom, right - left)
+        assert not brush._painted.any()
+        assert len(brush._footprint) == 5
+
+    def test_start_ROI(self, brush):
+        brush.start_ROI(3.6, 1.5)
+        assert np.array_equal(
+            np.column_stack(np.nonzero(brush._painted)),
+            [[1, 4], [2, 3], [2, 4], [2, 5], [3, 4]]
+        )
+        stroke = brush._stroke.get_data()
+        assert np.array_equal(stroke[2, 4], [255, 0, 0, 255])
+        assert np.array_equal(stroke[0, 0], [0, 0, 0, 0])
+        assert len(self.view_canvas.objects) == 1
+
+    def test_continue_ROI(self, brush):
+        self.image_set.brush_radius = 0
+        brush = Brush(self.image_set, self.view_canvas)
+        brush.start_ROI(0, 0)
+        # Pixels between the points are painted
+        brush.continue_ROI(5, 2)
+        rows, cols = np.nonzero(brush._painted)
+        assert np.array_equal(cols, np.arange(6))
+        assert np.array_equal(rows, [0, 0, 1, 1, 2, 2])
+        # Pixels outside the pan are ignored
+        brush.continue_ROI(-1, -1)
+        assert np.count_nonzero(brush._painted) == 7
+
+    def test_stop_ROI(self, brush):
+        brush.start_ROI(3.6, 1.5)
+        brush.continue_ROI(3.6, 1.5)
+        test_coords = brush.stop_ROI(0, 0)
+        assert brush._current_path not in self.view_canvas.objects
+        assert np.array_equal(
+            test_coords, [[1, 4], [2, 3], [2, 4], [2, 5], [3, 4]]
+        )
+        self.image_set.zoom = 2.0
+        x, y = self.image_set.center
+        self.image_set.center = (x + 5.2, y + 5.7)
+        self.image_set.brush_radius = 0
+        brush = Brush(self.image_set, self.view_canvas)
+        brush.start_ROI(3.6, 1.5)
+        left, bottom, _, _ = self.image_set.edges
+        assert np.array_equal(brush.stop_ROI(0, 0), [[2 + bottom, 4 + left]])
+        self.image_set.zoom = 1.0
+
+
+class TestMagicWand(object):
+    image_set = PDSSpectImageSet([FILE_1])
+    view_canvas = PDSImageViewCanvas()
+
+    @pytest.fixture
+    def wand(self):
+        reset_image_set(self.image_set)
+        return MagicWand(self.image_set, self.view_canvas)
+
+    def test_start_ROI(self, wand):
+        wand.start_ROI(3.6, 1.5)
+        assert wand._seed == (2, 4)
+        wand.continue_ROI(0, 0)
+        assert wand._seed == (0, 0)
+        self.image_set.zoom = 2.0
+        left, bottom, _, _ = self.image_set.edges
+        wand.start_ROI(3.6, 1.5)
+        assert wand._seed == (2 + bottom, 4 + left)
+        self.image_set.zoom = 1.0
+
+    def test_stop_ROI(self, wand):
+        wand.start_ROI(3.6, 1.5)
+        coords = wand.stop_ROI(0, 0)
+        assert np.array_equal(coords, self.image_set.grow_region(2, 4))
+        assert np.array_equal(coords[0], [2, 4])
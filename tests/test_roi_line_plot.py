@@ -36,3 +36,43 @@ class TestROILinePlotModel(object):
         self.image_set.images[0].wavelength = 1
         assert len(test_model.data_with_color('red')) == 3
         assert test_model.data_with_color('red')[2][0] == 24.0
+
+    def test_data_with_color_from_cube(self):
+        image_set = PDSSpectImageSet([FILE_1, FILE_4, FILE_3], cube=True)
+        model = roi_line_plot.ROILinePlotModel(image_set)
+        coords = np.array([[42, 24], [43, 25]])
+        image_set.add_coords_to_roi_data_with_color(coords, 'red')
+        for image in image_set.images:
+            image.wavelength = float('nan')
+        image_set.images[2].wavelength = 2
+        image_set.images[0].wavelength = 1
+        data = model.data_with_color('red')
+        assert isinstance(data, np.ndarray)
+        assert data.shape == (2, 2)
+        rows, cols = coords.T
+        assert np.array_equal(data[0], image_set.images[0].data[rows, cols])
+        assert np.array_equal(data[1], image_set.images[2].data[rows, cols])
+
+
+class TestROILinePlotController(object):
+
+    image_set = PDSSpectImageSet([FILE_1, FILE_4, FILE_3])
+
+    @pytest.fixture()
+    def controller(self):
+        reset_image_set(self.image_set)
+        model = roi_line_plot.ROILinePlotModel(self.image_set)
+        return roi_line_plot.ROILinePlotController(model, None)
+
+    def test_classify(self, controller):
+        coords = np.array([[42, 24]])
+        self.image_set.add_coords_to_roi_data_with_color(coords, 'red')
+        controller.model.selected_colors.append('brown')
+        controller.classify(3.)
+        # Only the selected colors are classified and brown has no ROI
+        assert np.count_nonzero(self.image_set._roi_data) == 1
+        controller.model.selected_colors.remove('brown')
+        controller.classify(0.)
+        # The pixel has the same spectrum as the reference
+        assert self.image_set._roi_data[42, 24] == 1
+        assert np.count_nonzero(self.image_set._roi_data) > 1
@@ -0,0 +1,64 @@
+from . import numpy as np
+
+from pdsspect.roi_statistics import RunningStatistics
+
+
+def test_running_statistics():
+    spectra = np.arange(24, dtype=float).reshape(2, 12) ** 1.5
+    stats = RunningStatistics(2)
+    assert stats.count == 0
+    assert np.all(np.isnan(stats.mean))
+    assert np.all(np.isnan(stats.std))
+    stats.add(spectra[:, :5])
+    stats.add(spectra[:, 5:])
+    stats.add(spectra[:, :0])
+    assert stats.count == 12
+    assert np.allclose(stats.mean, spectra.mean(axis=1))
+    assert np.allclose(stats.std, spectra.std(axis=1))
+    stats.remove(spectra[:, 3:8])
+    kept = np.delete(spectra, np.s_[3:8], axis=1)
+    assert stats.count == 7
+    assert np.allclose(stats.mean, kept.mean(axis=1))
+    assert np.allclose(stats.std, kept.std(axis=1))
+    stats.remove(kept)
+    assert stats.count == 0
+    assert np.all(np.isnan(stats.mean))
+    stats.add(spectra[:, :1])
+    assert np.array_equal(stats.mean, spectra[:, 0])
+    assert np.array_equal(stats.std, [0, 0])
+
+
+def test_running_statistics_with_nan():
+    spectra = np.arange(24, dtype=float).reshape(2, 12) ** 1.5
+    spectra[0, [1, 6, 9]] = np.nan
+    spectra[1, 6] = np.nan
+    stats = RunningStatistics(2)
+    stats.add(spectra[:, :5])
+    stats.add(spectra[:, 5:])
+    assert stats.count == 12
+    assert np.array_equal(stats.nan_count, [3, 1])
+    assert np.allclose(stats.mean, np.nanmean(spectra, axis=1))
+    assert np.allclose(stats.std, np.nanstd(spectra, axis=1))
+    assert stats.is_finite
+    stats.remove(spectra[:, 3:8])
+    kept = np.delete(spectra, np.s_[3:8], axis=1)
+    assert stats.count == 7
+    assert np.array_equal(stats.nan_count, [2, 0])
+    assert np.allclose(stats.mean, np.nanmean(kept, axis=1))
+    assert np.allclose(stats.std, np.nanstd(kept, axis=1))
+    stats.remove(kept[:, [0, 2, 3, 5, 6]])
+    assert np.array_equal(stats.nan_count, [2, 0])
+    assert np.isnan(stats.mean[0])
+    assert np.isnan(stats.std[0])
+    assert np.allclose(stats.mean[1], kept[1, [1, 4]].mean())
+    assert np.allclose(stats.std[1], kept[1, [1, 4]].std())
+
+
+def test_is_finite():
+    stats = RunningStatistics(1)
+    stats.add([[1., 2.]])
+    assert stats.is_finite
+    stats.add([[np.nan]])
+    assert stats.is_finite
+    stats.add([[np.inf]])
+    assert not stats.is_finite
@@ -52,6 +52,90 @@ class TestSelectionController(object):
         assert self.image_set.selection_index == 0
         assert self.subset.selection_index == 0
 
+    def test_change_brush_radius(self, controller):
+        assert self.image_set.brush_radius == 1
+        assert self.subset.brush_radius == 1
+        controller.change_brush_radius(3)
+        assert self.image_set.brush_radius == 3
+        assert self.subset.brush_radius == 3
+        controller.change_brush_radius(1)
+        assert self.image_set.brush_radius == 1
+        assert self.subset.brush_radius == 1
+
+    def test_change_wand_tolerance(self, controller):
+        assert self.image_set.wand_tolerance == 0.05
+        assert self.subset.wand_tolerance == 0.05
+        controller.change_wand_tolerance(0.2)
+        assert self.image_set.wand_tolerance == 0.2
+        assert self.subset.wand_tolerance == 0.2
+        controller.change_wand_tolerance(0.05)
+        assert self.image_set.wand_tolerance == 0.05
+        assert self.subset.wand_tolerance == 0.05
+
+    def test_morph_current_color(self, controller):
+        self.image_set.add_coords_to_roi_data_with_color(
+            np.array([[4, 2]]), 'red'
+        )
+        self.subset.add_coords_to_roi_data_with_color(
+            np.array([[4, 2]]), 'red'
+        )
+        controller.morph_current_color('dilate', 1)
+        assert np.count_nonzero(self.image_set._roi_data) == 9
+        assert np.count_nonzero(self.subset._roi_data) == 9
+        assert np.all(self.image_set._roi_data[3:6, 1:4] == 1)
+        controller.morph_current_color('erode', 1)
+        assert np.array_equal(
+            np.column_stack(np.nonzero(self.subset._roi_data)), [[4, 2]]
+        )
+        self.image_set.delete_all_rois()
+        self.subset.delete_all_rois()
+
+    def test_roi_names(self, controller):
+        colors = self.image_set.colors[:-1]
+        assert controller.roi_names == (
+            colors + [color + '2' for color in colors]
+        )
+
+    def test_combine_rois(self, controller):
+        self.image_set.add_coords_to_roi_data_with_color(
+            np.array([[4, 2], [5, 2]]), 'brown'
+        )
+        self.subset.add_coords_to_roi_data_with_color(
+            np.array([[5, 2], [6, 2]]), 'brown'
+        )
+        controller.combine_rois('union', 'brown', 'brown2')
+        assert np.array_equal(
+            np.column_stack(np.nonzero(self.image_set._roi_data == 1)),
+            [[4, 2], [5, 2], [6, 2]]
+        )
+        controller.combine_rois('intersection', 'red', 'brown2')
+        assert np.array_equal(
+            np.column_stack(np.nonzero(self.image_set._roi_data == 1)),
+            [[5, 2], [6, 2]]
+        )
+        assert not np.any(self.subset._roi_data == 1)
+        controller.change_current_color_index(14)
+        controller.combine_rois('union', 'red', 'brown2')
+        assert not self.image_set._roi_data.any()
+        # Names of windows that were removed are ignored
+        controller.change_current_color_index(0)
+        self.subset.add_coords_to_roi_data_with_color(
+            np.array([[5, 2]]), 'brown'
+        )
+        controller.combine_rois('union', 'brown2', 'brown3')
+        assert not self.image_set._roi_data.any()
+        self.image_set.delete_all_rois()
+        self.subset.delete_all_rois()
+
+    def test_cluster(self, controller):
+        self.image_set.add_coords_to_roi_data_with_color(
+            np.array([[4, 2]]), 'purple'
+        )
+        controller.cluster(3)
+        assert set(np.unique(self.image_set._roi_data)) <= set([1, 2, 3])
+        assert not self.subset._roi_data.any()
+        self.image_set.delete_all_rois()
+
     def test_change_alpha(self, controller):
         assert self.image_set.alpha == 1.0
         assert self.subset.alpha == 1.0
@@ -63,48 +147,42 @@ class TestSelectionController(object):
         assert self.subset.alpha == 1.0
 
     def test_clear_current_color(self, controller):
-        self.image_set._roi_data[4, 2] = [255.0, 0.0, 0.0, 255.]
-        self.subset._roi_data[4, 2] = [255.0, 0.0, 0.0, 255.]
-        controller.clear_current_color()
-        assert np.array_equal(
-            self.image_set._roi_data[4, 2], [0, 0, 0, 0]
+        self.image_set.add_coords_to_roi_data_with_color(
+            np.array([[4, 2]]), 'red'
         )
-        assert np.array_equal(
-            self.subset._roi_data[4, 2], [0, 0, 0, 0]
+        self.subset.add_coords_to_roi_data_with_color(
+            np.array([[4, 2]]), 'red'
         )
+        controller.clear_current_color()
+        assert self.image_set._roi_data[4, 2] == 0
+        assert self.subset._roi_data[4, 2] == 0
 
     def test_clear_all(self, controller):
-        self.image_set._roi_data[4, 2] = [255.0, 0.0, 0.0, 255.]
-        self.image_set._roi_data[2, 4] = [165.0, 42.0, 42.0, 255.]
-        self.subset._roi_data[4, 2] = [255.0, 0.0, 0.0, 255.]
-        self.subset._roi_data[2, 4] = [165.0, 42.0, 42.0, 255.]
-        controller.clear_all()
-        assert np.array_equal(
-            self.image_set._roi_data[4, 2], [0, 0, 0, 0]
+        self.image_set.add_coords_to_roi_data_with_color(
+            np.array([[4, 2]]), 'red'
         )
-        assert np.array_equal(
-            self.image_set._roi_data[2, 4], [0, 0, 0, 0]
+        self.image_set.add_coords_to_roi_data_with_color(
+            np.array([[2, 4]]), 'brown'
         )
-        assert np.array_equal(
-            self.subset._roi_data[4, 2], [0, 0, 0, 0]
+        self.subset.add_coords_to_roi_data_with_color(
+            np.array([[4, 2]]), 'red'
         )
-        assert np.array_equal(
-            self.subset._roi_data[2, 4], [0, 0, 0, 0]
+        self.subset.add_coords_to_roi_data_with_color(
+            np.array([[2, 4]]), 'brown'
         )
+        controller.clear_all()
+        assert self.image_set._roi_data[4, 2] == 0
+        assert self.image_set._roi_data[2, 4] == 0
+        assert self.subset._roi_data[4, 2] == 0
+        assert self.subset._roi_data[2, 4] == 0
 
     def test_add_ROI(self, controller):
         coords = np.array([[4, 2]])
         controller.add_ROI(coords, 'red')
-        assert np.array_equal(
-            self.image_set._roi_data[4, 2], [255.0, 0.0, 0.0, 255.]
-        )
-        assert not np.array_equal(
-            self.subset._roi_data[4, 2], [255.0, 0.0, 0.0, 255.]
-        )
+        assert self.image_set._roi_data[4, 2] == 1
+        assert self.subset._roi_data[4, 2] != 1
         controller.add_ROI(coords, 'red', self.subset)
-        assert np.array_equal(
-            self.subset._roi_data[4, 2], [255.0, 0.0, 0.0, 255.]
-        )
+        assert self.subset._roi_data[4, 2] == 1
 
     def test_set_simultaneous_roi(self, controller):
         assert not self.image_set.simultaneous_roi
@@ -169,6 +247,16 @@ class TestSelection(object):
         assert self.image_set.selection_index == 0
         assert self.subset.selection_index == 0
 
+    def test_change_brush_radius(self, qtbot, selection):
+        assert self.image_set.brush_radius == 1
+        assert selection.brush_radius_box.value() == 1
+        selection.brush_radius_box.setValue(4)
+        assert self.image_set.brush_radius == 4
+        assert self.subset.brush_radius == 4
+        selection.change_brush_radius(1)
+        assert self.image_set.brush_radius == 1
+        assert self.subset.brush_radius == 1
+
     def test_change_alpah(self, qtbot, selection):
         assert self.image_set.alpha == 1.0
         assert self.subset.alpha == 1.0
@@ -187,42 +275,42 @@ class TestSelection(object):
         assert self.subset.alpha == 1.0
 
     def test_clear_current_color(self, qtbot, selection):
-        self.image_set._roi_data[4, 2] = [255.0, 0.0, 0.0, 255.]
-        selection.clear_current_color()
-        assert np.array_equal(
-            self.image_set._roi_data[4, 2], [0, 0, 0, 0]
+        self.image_set.add_coords_to_roi_data_with_color(
+            np.array([[4, 2]]), 'red'
         )
+        selection.clear_current_color()
+        assert self.image_set._roi_data[4, 2] == 0
 
-        self.image_set._roi_data[4, 2] = [255.0, 0.0, 0.0, 255.]
+        self.image_set.add_coords_to_roi_data_with_color(
+            np.array([[4, 2]]), 'red'
+        )
         qtbot.mouseClick(
             selection.clear_current_color_btn, QtCore.Qt.LeftButton
         )
-        assert np.array_equal(
-            self.image_set._roi_data[4, 2], [0, 0, 0, 0]
-        )
+        assert self.image_set._roi_data[4, 2] == 0
 
     def test_clear_all(self, qtbot, selection):
-        self.image_set._roi_data[4, 2] = [255.0, 0.0, 0.0, 255.]
-        self.image_set._roi_data[2, 4] = [165.0, 42.0, 42.0, 255.]
-        selection.clear_all()
-        assert np.array_equal(
-            self.image_set._roi_data[4, 2], [0, 0, 0, 0]
+        self.image_set.add_coords_to_roi_data_with_color(
+            np.array([[4, 2]]), 'red'
         )
-        assert np.array_equal(
-            self.image_set._roi_data[2, 4], [0, 0, 0, 0]
+        self.image_set.add_coords_to_roi_data_with_color(
+            np.array([[2, 4]]), 'brown'
         )
+        selection.clear_all()
+        assert self.image_set._roi_data[4, 2] == 0
+        assert self.image_set._roi_data[2, 4] == 0
 
-        self.image_set._roi_data[4, 2] = [255.0, 0.0, 0.0, 255.]
-        self.image_set._roi_data[2, 4] = [165.0, 42.0, 42.0, 255.]
-        qtbot.mouseClick(
-            selection.clear_all_btn, QtCore.Qt.LeftButton
+        self.image_set.add_coords_to_roi_data_with_color(
+            np.array([[4, 2]]), 'red'
         )
-        assert np.array_equal(
-            self.image_set._roi_data[4, 2], [0, 0, 0, 0]
+        self.image_set.add_coords_to_roi_data_with_color(
+            np.array([[2, 4]]), 'brown'
         )
-        assert np.array_equal(
-            self.image_set._roi_data[2, 4], [0, 0, 0, 0]
+        qtbot.mouseClick(
+            selection.clear_all_btn, QtCore.Qt.LeftButton
         )
+        assert self.image_set._roi_data[4, 2] == 0
+        assert self.image_set._roi_data[2, 4] == 0
 
     def test_export(self, selection):
         selection.controller.add_ROI(self.roi_coords, 'red')
@@ -267,13 +355,9 @@ class TestSelection(object):
         selection.load_selections([SAMPLE_ROI])
         rows, cols = np.column_stack(self.roi_coords)
         for pixel in self.image_set._roi_data[rows, cols]:
-            assert np.array_equal(
-                pixel, [255.0, 0.0, 0.0, 255.]
-            )
+            assert pixel == 1
         for pixel in self.subset._roi_data[rows, cols]:
-            assert np.array_equal(
-                pixel, [0.0, 100.0, 0.0, 255.]
-            )
+            assert pixel == 5
 
     def test_load_selections2(self, selection):
         """Test when there is no multiple views"""
@@ -281,9 +365,7 @@ class TestSelection(object):
         selection.load_selections([SAMPLE_ROI])
         rows, cols = np.column_stack(self.roi_coords)
         for pixel in self.image_set._roi_data[rows, cols]:
-            assert np.array_equal(
-                pixel, [255.0, 0.0, 0.0, 255.]
-            )
+            assert pixel == 1
 
     def test_load_selections3(self, selection):
         """Test when there are more current views"""
@@ -291,13 +373,9 @@ class TestSelection(object):
         selection.load_selections([SAMPLE_ROI])
         rows, cols = np.column_stack(self.roi_coords)
         for pixel in self.image_set._roi_data[rows, cols]:
-            assert np.array_equal(
-                pixel, [255.0, 0.0, 0.0, 255.]
-            )
+            assert pixel == 1
         for pixel in self.subset._roi_data[rows, cols]:
-            assert np.array_equal(
-                pixel, [0.0, 100.0, 0.0, 255.]
-            )
+            assert pixel == 5
 
     def test_select_simultaneous_roi(self, qtbot, selection):
         assert not self.image_set.simultaneous_roi